@@ -0,0 +1,205 @@
+"""
+Static asset build: content-hashed file names plus gzip/brotli variants.
+
+Runs at startup (ASSETS_BUILD_ON_STARTUP) or ahead of time as part of a
+deploy:
+
+    python -m app.assets
+
+Fingerprinted files are served with an immutable Cache-Control header and
+the best precompressed variant the client accepts. Brotli variants are only
+produced when the optional `brotli` package is installed.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+
+from app.config import get_settings
+from app.response_cache import etag_matches
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_SUFFIXES = {'.css', '.js', '.svg', '.ico', '.html', '.txt', '.json', '.xml', '.map'}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STATIC_URL = "/static/"
+
+_CSS_URL_RE = re.compile(r"""url\((['"]?)/static/([^'")?#]+)\1\)""")
+
+
+def _write_atomic(path: Path, data: bytes):
+    if path.exists() and path.stat().st_size == len(data) and path.read_bytes() == data:
+        return
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)
+
+
+def _compressed_variants(data: bytes) -> Dict[str, bytes]:
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    # A variant that isn't smaller is just wasted disk and CPU on decode
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def build_assets(source_dir: Path, output_dir: Path) -> Dict[str, Dict]:
+    """
+    Fingerprint every file in source_dir into output_dir and write
+    manifest.json. Returns the manifest: source name -> {"path", "encodings"}.
+
+    CSS is processed last with its /static/ url() references rewritten to
+    the fingerprinted names, so a changed image also changes the CSS hash.
+    """
+    source_dir, output_dir = Path(source_dir), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    sources = sorted(
+        (p for p in source_dir.rglob('*') if p.is_file()),
+        key=lambda p: (p.suffix == '.css', str(p))
+    )
+    manifest: Dict[str, Dict] = {}
+    for source in sources:
+        name = source.relative_to(source_dir).as_posix()
+        data = source.read_bytes()
+        if source.suffix == '.css':
+            data = _CSS_URL_RE.sub(
+                lambda m: f"url({m.group(1)}{asset_url(m.group(2), manifest)}{m.group(1)})",
+                data.decode()
+            ).encode()
+
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        built_name = f"{Path(name).with_suffix('')}.{digest}{source.suffix}"
+        built_path = output_dir / built_name
+        built_path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(built_path, data)
+
+        encodings = []
+        if source.suffix.lower() in COMPRESSIBLE_SUFFIXES:
+            for encoding, body in _compressed_variants(data).items():
+                _write_atomic(built_path.with_name(built_path.name + ENCODING_SUFFIXES[encoding]), body)
+                encodings.append(encoding)
+
+        manifest[name] = {"path": built_name, "encodings": sorted(encodings)}
+
+    _write_atomic(output_dir / "manifest.json", json.dumps(manifest, indent=2, sort_keys=True).encode())
+    logger.info(f"Built {len(manifest)} static assets into {output_dir}")
+    return manifest
+
+
+def load_manifest(output_dir: Path) -> Dict[str, Dict]:
+    try:
+        return json.loads((Path(output_dir) / "manifest.json").read_text())
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        logger.warning(f"Ignoring corrupt asset manifest in {output_dir}")
+        return {}
+
+
+def asset_url(name: str, manifest: Optional[Dict[str, Dict]] = None) -> str:
+    """URL of a static file, fingerprinted when it is in the manifest"""
+    entry = (_manifest if manifest is None else manifest).get(name)
+    return STATIC_URL + (entry["path"] if entry else name)
+
+
+def _preferred_encoding(accept_encoding: str, available) -> Optional[str]:
+    accepted = {part.split(';')[0].strip() for part in accept_encoding.split(',')}
+    for encoding in ("br", "gzip"):
+        if encoding in available and encoding in accepted:
+            return encoding
+    return None
+
+
+class AssetFiles(StaticFiles):
+    """
+    StaticFiles that serves fingerprinted names from the build directory,
+    picking a precompressed variant by Accept-Encoding. Other paths (the
+    original names, which old links may still use) fall through to the
+    source directory with a short cache lifetime. The manifest can be
+    given later, once the assets are built.
+    """
+
+    def __init__(self, directory: str, build_dir: str, manifest: Optional[Dict[str, Dict]] = None):
+        super().__init__(directory=directory)
+        self.build_dir = Path(build_dir)
+        self.built: Dict[str, List[str]] = {}
+        if manifest is not None:
+            self.use_manifest(manifest)
+
+    def use_manifest(self, manifest: Dict[str, Dict]):
+        self.built = {entry["path"]: entry["encodings"] for entry in manifest.values()}
+
+    async def get_response(self, path: str, scope) -> Response:
+        encodings = self.built.get(path)
+        if encodings is None:
+            response = await super().get_response(path, scope)
+            if response.status_code == 200:
+                response.headers.setdefault("Cache-Control", "public, max-age=3600")
+            return response
+
+        headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        file_path = self.build_dir / path
+        encoding = _preferred_encoding(Headers(scope=scope).get("accept-encoding", ""), encodings)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            file_path = file_path.with_name(file_path.name + ENCODING_SUFFIXES[encoding])
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        return FileResponse(file_path, media_type=media_type, headers=headers)
+
+
+class CachedPage:
+    """Pre-rendered HTML kept in memory with compressed variants and an ETag"""
+
+    def __init__(self, html: str):
+        self.body = html.encode()
+        self.variants = _compressed_variants(self.body)
+        self.etag = f'"{hashlib.blake2b(self.body, digest_size=12).hexdigest()}"'
+
+    def response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Vary": "Accept-Encoding", "Cache-Control": "public, no-cache"}
+        if etag_matches(request.headers.get("if-none-match", ""), self.etag):
+            return Response(status_code=304, headers=headers)
+
+        encoding = _preferred_encoding(request.headers.get("accept-encoding", ""), self.variants)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            return Response(self.variants[encoding], media_type="text/html", headers=headers)
+        return Response(self.body, media_type="text/html", headers=headers)
+
+
+_manifest: Dict[str, Dict] = {}
+
+
+def init_assets() -> Dict[str, Dict]:
+    """Build (or load a prebuilt) manifest and make it the one asset_url uses"""
+    global _manifest
+    if settings.ASSETS_BUILD_ON_STARTUP:
+        _manifest = build_assets(Path(settings.STATIC_DIR), Path(settings.STATIC_BUILD_DIR))
+    else:
+        _manifest = load_manifest(Path(settings.STATIC_BUILD_DIR))
+    return _manifest
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    build_assets(Path(settings.STATIC_DIR), Path(settings.STATIC_BUILD_DIR))
@@ -0,0 +1,75 @@
+"""Per-user notifications for binding changes, used by the dashboard event stream"""
+import asyncio
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+
+class BindingWatch:
+    """
+    One waiter's subscription to a user's changes.
+
+    Call arm() before reading the user, then wait(): a notify() that lands
+    between the two sets the armed event, so the change is not missed.
+    """
+
+    def __init__(self, notifier: "BindingNotifier", user_id: int):
+        self._notifier = notifier
+        self._user_id = user_id
+        self._event: Optional[asyncio.Event] = None
+
+    def arm(self):
+        self._event = self._notifier._event(self._user_id)
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for a change since arm(); True if notified"""
+        event = self._event or self._notifier._event(self._user_id)
+        self._event = None
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class BindingNotifier:
+    """
+    Wakes coroutines waiting on a user's bindings when they change.
+
+    Events only exist while someone is watching, so idle users cost nothing.
+    Notifications are per process; waiters should still re-check storage
+    after a timeout to pick up changes made by other workers.
+    """
+
+    def __init__(self):
+        self._events: Dict[int, asyncio.Event] = {}
+        self._waiters: Dict[int, int] = {}
+
+    def notify(self, user_id: int):
+        event = self._events.pop(user_id, None)
+        if event is not None:
+            event.set()
+
+    def _event(self, user_id: int) -> asyncio.Event:
+        """The event the next notify() sets, created if needed"""
+        event = self._events.get(user_id)
+        if event is None:
+            event = self._events[user_id] = asyncio.Event()
+        return event
+
+    @contextmanager
+    def watch(self, user_id: int) -> Iterator[BindingWatch]:
+        self._waiters[user_id] = self._waiters.get(user_id, 0) + 1
+        try:
+            yield BindingWatch(self, user_id)
+        finally:
+            self._waiters[user_id] -= 1
+            if not self._waiters[user_id]:
+                del self._waiters[user_id]
+                self._events.pop(user_id, None)
+
+    @property
+    def waiting_users(self) -> int:
+        return len(self._waiters)
+
+
+binding_notifier = BindingNotifier()
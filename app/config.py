@@ -3,8 +3,43 @@ from functools import lru_cache
 
 
 class Settings(BaseSettings):
+    # "csv" (users.csv + journal) or "sql" (SQLAlchemy, see DATABASE_URL)
+    STORAGE_BACKEND: str = "csv"
+    # Defaults to SQLite at <CSV_DATA_DIR>/users.db; postgresql:// URLs also work
+    DATABASE_URL: str = ""
     CSV_DATA_DIR: str = "data"
+    # Journal records written before users.csv is rewritten as a fresh snapshot
+    JOURNAL_COMPACT_THRESHOLD: int = 10000
+    # Thread pool used by async handlers for blocking storage calls
+    STORAGE_EXECUTOR_WORKERS: int = 8
+    # Calls queued or running beyond this are rejected with 503
+    STORAGE_MAX_PENDING: int = 256
     SECRET_KEY: str = "default-secret-key-change-in-production"
+    # Verified session cookies remembered to skip HMAC checks (0 disables)
+    SESSION_CACHE_SIZE: int = 10000
+    # Per-user /auth/me responses kept in memory (0 disables). Invalidation is
+    # per process, so it is always off with STORAGE_BACKEND=sql, where other
+    # workers write too; entries also expire after ME_CACHE_TTL seconds
+    ME_CACHE_SIZE: int = 10000
+    ME_CACHE_TTL: float = 30.0
+
+    # Pending Discord OAuth states and Telegram auth codes (seconds / entries)
+    OAUTH_STATE_TTL: int = 600
+    TELEGRAM_AUTH_CODE_TTL: int = 900
+    AUTH_STATE_MAX_ENTRIES: int = 100000
+    AUTH_STATE_SWEEP_INTERVAL: float = 30.0
+    # "memory" (per process) or "sqlite" (shared by all workers on the host)
+    STATE_BACKEND: str = "memory"
+    STATE_DB_PATH: str = ""  # defaults to <CSV_DATA_DIR>/state.db
+    # Issue HMAC-signed states/auth codes instead of storing them. Single use
+    # is only enforced within one process (a per-process replay filter), even
+    # with STATE_BACKEND=sqlite; with several workers a token can be redeemed
+    # once per worker until it expires
+    STATELESS_AUTH_TOKENS: bool = False
+    REPLAY_FILTER_ERROR_RATE: float = 0.0001
+    # /auth/me/events: seconds between keepalives / before the stream closes
+    BINDING_EVENTS_KEEPALIVE: float = 15.0
+    BINDING_EVENTS_MAX_DURATION: float = 300.0
 
     DISCORD_CLIENT_ID: str
     DISCORD_CLIENT_SECRET: str
@@ -12,6 +47,45 @@ class Settings(BaseSettings):
 
     TELEGRAM_BOT_TOKEN: str
     TELEGRAM_BOT_USERNAME: str
+    TELEGRAM_API_BASE: str = "https://api.telegram.org"
+    # "webhook" (POST /auth/telegram/webhook) or "polling" (getUpdates loop)
+    TELEGRAM_INGESTION_MODE: str = "webhook"
+    TELEGRAM_POLL_TIMEOUT: int = 30
+    TELEGRAM_POLL_BATCH_SIZE: int = 100
+    TELEGRAM_POLL_CONCURRENCY: int = 8
+    # Outbound sendMessage limits (Telegram allows ~30 msg/s overall, ~1 msg/s per chat)
+    TELEGRAM_GLOBAL_RATE: float = 30.0
+    TELEGRAM_PER_CHAT_RATE: float = 1.0
+    TELEGRAM_SEND_MAX_RETRIES: int = 5
+    TELEGRAM_SEND_QUEUE_SIZE: int = 10000
+    TELEGRAM_SEND_CONCURRENCY: int = 10
+    # Wait for delivery before answering the webhook instead of fire-and-forget
+    TELEGRAM_AWAIT_DELIVERY: bool = False
+    # Incoming updates are acknowledged at once and processed by these workers
+    TELEGRAM_UPDATE_WORKERS: int = 4
+    TELEGRAM_UPDATE_QUEUE_SIZE: int = 1000
+    # Recent update_ids remembered to drop Telegram redeliveries
+    TELEGRAM_UPDATE_DEDUP_SIZE: int = 10000
+    # Handle updates inside the webhook request and return the reply as the
+    # response body ({"method": "sendMessage", ...}) instead of a separate call
+    TELEGRAM_WEBHOOK_INLINE_REPLY: bool = False
+
+    # Shared upstream HTTP clients (Discord, Telegram)
+    HTTP_TIMEOUT: float = 10.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    # Requires the optional 'h2' package (pip install httpx[http2])
+    HTTP2_ENABLED: bool = False
+
+    # Fingerprinted/precompressed static assets (see app/assets.py)
+    STATIC_DIR: str = "static"
+    STATIC_BUILD_DIR: str = "build/static"
+    ASSETS_BUILD_ON_STARTUP: bool = True
+
+    # Prometheus text metrics at /metrics; restrict access at the proxy
+    METRICS_ENABLED: bool = True
 
     BASE_URL: str = "http://localhost:8000"
     ENVIRONMENT: str = "development"
@@ -20,6 +94,10 @@ class Settings(BaseSettings):
     GOOGLE_SHEETS_ENABLED: bool = False
     GOOGLE_SHEETS_ID: str = ""
     GOOGLE_SERVICE_ACCOUNT_FILE: str = ""
+    # Write-behind sync: flush when this many users are queued...
+    GOOGLE_SHEETS_BATCH_SIZE: int = 100
+    # ...or when the oldest queued change is this many seconds old
+    GOOGLE_SHEETS_FLUSH_INTERVAL: float = 2.0
 
     class Config:
         env_file = ".env"
@@ -1,32 +1,93 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+
 from fastapi import FastAPI, Request, Depends
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
 
+from app import metrics
 from app.config import get_settings
+from app.readiness import StartupStep, readiness
 from app.session import get_current_user_id, get_optional_user_id
 from app.routes import auth
+from app.oauth import http_clients
+from app.oauth.telegram_dispatcher import get_dispatcher
+from app.oauth.telegram_updates import get_update_queue
+from app.oauth.telegram_polling import get_poller
+from app.oauth.telegram_authz import pending_auth_codes
+from app.routes.auth import oauth_states
+from app.ttl_store import run_sweeper
 from app.storage.user_storage import get_user_storage
+from app.storage.google_sheets import get_sheets_storage
+from app.assets import AssetFiles, CachedPage, asset_url, init_assets
 
 settings = get_settings()
 
-# Initialize CSV storage
-get_user_storage()
 auth_router = auth.router
 
-app = FastAPI(title="Web3 Community Binding")
+# Nothing is loaded at import time; the lifespan does it, in this order
+storage_startup = StartupStep()
+assets_startup = StartupStep()
+readiness.add("storage", storage_startup)
+readiness.add("assets", assets_startup)
+readiness.add("sheets", lambda: get_sheets_storage().connection(), required=False)
+
+static_files = AssetFiles(directory=settings.STATIC_DIR, build_dir=settings.STATIC_BUILD_DIR)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The local store comes first: every route but the landing page needs it.
+    # Threads keep the event loop free to handle signals while it loads
+    with storage_startup:
+        storage = await asyncio.to_thread(get_user_storage)
+        storage.add_change_listener(auth.me_cache.invalidate)
+    with assets_startup:
+        static_files.use_manifest(await asyncio.to_thread(init_assets))
+    # The Sheets mirror opens in the background; writes queue until it has
+    get_sheets_storage().connect_in_background()
+
+    await http_clients.start_clients()
+    sweeper = asyncio.create_task(
+        run_sweeper([pending_auth_codes, oauth_states], settings.AUTH_STATE_SWEEP_INTERVAL)
+    )
+    await get_dispatcher().start()
+    await get_update_queue().start()
+    if settings.TELEGRAM_INGESTION_MODE == "polling":
+        await get_poller().start()
+    yield
+    await get_poller().stop()
+    await get_update_queue().stop()
+    await get_dispatcher().stop()
+    # Bindings made by the updates above are flushed to Sheets last
+    await asyncio.to_thread(get_sheets_storage().stop)
+    sweeper.cancel()
+    await http_clients.close_clients()
+
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app = FastAPI(title="Web3 Community Binding", lifespan=lifespan)
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+app.mount("/static", static_files, name="static")
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["asset_url"] = asset_url
+
+# The landing page has no per-visitor content, so it is rendered once
+_index_page: Optional[CachedPage] = None
 
 app.include_router(auth_router)
 
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request, user_id: int = Depends(get_optional_user_id)):
+    global _index_page
     if user_id:
         return RedirectResponse("/dashboard", status_code=303)
-    return templates.TemplateResponse("index.html", {"request": request})
+    if _index_page is None:
+        _index_page = CachedPage(templates.get_template("index.html").render(request=request))
+    return _index_page.response(request)
 
 
 @app.get("/dashboard", response_class=HTMLResponse)
@@ -36,4 +97,27 @@ async def dashboard(request: Request, user_id: int = Depends(get_current_user_id
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "sheets_sync": get_sheets_storage().queue_stats(),
+        "telegram_updates": get_update_queue().queue_stats(),
+    }
+
+
+@app.get("/ready")
+async def ready():
+    """
+    Status report of each component's startup state. The lifespan loads the
+    store and assets before the server accepts connections, so this normally
+    shows only the Sheets mirror warming up; 503 means a required component
+    isn't loaded (e.g. the app was run without its lifespan).
+    """
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        # Gauges such as the SQLite state store sizes query on render
+        return Response(await asyncio.to_thread(metrics.render), media_type=metrics.CONTENT_TYPE)
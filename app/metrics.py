@@ -0,0 +1,314 @@
+"""
+In-process metrics rendered in the Prometheus text format at /metrics.
+
+Recording is a dict lookup, a bisect and a few additions under a
+per-series lock, so it stays on in production. Values are per process;
+with several workers each one reports its own.
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+# Request and upstream call latencies (seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Lock waits and holds are mostly microseconds
+LOCK_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _child(self, labels: Tuple[str, ...]):
+        child = self._series.get(labels)
+        if child is None:
+            with self._lock:
+                child = self._series.setdefault(labels, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for labels, child in sorted(self._series.items()):
+            lines.extend(self._render_child(labels, child))
+        return lines
+
+    def _render_child(self, labels, child) -> List[str]:
+        raise NotImplementedError
+
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        child = self._child(labels)
+        with child.lock:
+            child.value += amount
+
+    def _render_child(self, labels, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(child.value)}"]
+
+
+class _HistogramValue:
+    __slots__ = ("counts", "sum", "lock")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        # One slot per bucket plus the +Inf overflow
+        return _HistogramValue(len(self.buckets) + 1)
+
+    def observe(self, value: float, *labels: str):
+        child = self._child(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with child.lock:
+            child.counts[index] += 1
+            child.sum += value
+
+    def _render_child(self, labels, child) -> List[str]:
+        with child.lock:
+            counts, total = list(child.counts), child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        plain = _format_labels(self.labelnames, labels)
+        lines.append(f"{self.name}_sum{plain} {_format_value(total)}")
+        lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    Gauge or counter read from existing state at scrape time. The callback
+    returns a number, or a dict of label value(s) -> number.
+    """
+
+    def __init__(self, name: str, help: str, callback: Callable, labelnames: Iterable[str] = (),
+                 type: str = "gauge"):
+        self.callback = callback
+        self.type = type
+        super().__init__(name, help, labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            labels = labels if isinstance(labels, tuple) else (labels,)
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value or 0)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time to serve an HTTP request", ("method", "route"))
+http_requests = Counter(
+    "http_requests_total", "HTTP requests served", ("method", "route", "status"))
+storage_operation_duration = Histogram(
+    "storage_operation_duration_seconds", "Time spent in a user storage call", ("operation",))
+storage_lock_wait = Histogram(
+    "storage_lock_wait_seconds", "Time spent waiting for the user storage lock", buckets=LOCK_BUCKETS)
+storage_lock_hold = Histogram(
+    "storage_lock_hold_seconds", "Time the user storage lock was held", buckets=LOCK_BUCKETS)
+upstream_request_duration = Histogram(
+    "upstream_request_duration_seconds", "Time to the response headers of a Discord/Telegram API call",
+    ("upstream", "endpoint"))
+upstream_requests = Counter(
+    "upstream_requests_total", "Discord/Telegram API calls by status ('error' for transport failures)",
+    ("upstream", "endpoint", "status"))
+sheets_flush_duration = Histogram(
+    "sheets_flush_duration_seconds", "Time to write one batch to Google Sheets", ("result",))
+
+
+def observe_since(histogram: Histogram, started: float, *labels: str):
+    histogram.observe(time.perf_counter() - started, *labels)
+
+
+class TimedLock:
+    """threading.Lock that records how long callers wait for it and hold it"""
+
+    def __init__(self, wait: Histogram = storage_lock_wait, hold: Histogram = storage_lock_hold):
+        self._lock = threading.Lock()
+        self._wait = wait
+        self._hold = hold
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            # Only the holder writes this, so it needs no extra locking
+            self._acquired_at = time.perf_counter()
+            self._wait.observe(self._acquired_at - started)
+        return acquired
+
+    def release(self):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        self._hold.observe(held)
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def _endpoint(url: httpx.URL) -> str:
+    # The last path segment names the call (token, @me, sendMessage) and
+    # keeps the bot token in Telegram URLs out of the labels
+    return url.path.rstrip("/").rsplit("/", 1)[-1] or "/"
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Wraps an httpx transport to time calls and count their outcomes"""
+
+    def __init__(self, upstream: str, transport: httpx.AsyncBaseTransport):
+        self.upstream = upstream
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = _endpoint(request.url)
+        started = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception:
+            upstream_requests.inc(self.upstream, endpoint, "error")
+            raise
+        finally:
+            observe_since(upstream_request_duration, started, self.upstream, endpoint)
+        upstream_requests.inc(self.upstream, endpoint, str(response.status_code))
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and status per route template, so
+    path parameters and unknown URLs don't create new series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Optional[Dict[object, str]] = None
+
+    def _route_paths(self, root_app) -> Dict[object, str]:
+        if self._routes is None:
+            paths = {}
+            for route in getattr(root_app, "routes", []):
+                # Routes are matched by endpoint, mounts by their sub-app
+                for key in (getattr(route, "endpoint", None), getattr(route, "app", None)):
+                    if key is not None and key is not root_app:
+                        paths.setdefault(key, route.path)
+            self._routes = paths
+        return self._routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        root_app = scope.get("app")
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router adds the matched endpoint (or mounted app) to scope
+            routes = self._route_paths(root_app)
+            route = routes.get(scope.get("endpoint")) or routes.get(scope.get("app")) or "unmatched"
+            http_request_duration.observe(time.perf_counter() - started, scope["method"], route)
+            http_requests.inc(scope["method"], route, status)
+
+
+def render() -> str:
+    return registry.render()
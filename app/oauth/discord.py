@@ -2,6 +2,7 @@ import httpx
 import logging
 from typing import Dict, Optional, Tuple
 from app.config import get_settings
+from app.oauth.http_clients import get_discord_client
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -37,18 +38,18 @@ async def exchange_code(code: str) -> Optional[Dict]:
     }
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                DISCORD_TOKEN_URL,
-                data=data,
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
-
-            if response.status_code != 200:
-                logger.error(f"Discord token exchange failed: {response.status_code} - {response.text}")
-                return None
-
-            return response.json()
+        client = get_discord_client()
+        response = await client.post(
+            DISCORD_TOKEN_URL,
+            data=data,
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
+
+        if response.status_code != 200:
+            logger.error(f"Discord token exchange failed: {response.status_code} - {response.text}")
+            return None
+
+        return response.json()
     except httpx.TimeoutException:
         logger.error("Discord API timeout during token exchange")
         return None
@@ -63,17 +64,17 @@ async def exchange_code(code: str) -> Optional[Dict]:
 async def get_user_info(access_token: str) -> Optional[Dict]:
     headers = {"Authorization": f"Bearer {access_token}"}
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{DISCORD_API_BASE}/users/@me",
-                headers=headers
-            )
+        client = get_discord_client()
+        response = await client.get(
+            f"{DISCORD_API_BASE}/users/@me",
+            headers=headers
+        )
 
-            if response.status_code != 200:
-                logger.error(f"Discord get user info failed: {response.status_code}")
-                return None
+        if response.status_code != 200:
+            logger.error(f"Discord get user info failed: {response.status_code}")
+            return None
 
-            return response.json()
+        return response.json()
     except httpx.TimeoutException:
         logger.error("Discord API timeout during get user info")
         return None
@@ -94,17 +95,17 @@ async def refresh_access_token(refresh_token: str) -> Optional[Dict]:
     }
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                DISCORD_TOKEN_URL,
-                data=data,
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
+        client = get_discord_client()
+        response = await client.post(
+            DISCORD_TOKEN_URL,
+            data=data,
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
 
-            if response.status_code != 200:
-                return None
+        if response.status_code != 200:
+            return None
 
-            return response.json()
+        return response.json()
     except Exception:
         return None
 
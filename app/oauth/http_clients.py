@@ -0,0 +1,76 @@
+"""Shared, connection-pooled HTTP clients for the Discord and Telegram APIs"""
+import httpx
+import logging
+from typing import Dict, Optional
+from app import metrics
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+DISCORD = "discord"
+TELEGRAM = "telegram"
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_available() -> bool:
+    if not settings.HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("HTTP2_ENABLED is set but the 'h2' package is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+def _build_client(name: str, transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    if transport is None:
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        )
+        transport = httpx.AsyncHTTPTransport(limits=limits, http2=_http2_available())
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+        transport=metrics.InstrumentedTransport(name, transport),
+    )
+
+
+async def start_clients(transport: Optional[httpx.AsyncBaseTransport] = None):
+    """
+    Create one long-lived client per upstream.
+
+    Called from the app lifespan. A custom transport (e.g. httpx.MockTransport)
+    can be passed to route all upstream traffic to local stand-ins.
+    """
+    for name in (DISCORD, TELEGRAM):
+        if name not in _clients:
+            _clients[name] = _build_client(name, transport)
+    logger.info("Upstream HTTP clients started")
+
+
+async def close_clients():
+    """Close all clients and their pooled connections"""
+    while _clients:
+        _, client = _clients.popitem()
+        await client.aclose()
+    logger.info("Upstream HTTP clients closed")
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Return the shared client for an upstream, creating it outside the lifespan if needed"""
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _clients[name] = _build_client(name)
+    return client
+
+
+def get_discord_client() -> httpx.AsyncClient:
+    return get_client(DISCORD)
+
+
+def get_telegram_client() -> httpx.AsyncClient:
+    return get_client(TELEGRAM)
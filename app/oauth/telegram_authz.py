@@ -2,26 +2,35 @@ import httpx
 import secrets
 import logging
 from typing import Dict, Optional, Tuple
-from datetime import datetime, timedelta
 from app.config import get_settings
+from app.oauth.http_clients import get_telegram_client
+from app.state_store import create_state_store
+from app import signed_tokens
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
-pending_auth_codes = {}
+pending_auth_codes = create_state_store("pending_auth_codes", settings.TELEGRAM_AUTH_CODE_TTL)
 
 
 class TelegramAuthError(Exception):
     pass
 
 
-def generate_auth_code(user_session_id: str) -> str:
+def api_url(method: str) -> str:
+    return f"{settings.TELEGRAM_API_BASE}/bot{settings.TELEGRAM_BOT_TOKEN}/{method}"
+
+
+async def generate_auth_code(user_session_id: str, user_id: Optional[int] = None) -> str:
+    if settings.STATELESS_AUTH_TOKENS:
+        # The token carries only the user id, which doubles as the session id
+        return signed_tokens.issue_token("telegram", user_id, settings.TELEGRAM_AUTH_CODE_TTL)
+
     auth_code = secrets.token_urlsafe(32)
-    pending_auth_codes[auth_code] = {
+    await pending_auth_codes.set(auth_code, {
         "user_session_id": user_session_id,
-        "created_at": datetime.now(),
-        "expires_at": datetime.now() + timedelta(minutes=15)
-    }
+        "user_id": user_id,
+    })
     return auth_code
 
 
@@ -30,56 +39,66 @@ def get_authorization_url(auth_code: str) -> str:
     return f"https://t.me/{bot_username}?start={auth_code}"
 
 
-def verify_auth_code(auth_code: str) -> Optional[Dict]:
-    if auth_code not in pending_auth_codes:
+def _signed_auth_data(user_id: Optional[int]) -> Optional[Dict]:
+    if user_id is None:
         return None
+    return {"user_session_id": str(user_id), "user_id": user_id or None}
 
-    auth_data = pending_auth_codes[auth_code]
-    if datetime.now() > auth_data["expires_at"]:
-        del pending_auth_codes[auth_code]
-        return None
 
-    return auth_data
+async def verify_auth_code(auth_code: str) -> Optional[Dict]:
+    if settings.STATELESS_AUTH_TOKENS:
+        return _signed_auth_data(signed_tokens.verify_token("telegram", auth_code))
+    return await pending_auth_codes.get(auth_code)
+
 
+async def complete_authorization(auth_code: str, telegram_user: Dict) -> str:
+    if settings.STATELESS_AUTH_TOKENS:
+        auth_data = _signed_auth_data(signed_tokens.consume_token("telegram", auth_code))
+        if not auth_data:
+            raise TelegramAuthError("Invalid or expired authorization code")
+        return auth_data["user_session_id"]
 
-def complete_authorization(auth_code: str, telegram_user: Dict) -> str:
-    auth_data = verify_auth_code(auth_code)
+    # pop() makes the code single-use even if the same /start arrives twice
+    auth_data = await pending_auth_codes.pop(auth_code)
     if not auth_data:
         raise TelegramAuthError("Invalid or expired authorization code")
 
-    del pending_auth_codes[auth_code]
     return auth_data["user_session_id"]
 
 
 async def get_bot_info() -> Optional[Dict]:
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/getMe"
+    url = api_url("getMe")
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url)
+        client = get_telegram_client()
+        response = await client.get(url)
 
-            if response.status_code != 200:
-                return None
+        if response.status_code != 200:
+            return None
 
-            data = response.json()
-            return data.get("result")
+        data = response.json()
+        return data.get("result")
     except Exception:
         return None
 
 
-async def send_message(chat_id: int, text: str, parse_mode: str = "HTML") -> bool:
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
+async def post_send_message(chat_id: int, text: str, parse_mode: str = "HTML") -> httpx.Response:
+    """Call sendMessage once and return the raw response; transport errors propagate"""
+    url = api_url("sendMessage")
     payload = {"chat_id": chat_id, "text": text, "parse_mode": parse_mode}
+    client = get_telegram_client()
+    return await client.post(url, json=payload)
+
 
+async def send_message(chat_id: int, text: str, parse_mode: str = "HTML") -> bool:
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, json=payload)
-            if response.status_code != 200:
-                error_data = response.text
-                logger.error(f"Telegram sendMessage failed: {response.status_code} - {error_data}")
-            else:
-                logger.info(f"Message sent successfully to chat_id: {chat_id}")
-            return response.status_code == 200
+        response = await post_send_message(chat_id, text, parse_mode)
+        if response.status_code != 200:
+            error_data = response.text
+            logger.error(f"Telegram sendMessage failed: {response.status_code} - {error_data}")
+        else:
+            logger.info(f"Message sent successfully to chat_id: {chat_id}")
+        return response.status_code == 200
     except httpx.TimeoutException:
         logger.error("Telegram API timeout during send message")
         return False
@@ -92,16 +111,9 @@ async def send_message(chat_id: int, text: str, parse_mode: str = "HTML") -> boo
 
 
 async def process_bot_callback(auth_code: str, telegram_user_data: Dict) -> Tuple[str, Dict]:
-    user_session_id = complete_authorization(auth_code, telegram_user_data)
+    user_session_id = await complete_authorization(auth_code, telegram_user_data)
     return user_session_id, telegram_user_data
 
 
-def cleanup_expired_codes():
-    now = datetime.now()
-    expired = [
-        code for code, data in pending_auth_codes.items()
-        if now > data["expires_at"]
-    ]
-
-    for code in expired:
-        del pending_auth_codes[code]
+async def cleanup_expired_codes() -> int:
+    return await pending_auth_codes.sweep()
@@ -0,0 +1,290 @@
+"""Rate-limited outbound Telegram message dispatcher"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from app.config import get_settings
+from app.oauth import telegram_authz
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+SendFunc = Callable[[int, str, str], Awaitable[httpx.Response]]
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Message:
+    __slots__ = ("chat_id", "text", "parse_mode", "future", "attempts")
+
+    def __init__(self, chat_id: int, text: str, parse_mode: str, future: asyncio.Future):
+        self.chat_id = chat_id
+        self.text = text
+        self.parse_mode = parse_mode
+        self.future = future
+        self.attempts = 0
+
+
+class TelegramDispatcher:
+    """
+    Queues outbound messages and sends them within Telegram's limits.
+
+    A global token bucket caps messages per second across all chats and each
+    chat is spaced by its own interval; a throttled chat never blocks other
+    chats. HTTP 429 replies pause sending for `parameters.retry_after`,
+    transient failures are retried with jittered exponential backoff.
+    Messages to the same chat are delivered in order.
+    """
+
+    def __init__(self, send: SendFunc, global_rate: float, per_chat_rate: float,
+                 max_retries: int, max_queue: int, concurrency: int):
+        self.send = send
+        self.per_chat_interval = 1.0 / per_chat_rate
+        self.max_retries = max_retries
+        self.max_queue = max_queue
+        self.concurrency = concurrency
+
+        self._global = TokenBucket(global_rate, capacity=max(global_rate, 1.0))
+        self._chats: Dict[int, Deque[_Message]] = {}
+        self._chat_next_at: Dict[int, float] = {}
+        self._ready: List[Tuple[float, int, int]] = []
+        self._scheduled: Set[int] = set()
+        self._in_flight_chats: Set[int] = set()
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._queued = 0
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._send_tasks: Set[asyncio.Task] = set()
+        self._stopping = False
+
+        self.stats = {"sent": 0, "failed": 0, "retried": 0, "rate_limited": 0, "dropped": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def start(self):
+        self._ensure_started()
+
+    def submit(self, chat_id: int, text: str, parse_mode: str = "HTML") -> "asyncio.Future[bool]":
+        """
+        Queue a message and return a future resolving to True once delivered
+        (False if it was dropped or failed permanently). Callers may await it
+        or ignore it.
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+
+        if self._queued >= self.max_queue:
+            logger.error(f"Telegram send queue full, dropping message to chat_id: {chat_id}")
+            self.stats["dropped"] += 1
+            future.set_result(False)
+            return future
+
+        self._chats.setdefault(chat_id, deque()).append(_Message(chat_id, text, parse_mode, future))
+        self._queued += 1
+        self._schedule(chat_id)
+        return future
+
+    def _schedule(self, chat_id: int):
+        if chat_id in self._scheduled or chat_id in self._in_flight_chats:
+            return
+        if not self._chats.get(chat_id):
+            self._chats.pop(chat_id, None)
+            return
+        ready_at = self._chat_next_at.get(chat_id, 0.0)
+        heapq.heappush(self._ready, (ready_at, next(self._seq), chat_id))
+        self._scheduled.add(chat_id)
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            if not self._ready:
+                if self._stopping and not self._in_flight_chats:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            if self._slots.locked():
+                # Every send slot is busy; _deliver wakes us when one frees up
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            ready_at, _, chat_id = self._ready[0]
+            delay = max(ready_at - now, self._paused_until - now, self._global.wait_time(now))
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._slots.acquire()
+            heapq.heappop(self._ready)
+            self._scheduled.discard(chat_id)
+            message = self._chats[chat_id].popleft()
+            self._global.consume(time.monotonic())
+            self._in_flight_chats.add(chat_id)
+
+            task = asyncio.create_task(self._deliver(message))
+            self._send_tasks.add(task)
+            task.add_done_callback(self._send_tasks.discard)
+
+    async def _deliver(self, message: _Message):
+        chat_id = message.chat_id
+        retry_at = None
+        try:
+            response = await self.send(chat_id, message.text, message.parse_mode)
+            now = time.monotonic()
+
+            if response.status_code == 200:
+                self._finish(message, True)
+                logger.info(f"Message sent successfully to chat_id: {chat_id}")
+            elif response.status_code == 429:
+                retry_after = self._retry_after(response)
+                self.stats["rate_limited"] += 1
+                logger.warning(f"Telegram flood control for chat_id {chat_id}, retrying in {retry_after}s")
+                self._paused_until = max(self._paused_until, now + retry_after)
+                retry_at = now + retry_after
+            elif response.status_code >= 500:
+                retry_at = self._backoff(message, f"{response.status_code} - {response.text}")
+            else:
+                logger.error(f"Telegram sendMessage failed: {response.status_code} - {response.text}")
+                self._finish(message, False)
+        except (httpx.TimeoutException, httpx.RequestError) as e:
+            retry_at = self._backoff(message, repr(e))
+        except asyncio.CancelledError:
+            self._finish(message, False)
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error during Telegram send message: {e}")
+            self._finish(message, False)
+        finally:
+            self._slots.release()
+            self._in_flight_chats.discard(chat_id)
+
+            if retry_at is not None:
+                # Put the message back at the head of its chat to keep ordering
+                self._chats.setdefault(chat_id, deque()).appendleft(message)
+                self._chat_next_at[chat_id] = retry_at
+            else:
+                self._chat_next_at[chat_id] = time.monotonic() + self.per_chat_interval
+            self._prune_chat_timers()
+            self._schedule(chat_id)
+            self._wakeup.set()
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> float:
+        try:
+            return float(response.json()["parameters"]["retry_after"])
+        except Exception:
+            return 1.0
+
+    def _backoff(self, message: _Message, reason: str) -> Optional[float]:
+        message.attempts += 1
+        if message.attempts > self.max_retries:
+            logger.error(f"Giving up on message to chat_id {message.chat_id} after {self.max_retries} retries: {reason}")
+            self._finish(message, False)
+            return None
+
+        self.stats["retried"] += 1
+        delay = min(0.5 * 2 ** (message.attempts - 1), 30.0) * random.uniform(0.5, 1.5)
+        logger.warning(f"Telegram send to chat_id {message.chat_id} failed ({reason}), retry {message.attempts} in {delay:.1f}s")
+        return time.monotonic() + delay
+
+    def _finish(self, message: _Message, delivered: bool):
+        self._queued -= 1
+        self.stats["sent" if delivered else "failed"] += 1
+        if not message.future.done():
+            message.future.set_result(delivered)
+
+    def _prune_chat_timers(self):
+        if len(self._chat_next_at) < 10000:
+            return
+        now = time.monotonic()
+        for chat_id in [c for c, t in self._chat_next_at.items() if t < now and c not in self._chats]:
+            del self._chat_next_at[chat_id]
+
+    async def stop(self, timeout: float = 10.0):
+        """Drain queued messages for up to `timeout` seconds, then fail the rest"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Telegram dispatcher stopped with {self._queued} messages undelivered")
+        self._task.cancel()
+        for task in list(self._send_tasks):
+            task.cancel()
+
+        for queue in self._chats.values():
+            for message in queue:
+                self._finish(message, False)
+        self._chats.clear()
+        self._ready.clear()
+        self._scheduled.clear()
+        self._in_flight_chats.clear()
+        self._task = None
+
+
+_dispatcher_instance = None
+
+
+def get_dispatcher() -> TelegramDispatcher:
+    global _dispatcher_instance
+    if _dispatcher_instance is None:
+        _dispatcher_instance = TelegramDispatcher(
+            send=telegram_authz.post_send_message,
+            global_rate=settings.TELEGRAM_GLOBAL_RATE,
+            per_chat_rate=settings.TELEGRAM_PER_CHAT_RATE,
+            max_retries=settings.TELEGRAM_SEND_MAX_RETRIES,
+            max_queue=settings.TELEGRAM_SEND_QUEUE_SIZE,
+            concurrency=settings.TELEGRAM_SEND_CONCURRENCY
+        )
+    return _dispatcher_instance
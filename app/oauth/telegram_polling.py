@@ -0,0 +1,216 @@
+"""
+getUpdates long-polling ingestion, an alternative to the Telegram webhook.
+
+Enabled inside the app with TELEGRAM_INGESTION_MODE=polling, or run as a
+separate process next to the uvicorn workers serving the website:
+
+    python -m app.oauth.telegram_polling
+
+A separate process shares nothing in memory with the website, so it only
+starts with STORAGE_BACKEND=sql, as the CSV store allows a single writer,
+and with STATE_BACKEND=sqlite so /start codes issued by the website are in
+the shared state store. With STATELESS_AUTH_TOKENS=true the codes are
+signed tokens the poller verifies itself, and any STATE_BACKEND will do.
+(/auth/me responses aren't cached with the SQL backend, so the website
+sees its bindings at once.)
+
+Only one poller may run per bot token; Telegram rejects concurrent
+getUpdates calls.
+"""
+import asyncio
+import logging
+import os
+import random
+import signal
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from app.config import get_settings
+from app.oauth import http_clients, telegram_authz
+from app.oauth.telegram_dispatcher import get_dispatcher
+from app.oauth.telegram_webhook import delete_webhook, handle_update
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+UpdateHandler = Callable[[Dict], Awaitable[Dict]]
+
+
+class TelegramPoller:
+    """
+    Fetches updates in batches with getUpdates and hands each one to
+    handle_update with bounded concurrency.
+
+    The next offset is persisted to disk only after a whole batch has been
+    processed, so a restart re-fetches (rather than loses) an interrupted
+    batch.
+    """
+
+    def __init__(self, handler: UpdateHandler, offset_file: Path, timeout: int,
+                 limit: int, concurrency: int):
+        self.handler = handler
+        self.offset_file = Path(offset_file)
+        self.timeout = timeout
+        self.limit = limit
+        self.concurrency = concurrency
+
+        self.offset = self._load_offset()
+        self._task: Optional[asyncio.Task] = None
+        self._processing = False
+        self._stopping = False
+        self.stats = {"batches": 0, "processed": 0, "failed": 0, "errors": 0}
+
+    def _load_offset(self) -> int:
+        try:
+            return int(self.offset_file.read_text().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            logger.warning(f"Ignoring corrupt Telegram offset file {self.offset_file}")
+            return 0
+
+    def _save_offset(self):
+        self.offset_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.offset_file.with_suffix('.tmp')
+        temp_path.write_text(str(self.offset))
+        os.replace(temp_path, self.offset_file)
+
+    async def _get_updates(self) -> List[Dict]:
+        client = http_clients.get_telegram_client()
+        response = await client.post(
+            telegram_authz.api_url("getUpdates"),
+            json={
+                "offset": self.offset,
+                "limit": self.limit,
+                "timeout": self.timeout,
+                "allowed_updates": ["message"],
+            },
+            timeout=self.timeout + 10,
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"getUpdates failed: {response.status_code} - {response.text}")
+        return response.json().get("result", [])
+
+    async def _process(self, updates: List[Dict]):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def process_one(update: Dict):
+            async with semaphore:
+                try:
+                    await self.handler(update)
+                    self.stats["processed"] += 1
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.error(f"Failed to process Telegram update {update.get('update_id')}: {e}")
+
+        await asyncio.gather(*(process_one(update) for update in updates))
+
+    async def _run(self):
+        error_delay = 1.0
+        while not self._stopping:
+            try:
+                updates = await self._get_updates()
+                error_delay = 1.0
+            except (httpx.HTTPError, RuntimeError, ValueError) as e:
+                self.stats["errors"] += 1
+                delay = error_delay * random.uniform(0.5, 1.5)
+                logger.error(f"Telegram polling error: {e}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                error_delay = min(error_delay * 2, 30.0)
+                continue
+
+            if not updates:
+                continue
+
+            self._processing = True
+            try:
+                await self._process(updates)
+                self.offset = max(update["update_id"] for update in updates) + 1
+                self._save_offset()
+            finally:
+                self._processing = False
+            self.stats["batches"] += 1
+            logger.debug(f"Processed {len(updates)} Telegram updates, next offset {self.offset}")
+
+    async def start(self):
+        if self._task is not None:
+            return
+        # getUpdates is refused while a webhook is registered
+        if not await delete_webhook():
+            logger.warning("Could not delete Telegram webhook before polling")
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Telegram polling started at offset {self.offset}")
+
+    async def stop(self):
+        """Abort the pending long poll and wait for the current batch to finish"""
+        if self._task is None:
+            return
+        self._stopping = True
+        if not self._processing:
+            # Waiting on a long poll or an error backoff; nothing to lose
+            self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        logger.info("Telegram polling stopped")
+
+
+_poller_instance = None
+
+
+def get_poller() -> TelegramPoller:
+    global _poller_instance
+    if _poller_instance is None:
+        _poller_instance = TelegramPoller(
+            handle_update,
+            offset_file=Path(settings.CSV_DATA_DIR) / "telegram_offset",
+            timeout=settings.TELEGRAM_POLL_TIMEOUT,
+            limit=settings.TELEGRAM_POLL_BATCH_SIZE,
+            concurrency=settings.TELEGRAM_POLL_CONCURRENCY
+        )
+    return _poller_instance
+
+
+def check_standalone_config():
+    """Raise SystemExit unless a separate poller process would share the website's data"""
+    problems = []
+    if settings.STORAGE_BACKEND.lower() != "sql":
+        problems.append("STORAGE_BACKEND=sql (the CSV store allows only one writing process)")
+    if settings.STATE_BACKEND.lower() != "sqlite" and not settings.STATELESS_AUTH_TOKENS:
+        problems.append(
+            "STATE_BACKEND=sqlite or STATELESS_AUTH_TOKENS=true "
+            "(auth codes issued by the website are otherwise in its memory)"
+        )
+    if problems:
+        raise SystemExit(
+            "The standalone Telegram poller needs " + " and ".join(problems)
+            + "; or use TELEGRAM_INGESTION_MODE=polling to poll inside the app."
+        )
+
+
+async def main():
+    await http_clients.start_clients()
+    dispatcher = get_dispatcher()
+    await dispatcher.start()
+    poller = get_poller()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await poller.start()
+        await stop.wait()
+    finally:
+        await poller.stop()
+        await dispatcher.stop()
+        await http_clients.close_clients()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    check_standalone_config()
+    asyncio.run(main())
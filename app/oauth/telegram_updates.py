@@ -0,0 +1,154 @@
+"""Background processing of incoming Telegram updates"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.config import get_settings
+from app.oauth.telegram_webhook import handle_update
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+UpdateHandler = Callable[[Dict], Awaitable[Dict]]
+
+
+class UpdateQueue:
+    """
+    Bounded queue of Telegram updates drained by a pool of asyncio workers.
+
+    Lets the webhook acknowledge Telegram immediately. A bounded LRU of
+    recently seen update_ids drops redeliveries of updates that were already
+    accepted.
+    """
+
+    def __init__(self, handler: UpdateHandler, workers: int, max_queue: int, dedup_size: int):
+        self.handler = handler
+        self.worker_count = workers
+        self.max_queue = max_queue
+        self.dedup_size = dedup_size
+
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.stats = {
+            "accepted": 0,
+            "duplicates": 0,
+            "rejected": 0,
+            "processed": 0,
+            "failed": 0,
+            "last_lag_seconds": 0.0,
+            "max_lag_seconds": 0.0,
+        }
+
+    def _ensure_started(self):
+        if not self._workers:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._workers = [
+                asyncio.create_task(self._work(), name=f"telegram-update-worker-{i}")
+                for i in range(self.worker_count)
+            ]
+
+    async def start(self):
+        self._ensure_started()
+
+    def is_duplicate(self, update_id: int) -> bool:
+        if update_id in self._seen:
+            self._seen.move_to_end(update_id)
+            return True
+        return False
+
+    def claim(self, update_id: int) -> bool:
+        """Record an update handled outside the queue; False if it was already seen"""
+        if self.is_duplicate(update_id):
+            self.stats["duplicates"] += 1
+            return False
+        self._remember(update_id)
+        return True
+
+    def _remember(self, update_id: int):
+        self._seen[update_id] = None
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+
+    def enqueue(self, update: Dict) -> bool:
+        """
+        Queue an update for processing.
+
+        Returns False for an already seen update_id. Raises asyncio.QueueFull
+        when the backlog is at capacity, without remembering the update, so
+        Telegram's redelivery gets another chance.
+        """
+        self._ensure_started()
+        update_id = update["update_id"]
+        if self.is_duplicate(update_id):
+            self.stats["duplicates"] += 1
+            logger.info(f"Dropping duplicate Telegram update {update_id}")
+            return False
+
+        try:
+            self._queue.put_nowait((time.monotonic(), update))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            logger.warning(f"Telegram update queue full, rejecting update {update_id}")
+            raise
+
+        self._remember(update_id)
+        self.stats["accepted"] += 1
+        return True
+
+    async def _work(self):
+        while True:
+            enqueued_at, update = await self._queue.get()
+            lag = time.monotonic() - enqueued_at
+            self.stats["last_lag_seconds"] = lag
+            self.stats["max_lag_seconds"] = max(self.stats["max_lag_seconds"], lag)
+            try:
+                await self.handler(update)
+                self.stats["processed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"Failed to process Telegram update {update.get('update_id')}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def queue_stats(self) -> Dict:
+        depth = self._queue.qsize() if self._queue else 0
+        oldest_lag = 0.0
+        if depth:
+            oldest_lag = time.monotonic() - self._queue._queue[0][0]
+        return {
+            "queue_depth": depth,
+            "workers": len(self._workers),
+            "oldest_lag_seconds": round(oldest_lag, 3),
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in self.stats.items()},
+        }
+
+    async def stop(self, timeout: float = 10.0):
+        """Finish queued updates for up to `timeout` seconds, then cancel the workers"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping with {self._queue.qsize()} Telegram updates unprocessed")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+_update_queue_instance = None
+
+
+def get_update_queue() -> UpdateQueue:
+    global _update_queue_instance
+    if _update_queue_instance is None:
+        _update_queue_instance = UpdateQueue(
+            handle_update,
+            workers=settings.TELEGRAM_UPDATE_WORKERS,
+            max_queue=settings.TELEGRAM_UPDATE_QUEUE_SIZE,
+            dedup_size=settings.TELEGRAM_UPDATE_DEDUP_SIZE
+        )
+    return _update_queue_instance
@@ -1,61 +1,86 @@
-import httpx
 from typing import Dict, Optional
 from app.config import get_settings
+from app.oauth.http_clients import get_telegram_client
 from app.oauth import telegram_authz
-from app.storage.user_storage import get_user_storage
+from app.oauth.telegram_dispatcher import get_dispatcher
+from app.storage.async_storage import get_async_user_storage
+from app.binding_events import binding_notifier
 
 settings = get_settings()
 
 
 async def set_webhook(webhook_url: str) -> bool:
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/setWebhook"
+    url = telegram_authz.api_url("setWebhook")
     payload = {"url": webhook_url, "allowed_updates": ["message"]}
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(url, json=payload)
+        client = get_telegram_client()
+        response = await client.post(url, json=payload, timeout=30.0)
 
-            if response.status_code == 200:
-                result = response.json()
-                return result.get("ok", False)
+        if response.status_code == 200:
+            result = response.json()
+            return result.get("ok", False)
 
-            return False
+        return False
     except Exception as e:
         print(f"Error setting webhook: {e}")
         return False
 
 
 async def delete_webhook() -> bool:
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/deleteWebhook"
+    url = telegram_authz.api_url("deleteWebhook")
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url)
+        client = get_telegram_client()
+        response = await client.get(url)
 
-            if response.status_code == 200:
-                result = response.json()
-                return result.get("ok", False)
+        if response.status_code == 200:
+            result = response.json()
+            return result.get("ok", False)
 
-            return False
+        return False
     except Exception:
         return False
 
 
 async def get_webhook_info() -> Optional[Dict]:
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/getWebhookInfo"
+    url = telegram_authz.api_url("getWebhookInfo")
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url)
+        client = get_telegram_client()
+        response = await client.get(url)
 
-            if response.status_code == 200:
-                result = response.json()
-                return result.get("result")
+        if response.status_code == 200:
+            result = response.json()
+            return result.get("result")
 
-            return None
+        return None
     except Exception:
         return None
 
 
-async def handle_update(update: Dict) -> Dict:
+async def reply(chat_id: int, text: str, parse_mode: str = "HTML", inline: bool = False) -> Optional[Dict]:
+    """
+    Send a reply to a chat.
+
+    With inline=True nothing is sent; the sendMessage call is returned so the
+    webhook can hand it back to Telegram as its response body. Otherwise the
+    message is queued through the dispatcher, optionally waiting for delivery.
+    """
+    if inline:
+        return {"method": "sendMessage", "chat_id": chat_id, "text": text, "parse_mode": parse_mode}
+
+    delivery = get_dispatcher().submit(chat_id, text, parse_mode)
+    if settings.TELEGRAM_AWAIT_DELIVERY:
+        await delivery
+    return None
+
+
+def _with_reply(result: Dict, reply_method: Optional[Dict]) -> Dict:
+    if reply_method:
+        result["reply"] = reply_method
+    return result
+
+
+async def handle_update(update: Dict, inline_reply: bool = False) -> Dict:
     import logging
     logger = logging.getLogger(__name__)
 
@@ -78,23 +103,25 @@ async def handle_update(update: Dict) -> Dict:
     if text.startswith("/start "):
         auth_code = text.split(" ", 1)[1].strip()
         logger.info(f"Handling /start command with auth_code: {auth_code[:10]}...")
-        return await handle_start_command(auth_code, chat_id, user)
+        return await handle_start_command(auth_code, chat_id, user, inline_reply)
 
     elif text == "/start":
         logger.info(f"Sending welcome message to chat_id: {chat_id}")
-        await telegram_authz.send_message(
+        reply_method = await reply(
             chat_id,
-            "👋 Welcome! To connect your Telegram account, please use the link from the website."
+            "👋 Welcome! To connect your Telegram account, please use the link from the website.",
+            inline=inline_reply
         )
-        return {"ok": True, "message": "Sent welcome message"}
+        return _with_reply({"ok": True, "message": "Sent welcome message"}, reply_method)
 
     logger.info(f"Ignoring message: {text}")
     return {"ok": True, "message": "Message ignored"}
 
 
-async def handle_start_command(auth_code: str, chat_id: int, telegram_user: Dict) -> Dict:
+async def handle_start_command(auth_code: str, chat_id: int, telegram_user: Dict,
+                               inline_reply: bool = False) -> Dict:
     try:
-        auth_data = telegram_authz.verify_auth_code(auth_code)
+        auth_data = await telegram_authz.verify_auth_code(auth_code)
         if not auth_data:
             raise telegram_authz.TelegramAuthError("Invalid auth code")
 
@@ -102,7 +129,7 @@ async def handle_start_command(auth_code: str, chat_id: int, telegram_user: Dict
         if not user_id:
             raise telegram_authz.TelegramAuthError("No user_id in auth data")
 
-        user_session_id = telegram_authz.complete_authorization(auth_code, telegram_user)
+        user_session_id = await telegram_authz.complete_authorization(auth_code, telegram_user)
 
         telegram_id = str(telegram_user.get("id"))
         username = telegram_user.get("username")
@@ -110,9 +137,9 @@ async def handle_start_command(auth_code: str, chat_id: int, telegram_user: Dict
         last_name = telegram_user.get("last_name", "")
         display_name = username or f"{first_name} {last_name}".strip()
 
-        storage = get_user_storage()
+        storage = get_async_user_storage()
         try:
-            storage.bind_platform(
+            await storage.bind_platform(
                 user_id=user_id,
                 platform="telegram",
                 platform_user_id=telegram_id,
@@ -120,29 +147,33 @@ async def handle_start_command(auth_code: str, chat_id: int, telegram_user: Dict
             )
         except ValueError as e:
             raise telegram_authz.TelegramAuthError(str(e))
+        binding_notifier.notify(user_id)
 
-        await telegram_authz.send_message(
+        reply_method = await reply(
             chat_id,
             "✅ <b>Telegram account connected successfully!</b>\n\n"
             "You can now close this chat and return to the website.",
-            parse_mode="HTML"
+            parse_mode="HTML",
+            inline=inline_reply
         )
-        return {"ok": True, "message": "Authorization successful"}
+        return _with_reply({"ok": True, "message": "Authorization successful"}, reply_method)
 
     except telegram_authz.TelegramAuthError as e:
-        await telegram_authz.send_message(
+        reply_method = await reply(
             chat_id,
             f"❌ <b>Authorization failed:</b> {str(e)}\n\n"
             "Please try again from the website.",
-            parse_mode="HTML"
+            parse_mode="HTML",
+            inline=inline_reply
         )
-        return {"ok": False, "error": str(e)}
+        return _with_reply({"ok": False, "error": str(e)}, reply_method)
 
     except Exception as e:
-        await telegram_authz.send_message(
+        reply_method = await reply(
             chat_id,
             "❌ <b>An error occurred</b>\n\n"
             "Please try again later.",
-            parse_mode="HTML"
+            parse_mode="HTML",
+            inline=inline_reply
         )
-        return {"ok": False, "error": f"Unexpected error: {str(e)}"}
+        return _with_reply({"ok": False, "error": f"Unexpected error: {str(e)}"}, reply_method)
@@ -0,0 +1,74 @@
+"""
+Startup progress of the app's components, reported by /ready.
+
+Each component is a check returning a status dict with at least a
+"status" key. The app is ready once every required component is "ready";
+optional ones (the Sheets mirror) keep warming up in the background. The
+lifespan loads the required ones before the server accepts connections,
+so /ready mostly reports the optional ones.
+"""
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+DISABLED = "disabled"
+
+WARMING_UP = (PENDING, LOADING)
+
+
+class StartupStep:
+    """A startup step run in the lifespan: `with step:` marks it loading, then ready or failed"""
+
+    def __init__(self):
+        self.status = PENDING
+        self.error: Optional[str] = None
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    def __enter__(self):
+        self.status = LOADING
+        self.error = None
+        self._started = time.monotonic()
+        self._finished = None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._finished = time.monotonic()
+        self.status = FAILED if exc is not None else READY
+        if exc is not None:
+            self.error = str(exc)
+
+    def __call__(self) -> Dict:
+        state = {"status": self.status}
+        if self._started is not None:
+            state["seconds"] = round((self._finished or time.monotonic()) - self._started, 3)
+        if self.error:
+            state["error"] = self.error
+        return state
+
+
+class Readiness:
+    def __init__(self):
+        self._checks: Dict[str, Tuple[Callable[[], Dict], bool]] = {}
+
+    def add(self, name: str, check: Callable[[], Dict], required: bool = True):
+        self._checks[name] = (check, required)
+
+    def report(self) -> Dict:
+        components = {}
+        ready = True
+        warming_up = False
+        for name, (check, required) in self._checks.items():
+            state = {**check(), "required": required}
+            components[name] = state
+            if required and state["status"] != READY:
+                ready = False
+            if state["status"] in WARMING_UP:
+                warming_up = True
+        return {"ready": ready, "warming_up": warming_up, "components": components}
+
+
+readiness = Readiness()
@@ -0,0 +1,78 @@
+"""Per-user cache of rendered JSON responses with ETags"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak If-None-Match comparison against a comma-separated tag list or *"""
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == target:
+            return True
+    return False
+
+
+class UserResponseCache:
+    """
+    Bounded LRU of user_id -> (etag, body), cleared for a user by invalidate().
+    Entries also expire after ttl seconds, which bounds how stale they get
+    when a change is made by another process that can't invalidate them.
+
+    Storage notifies invalidate() from worker threads while responses are
+    being built on the event loop, so put() takes the version returned by
+    version() before the storage read and drops the body if the user was
+    invalidated in between.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        # user_id -> (etag, body, expires at)
+        self._entries: "OrderedDict[int, Tuple[str, bytes, float]]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, user_id: int) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[2] <= time.monotonic():
+                del self._entries[user_id]
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return entry[0], entry[1]
+
+    def version(self, user_id: int) -> int:
+        return self._versions.get(user_id, 0)
+
+    def put(self, user_id: int, version: int, body: bytes) -> str:
+        """Cache a body built from data read at `version`; returns its ETag"""
+        etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        if self.max_size <= 0:
+            return etag
+        with self._lock:
+            if self._versions.get(user_id, 0) == version:
+                self._entries[user_id] = (etag, body, time.monotonic() + self.ttl)
+                self._entries.move_to_end(user_id)
+                if len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return etag
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+            self.stats["invalidations"] += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
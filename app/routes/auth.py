@@ -1,21 +1,43 @@
 from fastapi import APIRouter, HTTPException, Query, Depends, Response, Request
-from fastapi.responses import RedirectResponse, HTMLResponse
+from fastapi.responses import RedirectResponse, HTMLResponse, JSONResponse, StreamingResponse
+import asyncio
+import json
 import secrets
 
-from app.storage.user_storage import get_user_storage
+from app.config import get_settings
+from app.storage.async_storage import get_async_user_storage, StorageBusyError
 from app.oauth import discord, telegram_authz
+from app.oauth.telegram_updates import get_update_queue
 from app.oauth.telegram_webhook import handle_update
 from app.session import session_manager, get_current_user_id
+from app.binding_events import binding_notifier
+from app.response_cache import UserResponseCache, etag_matches
+from app.state_store import create_state_store
+from app import signed_tokens
+
+settings = get_settings()
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-oauth_states = {}
+# Platforms a user must bind for their account to count as complete
+REQUIRED_PLATFORMS = ['discord', 'telegram']
+
+oauth_states = create_state_store("oauth_states", settings.OAUTH_STATE_TTL)
+# Invalidated through the storage change listener registered in app.main;
+# other workers' writes can't reach it, so it is off with the SQL backend
+me_cache = UserResponseCache(
+    0 if settings.STORAGE_BACKEND.lower() == "sql" else settings.ME_CACHE_SIZE,
+    settings.ME_CACHE_TTL
+)
 
 
 @router.get("/discord")
 async def discord_auth():
-    state = secrets.token_urlsafe(32)
-    oauth_states[state] = "discord"
+    if settings.STATELESS_AUTH_TOKENS:
+        state = signed_tokens.issue_token("discord", None, settings.OAUTH_STATE_TTL)
+    else:
+        state = secrets.token_urlsafe(32)
+        await oauth_states.set(state, "discord")
     auth_url = discord.get_authorization_url(state)
     return RedirectResponse(auth_url)
 
@@ -32,22 +54,24 @@ async def discord_callback(
     if not code or not state:
         return RedirectResponse(f"/?error=Invalid authentication request", status_code=303)
 
-    if state not in oauth_states:
+    if settings.STATELESS_AUTH_TOKENS:
+        state_valid = signed_tokens.consume_token("discord", state) is not None
+    else:
+        state_valid = await oauth_states.pop(state) is not None
+    if not state_valid:
         return RedirectResponse(f"/?error=Authentication session expired. Please try again.", status_code=303)
 
-    del oauth_states[state]
-
     try:
         token_data, user_info = await discord.process_callback(code)
     except discord.DiscordAuthError as e:
         return RedirectResponse(f"/?error=Discord authentication failed. Please try again.", status_code=303)
 
-    storage = get_user_storage()
-    user = storage.get_user_by_platform("discord", user_info["id"])
+    storage = get_async_user_storage()
 
     try:
+        user = await storage.get_user_by_platform("discord", user_info["id"])
         if user:
-            user = storage.bind_platform(
+            user = await storage.bind_platform(
                 user_id=user['id'],
                 platform="discord",
                 platform_user_id=user_info["id"],
@@ -55,9 +79,9 @@ async def discord_callback(
             )
             user_id = user['id']
         else:
-            user = storage.create_user()
+            user = await storage.create_user()
             user_id = user['id']
-            storage.bind_platform(
+            await storage.bind_platform(
                 user_id=user_id,
                 platform="discord",
                 platform_user_id=user_info["id"],
@@ -91,51 +115,122 @@ async def discord_callback(
     return html_response
 
 
-@router.get("/me")
-async def get_current_user(user_id: int = Depends(get_current_user_id)):
-    storage = get_user_storage()
-    user = storage.get_user(user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    bindings = {}
-    for platform in ['discord', 'telegram']:
-        platform_data = user.get(platform)
-        if platform_data and platform_data.get('bound'):
-            bindings[platform] = {
-                "username": platform_data.get('username'),
-                "platform_user_id": platform_data.get('id'),
-                "bound": True
-            }
-
-    discord_bound = 'discord' in bindings
-    telegram_bound = 'telegram' in bindings
+def _user_status(user: dict) -> dict:
+    bindings = {
+        platform: {
+            "username": binding.get('username'),
+            "platform_user_id": binding.get('id'),
+            "bound": True
+        }
+        for platform, binding in user['bindings'].items()
+    }
+    is_complete = all(platform in bindings for platform in REQUIRED_PLATFORMS)
 
     return {
         "user_id": user['id'],
         "bindings": bindings,
-        "is_complete": discord_bound and telegram_bound,
-        "all_platforms_bound": len(bindings) == 2
+        "is_complete": is_complete,
+        "all_platforms_bound": is_complete
     }
 
 
+@router.get("/me")
+async def get_current_user(request: Request, user_id: int = Depends(get_current_user_id)):
+    cached = me_cache.get(user_id)
+    if cached is None:
+        version = me_cache.version(user_id)
+        storage = get_async_user_storage()
+        try:
+            user = await storage.get_user(user_id)
+        except StorageBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        body = json.dumps(_user_status(user)).encode()
+        cached = (me_cache.put(user_id, version, body), body)
+
+    etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/me/events")
+async def current_user_events(request: Request, user_id: int = Depends(get_current_user_id)):
+    """
+    Server-Sent Events stream of the /auth/me payload.
+
+    Sends the current status, then a new event whenever the user's bindings
+    change. Between changes it only sends keepalive comments; storage is
+    re-read on each wakeup so changes made by another worker still arrive.
+    """
+    storage = get_async_user_storage()
+
+    async def events():
+        last_status = None
+        deadline = asyncio.get_running_loop().time() + settings.BINDING_EVENTS_MAX_DURATION
+        with binding_notifier.watch(user_id) as changes:
+            while True:
+                # Armed before the read, so a change made during it still wakes us
+                changes.arm()
+                try:
+                    user = await storage.get_user(user_id)
+                except StorageBusyError:
+                    user = None
+                if user:
+                    status = _user_status(user)
+                    if status != last_status:
+                        last_status = status
+                        yield f"data: {json.dumps(status)}\n\n"
+                else:
+                    yield ": keepalive\n\n"
+
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0 or await request.is_disconnected():
+                    return
+                if not await changes.wait(min(settings.BINDING_EVENTS_KEEPALIVE, remaining)):
+                    yield ": keepalive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/telegram")
 async def telegram_auth(user_id: int = Depends(get_current_user_id)):
-    auth_code = telegram_authz.generate_auth_code(str(user_id))
-    if auth_code in telegram_authz.pending_auth_codes:
-        telegram_authz.pending_auth_codes[auth_code]["user_id"] = user_id
+    auth_code = await telegram_authz.generate_auth_code(str(user_id), user_id=user_id)
     auth_url = telegram_authz.get_authorization_url(auth_code)
-    return {"auth_url": auth_url, "expires_in": 900}
+    return {"auth_url": auth_url, "expires_in": settings.TELEGRAM_AUTH_CODE_TTL}
 
 
 @router.post("/telegram/webhook")
 async def telegram_webhook(request: Request):
     try:
         update = await request.json()
-        result = await handle_update(update)
-        return result
-    except Exception as e:
-        return {"ok": False, "error": str(e)}
+    except Exception:
+        return {"ok": False, "error": "Invalid JSON"}
+
+    if not isinstance(update, dict) or not isinstance(update.get("update_id"), int):
+        return {"ok": False, "error": "Invalid update"}
+
+    if settings.TELEGRAM_WEBHOOK_INLINE_REPLY:
+        if not get_update_queue().claim(update["update_id"]):
+            return {"ok": True}
+        result = await handle_update(update, inline_reply=True)
+        # Telegram performs a method call returned as the webhook response
+        return result.get("reply") or {"ok": result.get("ok", True)}
+
+    try:
+        queued = get_update_queue().enqueue(update)
+    except asyncio.QueueFull:
+        # Non-2xx makes Telegram redeliver the update later
+        return JSONResponse({"ok": False, "error": "Busy"}, status_code=503)
+
+    return {"ok": True, "queued": queued}
 
 
 @router.post("/logout")
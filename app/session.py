@@ -1,6 +1,9 @@
+import threading
+import time
+from collections import OrderedDict
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from fastapi import Cookie, HTTPException, Response
-from typing import Optional
+from typing import Optional, Tuple
 from app.config import get_settings
 
 settings = get_settings()
@@ -11,6 +14,10 @@ class SessionManager:
         self.serializer = URLSafeTimedSerializer(settings.SECRET_KEY)
         self.cookie_name = "session"
         self.max_age = 86400 * 7
+        # token -> (user_id, expires_at) for recently verified tokens
+        self._verified: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._verified_lock = threading.Lock()
+        self.cache_size = settings.SESSION_CACHE_SIZE
 
     def create_session(self, user_id: int) -> str:
         return self.serializer.dumps({"user_id": user_id})
@@ -19,12 +26,30 @@ class SessionManager:
         if not session_token:
             return None
 
+        with self._verified_lock:
+            cached = self._verified.get(session_token)
+            if cached is not None:
+                if time.time() < cached[1]:
+                    self._verified.move_to_end(session_token)
+                    return cached[0]
+                del self._verified[session_token]
+
         try:
-            data = self.serializer.loads(session_token, max_age=self.max_age)
-            return data.get("user_id")
+            data, signed_at = self.serializer.loads(
+                session_token, max_age=self.max_age, return_timestamp=True
+            )
         except (BadSignature, SignatureExpired):
             return None
 
+        user_id = data.get("user_id")
+        if user_id and self.cache_size > 0:
+            # Only verified tokens are cached, so forged cookies can't flush it
+            with self._verified_lock:
+                self._verified[session_token] = (user_id, signed_at.timestamp() + self.max_age)
+                if len(self._verified) > self.cache_size:
+                    self._verified.popitem(last=False)
+        return user_id
+
     def set_session_cookie(self, response: Response, user_id: int):
         session_token = self.create_session(user_id)
         is_production = settings.ENVIRONMENT == "production"
@@ -0,0 +1,142 @@
+"""
+Compact signed one-time tokens for stateless OAuth state and Telegram auth codes.
+
+Single use is enforced per process: each process has its own replay filter.
+"""
+import base64
+import hashlib
+import hmac
+import math
+import secrets
+import struct
+import threading
+import time
+from typing import Optional
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# version, user_id, expires_at, nonce
+_PAYLOAD = struct.Struct(">BIIQ")
+_VERSION = 1
+_MAC_SIZE = 16
+
+
+class ReplayFilter:
+    """
+    Rotating Bloom filter of consumed token nonces.
+
+    Two generations are kept and the older one is dropped every `window`
+    seconds, so a nonce is remembered for at least `window` seconds - longer
+    than any token it guards can live. Memory stays fixed regardless of login
+    volume; the price is a small false-positive rate (a fresh token refused
+    as already used) once a generation holds more than `capacity` nonces.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, window: float):
+        self.window = window
+        self.bits = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._lock = threading.Lock()
+        self._current = bytearray((self.bits + 7) // 8)
+        self._previous = bytearray(len(self._current))
+        self._rotated_at = time.monotonic()
+
+    def _positions(self, key: bytes):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1, h2 = struct.unpack(">QQ", digest)
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    @staticmethod
+    def _has(bits: bytearray, positions) -> bool:
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def _rotate_if_due(self):
+        if time.monotonic() - self._rotated_at >= self.window:
+            self._previous = self._current
+            self._current = bytearray(len(self._previous))
+            self._rotated_at = time.monotonic()
+
+    def __contains__(self, key: bytes) -> bool:
+        positions = self._positions(key)
+        with self._lock:
+            self._rotate_if_due()
+            return self._has(self._current, positions) or self._has(self._previous, positions)
+
+    def add(self, key: bytes) -> bool:
+        """Record a key; False if it was (probably) already present"""
+        positions = self._positions(key)
+        with self._lock:
+            self._rotate_if_due()
+            if self._has(self._current, positions) or self._has(self._previous, positions):
+                return False
+            for p in positions:
+                self._current[p >> 3] |= 1 << (p & 7)
+            return True
+
+
+def _key(purpose: str) -> bytes:
+    return hmac.new(settings.SECRET_KEY.encode(), f"signed-token:{purpose}".encode(), hashlib.sha256).digest()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(token: str) -> bytes:
+    return base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+
+
+def issue_token(purpose: str, user_id: Optional[int], ttl: float) -> str:
+    """
+    Return a 44-character URL-safe token binding `user_id` (0 for none) to
+    `purpose` until now + ttl. Fits Telegram's 64-character start parameter.
+    """
+    payload = _PAYLOAD.pack(_VERSION, user_id or 0, int(time.time() + ttl), secrets.randbits(64))
+    mac = hmac.new(_key(purpose), payload, hashlib.sha256).digest()[:_MAC_SIZE]
+    return _b64encode(payload + mac)
+
+
+def _decode(purpose: str, token: str) -> Optional[tuple]:
+    if not token or len(token) > 64:
+        return None
+    try:
+        raw = _b64decode(token)
+    except ValueError:
+        return None
+    if len(raw) != _PAYLOAD.size + _MAC_SIZE:
+        return None
+
+    payload, mac = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+    expected = hmac.new(_key(purpose), payload, hashlib.sha256).digest()[:_MAC_SIZE]
+    if not hmac.compare_digest(mac, expected):
+        return None
+
+    version, user_id, expires_at, nonce = _PAYLOAD.unpack(payload)
+    if version != _VERSION or time.time() >= expires_at:
+        return None
+    return user_id, purpose.encode() + b":" + payload[-8:]
+
+
+def verify_token(purpose: str, token: str) -> Optional[int]:
+    """Return the embedded user_id of a valid, unused token without consuming it"""
+    decoded = _decode(purpose, token)
+    if decoded is None or decoded[1] in replay_filter:
+        return None
+    return decoded[0]
+
+
+def consume_token(purpose: str, token: str) -> Optional[int]:
+    """Like verify_token, but marks the token used; a second call returns None"""
+    decoded = _decode(purpose, token)
+    if decoded is None or not replay_filter.add(decoded[1]):
+        return None
+    return decoded[0]
+
+
+replay_filter = ReplayFilter(
+    capacity=settings.AUTH_STATE_MAX_ENTRIES,
+    error_rate=settings.REPLAY_FILTER_ERROR_RATE,
+    window=max(settings.OAUTH_STATE_TTL, settings.TELEGRAM_AUTH_CODE_TTL)
+)
@@ -0,0 +1,220 @@
+"""Pluggable key/value stores for short-lived login state"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app import metrics
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class StateStore(ABC):
+    """
+    Interface for the OAuth state / Telegram auth code stores.
+
+    pop() must be atomic: of several concurrent pops of the same key (even
+    from different processes) exactly one gets the value.
+    """
+
+    name = "store"
+    # Calls may wait on I/O or another process's lock, so async code runs
+    # them on a worker thread (see AsyncStateStore)
+    blocking = False
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a value that expires after ttl seconds (or the store default)"""
+
+    @abstractmethod
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return a live value without consuming it"""
+
+    @abstractmethod
+    def pop(self, key: str, default: Any = None) -> Any:
+        """Atomically remove and return a live value"""
+
+    @abstractmethod
+    def sweep(self) -> int:
+        """Drop expired entries and return how many were removed"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+
+class SQLiteStateStore(StateStore):
+    """
+    State store in a local SQLite file shared by every worker process on the
+    host. Values are stored as JSON; expiry uses wall-clock time so all
+    processes agree on it.
+    """
+
+    blocking = True
+
+    def __init__(self, path: Path, namespace: str, default_ttl: float, max_size: int):
+        self.path = Path(path)
+        self.name = namespace
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        self.max_size = max_size
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=5.0, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS state_expiry ON state (namespace, expires_at)"
+        )
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + (ttl if ttl is not None else self.default_ttl)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), expires_at)
+            )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front, so no other
+            # process can read the row between our SELECT and DELETE
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM state WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "DELETE FROM state WHERE namespace = ? AND key = ?",
+                        (self.namespace, key)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if not row or row[1] <= time.time():
+            return default
+        return json.loads(row[0])
+
+    def sweep(self) -> int:
+        """Delete expired entries, then trim the oldest ones beyond max_size"""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM state WHERE namespace = ? AND expires_at <= ?",
+                (self.namespace, time.time())
+            ).rowcount
+            excess = self._count() - self.max_size
+            if excess > 0:
+                removed += self._conn.execute(
+                    "DELETE FROM state WHERE rowid IN ("
+                    " SELECT rowid FROM state WHERE namespace = ?"
+                    " ORDER BY expires_at LIMIT ?)",
+                    (self.namespace, excess)
+                ).rowcount
+        if removed:
+            logger.debug(f"Expired {removed} entries from {self.name}")
+        return removed
+
+    def _count(self) -> int:
+        """Entries in this namespace; the caller holds _lock"""
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM state WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+
+    def __len__(self) -> int:
+        # Called from the metrics thread too, so it shares the connection lock
+        with self._lock:
+            return self._count()
+
+
+class AsyncStateStore:
+    """
+    Async facade over a StateStore, used by request handlers. Blocking stores
+    run on a worker thread, so a busy SQLite lock held by another worker
+    stalls only the request waiting for it; in-memory stores are called
+    directly.
+    """
+
+    def __init__(self, store: StateStore):
+        self.store = store
+        self.name = store.name
+
+    async def _call(self, func, *args):
+        if self.store.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self._call(self.store.set, key, value, ttl)
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        return await self._call(self.store.get, key, default)
+
+    async def pop(self, key: str, default: Any = None) -> Any:
+        return await self._call(self.store.pop, key, default)
+
+    async def sweep(self) -> int:
+        return await self._call(self.store.sweep)
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+
+def create_state_store(name: str, default_ttl: float) -> AsyncStateStore:
+    """Build the store selected by STATE_BACKEND ("memory" or "sqlite")"""
+    backend = settings.STATE_BACKEND.lower()
+    if backend == "memory":
+        from app.ttl_store import TTLStore
+        store = TTLStore(default_ttl=default_ttl, max_size=settings.AUTH_STATE_MAX_ENTRIES, name=name)
+    elif backend == "sqlite":
+        path = settings.STATE_DB_PATH or str(Path(settings.CSV_DATA_DIR) / "state.db")
+        store = SQLiteStateStore(
+            path, namespace=name, default_ttl=default_ttl, max_size=settings.AUTH_STATE_MAX_ENTRIES
+        )
+    else:
+        raise ValueError(f"Unknown STATE_BACKEND: {settings.STATE_BACKEND}")
+    _stores[name] = store
+    return AsyncStateStore(store)
+
+
+# Every store create_state_store() has built, for the size gauge
+_stores: Dict[str, StateStore] = {}
+
+metrics.CallbackMetric(
+    "state_store_entries", "Entries in the OAuth state / Telegram auth code stores",
+    lambda: {name: len(store) for name, store in _stores.items()}, ("store",)
+)
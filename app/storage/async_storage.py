@@ -0,0 +1,115 @@
+"""Async facade over the blocking storage backends"""
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from app import metrics
+from app.config import get_settings
+from app.storage.base import UserStorageBackend
+from app.storage.records import UserView
+from app.storage.user_storage import get_user_storage
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class StorageBusyError(RuntimeError):
+    pass
+
+
+class AsyncUserStorage:
+    """
+    Runs UserStorageBackend calls on a dedicated, bounded thread pool so
+    file I/O, lock waits and Google Sheets calls never block the event loop.
+
+    At most max_pending calls may be queued or running at once; further
+    calls fail fast with StorageBusyError instead of piling up.
+    """
+
+    def __init__(self, backend: UserStorageBackend, max_workers: int, max_pending: int):
+        self.backend = backend
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="user-storage"
+        )
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def _run(self, func, *args, **kwargs):
+        # Only touched from the event loop thread, so no lock is needed
+        if self._pending >= self.max_pending:
+            logger.warning(f"Storage queue full ({self._pending} pending), rejecting call")
+            raise StorageBusyError("Storage is busy, please try again")
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(self._timed, func, *args, **kwargs)
+            )
+        finally:
+            self._pending -= 1
+
+    @staticmethod
+    def _timed(func, *args, **kwargs):
+        # Timed on the worker thread, so time queued for the pool is excluded
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.observe_since(metrics.storage_operation_duration, started, func.__name__)
+
+    async def create_user(self) -> UserView:
+        return await self._run(self.backend.create_user)
+
+    async def get_user(self, user_id: int) -> Optional[UserView]:
+        return await self._run(self.backend.get_user, user_id)
+
+    async def get_user_by_platform(self, platform: str, platform_user_id: str) -> Optional[UserView]:
+        return await self._run(self.backend.get_user_by_platform, platform, platform_user_id)
+
+    async def bind_platform(self, user_id: int, platform: str,
+                            platform_user_id: str, username: Optional[str] = None) -> UserView:
+        return await self._run(
+            self.backend.bind_platform,
+            user_id=user_id,
+            platform=platform,
+            platform_user_id=platform_user_id,
+            username=username
+        )
+
+    async def unbind_platform(self, user_id: int, platform: str) -> Optional[UserView]:
+        return await self._run(self.backend.unbind_platform, user_id, platform)
+
+    async def get_all_users(self) -> List[UserView]:
+        return await self._run(self.backend.get_all_users)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_async_storage_instance = None
+
+
+def get_async_user_storage() -> AsyncUserStorage:
+    global _async_storage_instance
+    if _async_storage_instance is None:
+        _async_storage_instance = AsyncUserStorage(
+            get_user_storage(),
+            max_workers=settings.STORAGE_EXECUTOR_WORKERS,
+            max_pending=settings.STORAGE_MAX_PENDING
+        )
+    return _async_storage_instance
+
+
+metrics.CallbackMetric(
+    "storage_pending_calls", "Storage calls queued or running on the storage thread pool",
+    lambda: _async_storage_instance.pending if _async_storage_instance else 0
+)
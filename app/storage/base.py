@@ -0,0 +1,133 @@
+"""Storage backend interface shared by the CSV and SQL user stores"""
+import logging
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.storage.records import UserRecord, UserView
+
+logger = logging.getLogger(__name__)
+
+
+class UserStorageBackend(ABC):
+    """
+    Interface for user/binding storage.
+
+    Users (USER_COLUMNS) and bindings (BINDING_COLUMNS, one per user and
+    platform) are stored separately, so supporting another platform only
+    means adding it to PLATFORMS. Backends hold users as compact
+    UserRecords and return them as read-only UserView mappings, which
+    have the keys of the nested user dict (see _to_user).
+
+    COLUMNS is a flattened one-row-per-user view, used for the Google Sheets
+    mirror and bulk CSV files. Flat rows may also carry BINDING_TIME_COLUMNS,
+    a binding's own timestamps, which bulk copies stage but Sheets doesn't show.
+    """
+
+    PLATFORMS = ['discord', 'telegram', 'twitter']
+    USER_COLUMNS = ['user_id', 'created_at', 'updated_at']
+    BINDING_COLUMNS = ['user_id', 'platform', 'platform_user_id', 'username', 'created_at', 'updated_at']
+    COLUMNS = USER_COLUMNS + [f'{p}_{field}' for p in PLATFORMS for field in ('id', 'username')]
+    BINDING_TIME_COLUMNS = [f'{p}_{field}' for p in PLATFORMS for field in ('created_at', 'updated_at')]
+
+    def __init__(self):
+        self._change_listeners: List[Callable[[int], None]] = []
+
+    def add_change_listener(self, listener: Callable[[int], None]):
+        """Call listener(user_id) after a user is created, bound or unbound (added once)"""
+        if listener not in self._change_listeners:
+            self._change_listeners.append(listener)
+
+    def _notify_change(self, user_id: int):
+        for listener in self._change_listeners:
+            try:
+                listener(user_id)
+            except Exception as e:
+                logger.error(f"User change listener failed: {e}")
+
+    @abstractmethod
+    def create_user(self) -> UserView:
+        """Create an empty user and return it"""
+
+    @abstractmethod
+    def get_user(self, user_id: int) -> Optional[UserView]:
+        """Return a user by ID, or None"""
+
+    @abstractmethod
+    def get_user_by_platform(self, platform: str, platform_user_id: str) -> Optional[UserView]:
+        """Return the user bound to a platform account, or None"""
+
+    @abstractmethod
+    def bind_platform(self, user_id: int, platform: str,
+                      platform_user_id: str, username: Optional[str] = None) -> UserView:
+        """
+        Bind a platform account to a user.
+
+        Raises ValueError if the account is bound to another user or the
+        user does not exist.
+        """
+
+    @abstractmethod
+    def unbind_platform(self, user_id: int, platform: str) -> Optional[UserView]:
+        """Remove a platform binding; returns None if the user does not exist"""
+
+    @abstractmethod
+    def get_all_users(self) -> List[UserView]:
+        """Return every user"""
+
+    @abstractmethod
+    def iter_rows(self) -> Iterator[Dict]:
+        """Yield every user as a flat COLUMNS row, in bounded memory where possible"""
+
+    @abstractmethod
+    def import_rows(self, rows: Iterable[Dict], replace: bool = False) -> int:
+        """
+        Bulk-load flat COLUMNS rows, keeping their user_ids, and return the
+        count. Rows must already be validated; per-row journaling, Sheets
+        sync and change notifications are skipped.
+
+        Raises ValueError if the store is not empty, unless replace is set.
+        """
+
+    def _to_user(self, record: UserRecord) -> UserView:
+        """
+        API view of a user: {'id', 'created_at', 'updated_at', 'bindings':
+        {platform: {'id', 'username', 'bound'}}} plus each platform's
+        binding (or None) under its own key
+        """
+        return UserView(record, self.PLATFORMS)
+
+    def _flat_row(self, record: UserRecord) -> Dict:
+        row = {col: '' for col in self.COLUMNS}
+        row.update(record.row())
+        for binding in record.bindings:
+            row[f'{binding.platform}_id'] = binding.platform_user_id
+            row[f'{binding.platform}_username'] = binding.username
+            binding_row = binding.row(record.user_id)
+            row[f'{binding.platform}_created_at'] = binding_row['created_at']
+            row[f'{binding.platform}_updated_at'] = binding_row['updated_at']
+        return row
+
+    @classmethod
+    def _split_flat_row(cls, row: Dict) -> Tuple[Dict, List[Dict]]:
+        """Inverse of _flat_row: (user row, bindings); bindings without their own times get the user's updated_at"""
+        user_row = {col: row.get(col) or '' for col in cls.USER_COLUMNS}
+        bindings = [
+            {
+                'user_id': user_row['user_id'],
+                'platform': platform,
+                'platform_user_id': row[f'{platform}_id'],
+                'username': row.get(f'{platform}_username') or '',
+                'created_at': row.get(f'{platform}_created_at') or user_row['updated_at'],
+                'updated_at': row.get(f'{platform}_updated_at') or user_row['updated_at'],
+            }
+            for platform in cls.PLATFORMS
+            if row.get(f'{platform}_id')
+        ]
+        return user_row, bindings
+
+    @staticmethod
+    def duplicate_binding_error(platform: str) -> ValueError:
+        platform_name = platform.capitalize()
+        return ValueError(
+            f"This {platform_name} account is already connected. Please use a different {platform_name} account or contact support."
+        )
@@ -0,0 +1,34 @@
+"""In-memory account index of platform bindings for the CSV backend"""
+from typing import Dict, List, Optional
+
+from app.storage.records import Compact
+
+
+class BindingIndex:
+    """
+    (platform, account id) -> user_id for the users held in memory, so
+    finding an account's owner is a dict access however many platforms
+    there are. Account ids are keyed as records store them (see
+    records.encode_id); the bindings themselves live on each UserRecord.
+    """
+
+    def __init__(self, platforms: List[str]):
+        self._by_platform: Dict[str, Dict[Compact, int]] = {p: {} for p in platforms}
+
+    def supports(self, platform: str) -> bool:
+        return platform in self._by_platform
+
+    def owner(self, platform: str, account_id: Compact) -> Optional[int]:
+        return self._by_platform.get(platform, {}).get(account_id)
+
+    def put(self, platform: str, account_id: Compact, user_id: int):
+        self._by_platform[platform][account_id] = user_id
+
+    def remove(self, platform: str, account_id: Compact, user_id: int):
+        """Drop an account, unless it has since been bound to someone else"""
+        index = self._by_platform[platform]
+        if index.get(account_id) == user_id:
+            del index[account_id]
+
+    def __len__(self) -> int:
+        return sum(len(index) for index in self._by_platform.values())
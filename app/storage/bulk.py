@@ -0,0 +1,355 @@
+"""
+Streaming bulk import/export of user data.
+
+    python -m app.storage.bulk import legacy:example_data
+    python -m app.storage.bulk import csv:/backups/users.csv --replace
+    python -m app.storage.bulk export csv:/backups/users.csv
+    python -m app.storage.bulk export legacy:/backups/legacy
+    python -m app.storage.bulk validate csv:/backups/users.csv
+
+Locations are `csv:<file>` (one row per user with an id/username column
+pair per platform, as mirrored to Google Sheets), `legacy:<dir>` (the old
+users.csv + bindings.csv export with tokens) or `backend` (the configured
+STORAGE_BACKEND). Run imports while the app is stopped.
+
+Every copy goes through a staging file, so the source is read exactly once
+and memory stays bounded: rows are normalised into a temporary flat CSV
+while user ids and platform ids are spread over hash partitions on disk.
+Each partition is then checked for duplicates on its own before anything
+is written to the target.
+"""
+import argparse
+import csv
+import logging
+import re
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.storage.base import UserStorageBackend
+from app.storage.user_storage import get_user_storage
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = UserStorageBackend.COLUMNS
+# The staging file also keeps each binding's own timestamps
+STAGING_COLUMNS = COLUMNS + UserStorageBackend.BINDING_TIME_COLUMNS
+PLATFORMS = UserStorageBackend.PLATFORMS
+LEGACY_USER_COLUMNS = ['id', 'created_at', 'updated_at']
+LEGACY_BINDING_COLUMNS = [
+    'id', 'user_id', 'platform', 'platform_user_id', 'platform_username',
+    'access_token', 'refresh_token', 'created_at', 'updated_at'
+]
+PROGRESS_EVERY = 100000
+_SEPARATORS = re.compile(r'[\t\r\n]')
+MAX_REPORTED_PROBLEMS = 20
+
+
+class BulkError(Exception):
+    pass
+
+
+class Progress:
+    """Counts rows for one phase and logs throughput"""
+
+    def __init__(self, phase: str):
+        self.phase = phase
+        self.rows = 0
+        self.started = time.monotonic()
+
+    def tick(self):
+        self.rows += 1
+        if self.rows % PROGRESS_EVERY == 0:
+            logger.info(f"{self.phase}: {self.rows} rows ({self.rate:.0f} rows/s)")
+
+    @property
+    def rate(self) -> float:
+        return self.rows / max(time.monotonic() - self.started, 1e-9)
+
+    def done(self):
+        elapsed = time.monotonic() - self.started
+        logger.info(f"{self.phase}: {self.rows} rows in {elapsed:.1f}s ({self.rate:.0f} rows/s)")
+
+
+class HashPartitions:
+    """Appends tab-separated records to one of `count` files chosen by key hash"""
+
+    def __init__(self, directory: Path, name: str, count: int):
+        self.paths = [directory / f"{name}.{i}" for i in range(count)]
+        self._files = [open(path, 'w', newline='') for path in self.paths]
+
+    def add(self, key: str, *fields: str):
+        index = zlib.crc32(key.encode()) % len(self._files)
+        line = '\t'.join(_SEPARATORS.sub(' ', field) for field in (key,) + fields)
+        self._files[index].write(line + '\n')
+
+    def close(self):
+        for f in self._files:
+            f.close()
+
+    def __iter__(self) -> Iterator[List[List[str]]]:
+        """Yield each partition's records, one partition in memory at a time"""
+        self.close()
+        for path in self.paths:
+            with open(path, newline='') as f:
+                yield [line.rstrip('\n').split('\t') for line in f]
+
+
+# Readers yield (row, problem); exactly one of the two is set
+
+def _clean(value: Optional[str]) -> str:
+    return (value or '').strip()
+
+
+def _normalize(row: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+    user_id = _clean(row.get('user_id'))
+    if not user_id.isdigit() or int(user_id) <= 0:
+        return None, f"invalid user_id {user_id!r}"
+    normalized = {col: _clean(row.get(col)) for col in STAGING_COLUMNS}
+    normalized['user_id'] = str(int(user_id))
+    now = datetime.utcnow().isoformat()
+    normalized['created_at'] = normalized['created_at'] or now
+    normalized['updated_at'] = normalized['updated_at'] or normalized['created_at']
+    for platform in PLATFORMS:
+        if not normalized[f'{platform}_id']:
+            for field in ('username', 'created_at', 'updated_at'):
+                normalized[f'{platform}_{field}'] = ''
+    return normalized, None
+
+
+def read_flat_csv(path: Path) -> Iterator[Tuple[Optional[Dict], Optional[str]]]:
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            yield _normalize(row)
+
+
+def read_backend() -> Iterator[Tuple[Optional[Dict], Optional[str]]]:
+    for row in get_user_storage().iter_rows():
+        yield _normalize(row)
+
+
+def read_legacy(directory: Path, workdir: Path, partitions: int) -> Iterator[Tuple[Optional[Dict], Optional[str]]]:
+    """
+    Join legacy users.csv and bindings.csv without holding either in memory:
+    both are hash-partitioned by user id and joined one partition at a time.
+    """
+    users = HashPartitions(workdir, "legacy-users", partitions)
+    with open(directory / "users.csv", newline='') as f:
+        for row in csv.DictReader(f):
+            user_id = _clean(row.get('id'))
+            users.add(user_id, _clean(row.get('created_at')), _clean(row.get('updated_at')))
+
+    bindings = HashPartitions(workdir, "legacy-bindings", partitions)
+    skipped_platforms = Counter()
+    with open(directory / "bindings.csv", newline='') as f:
+        for row in csv.DictReader(f):
+            platform = _clean(row.get('platform')).lower()
+            if platform not in PLATFORMS:
+                skipped_platforms[platform] += 1
+                continue
+            bindings.add(
+                _clean(row.get('user_id')), platform,
+                _clean(row.get('platform_user_id')),
+                _clean(row.get('platform_username')),
+                _clean(row.get('created_at')),
+                _clean(row.get('updated_at'))
+            )
+
+    for platform, count in skipped_platforms.items():
+        yield None, f"skipped {count} {platform or 'blank'} bindings (platform not supported)"
+
+    for user_part, binding_part in zip(users, bindings):
+        joined: Dict[str, Dict] = {}
+        for user_id, created_at, updated_at in user_part:
+            row, problem = _normalize({'user_id': user_id, 'created_at': created_at, 'updated_at': updated_at})
+            if problem:
+                yield None, problem
+            elif user_id in joined:
+                yield None, f"duplicate user_id {user_id} in users.csv"
+            else:
+                joined[user_id] = row
+
+        for user_id, platform, platform_user_id, username, created_at, updated_at in binding_part:
+            row = joined.get(user_id)
+            if row is None:
+                yield None, f"{platform} binding {platform_user_id} refers to unknown user {user_id!r}"
+                continue
+            if row[f'{platform}_id']:
+                yield None, f"user {user_id} has more than one {platform} binding; keeping the first"
+                continue
+            row[f'{platform}_id'] = platform_user_id
+            row[f'{platform}_username'] = username
+            row[f'{platform}_created_at'] = created_at or updated_at
+            row[f'{platform}_updated_at'] = updated_at or created_at
+            row['updated_at'] = max(row['updated_at'], updated_at)
+
+        for row in joined.values():
+            yield row, None
+
+
+def write_flat_csv(path: Path, rows: Iterator[Dict], columns: List[str] = COLUMNS) -> int:
+    count = 0
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_legacy(directory: Path, rows: Iterator[Dict]) -> int:
+    count = 0
+    binding_id = 0
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / "users.csv", 'w', newline='') as users_f, \
+            open(directory / "bindings.csv", 'w', newline='') as bindings_f:
+        users = csv.writer(users_f)
+        bindings = csv.writer(bindings_f)
+        users.writerow(LEGACY_USER_COLUMNS)
+        bindings.writerow(LEGACY_BINDING_COLUMNS)
+        for row in rows:
+            users.writerow([row['user_id'], row['created_at'], row['updated_at']])
+            for platform in PLATFORMS:
+                if row[f'{platform}_id']:
+                    binding_id += 1
+                    bindings.writerow([
+                        binding_id, row['user_id'], platform, row[f'{platform}_id'],
+                        row[f'{platform}_username'], '', '',
+                        row.get(f'{platform}_created_at') or row['updated_at'],
+                        row.get(f'{platform}_updated_at') or row['updated_at'],
+                    ])
+            count += 1
+    return count
+
+
+def _read(location: str, workdir: Path, partitions: int):
+    kind, _, path = location.partition(':')
+    if kind == 'csv' and path:
+        return read_flat_csv(Path(path))
+    if kind == 'legacy' and path:
+        return read_legacy(Path(path), workdir, partitions)
+    if location == 'backend':
+        return read_backend()
+    raise BulkError(f"Unknown location {location!r}; use csv:<file>, legacy:<dir> or backend")
+
+
+def _write(location: str, rows: Iterator[Dict], replace: bool) -> int:
+    kind, _, path = location.partition(':')
+    if kind == 'csv' and path:
+        return write_flat_csv(Path(path), rows)
+    if kind == 'legacy' and path:
+        return write_legacy(Path(path), rows)
+    if location == 'backend':
+        try:
+            return get_user_storage().import_rows(rows, replace=replace)
+        except ValueError as e:
+            raise BulkError(f"{e}; pass --replace to overwrite")
+    raise BulkError(f"Unknown location {location!r}; use csv:<file>, legacy:<dir> or backend")
+
+
+def stage(source: str, workdir: Path, partitions: int) -> Tuple[Path, int, List[str]]:
+    """
+    Read the source once into a normalised staging CSV and check that user
+    ids and platform ids are unique. Returns (staging path, rows, problems);
+    duplicates are reported as problems prefixed with "duplicate".
+    """
+    staging = workdir / "staging.csv"
+    keys = HashPartitions(workdir, "keys", partitions)
+    notes: List[str] = []
+    progress = Progress("read")
+
+    def rows():
+        for row, problem in _read(source, workdir, partitions):
+            if problem:
+                notes.append(problem)
+                continue
+            keys.add(f"user:{row['user_id']}", row['user_id'])
+            for platform in PLATFORMS:
+                if row[f'{platform}_id']:
+                    keys.add(f"{platform}:{row[f'{platform}_id']}", row['user_id'])
+            progress.tick()
+            yield row
+
+    count = write_flat_csv(staging, rows(), STAGING_COLUMNS)
+    progress.done()
+
+    check = Progress("uniqueness check")
+    duplicates: List[str] = []
+    for partition in keys:
+        seen: Dict[str, str] = {}
+        for key, user_id in partition:
+            check.tick()
+            if key not in seen:
+                seen[key] = user_id
+                continue
+            kind, _, value = key.partition(':')
+            if kind == 'user':
+                duplicates.append(f"duplicate user_id {value}")
+            else:
+                duplicates.append(f"duplicate {kind} id {value} (users {seen[key]} and {user_id})")
+    check.done()
+    return staging, count, duplicates + notes
+
+
+def copy(source: str, target: Optional[str], partitions: int, replace: bool) -> int:
+    with tempfile.TemporaryDirectory(prefix="bulk-") as tmp:
+        workdir = Path(tmp)
+        staging, count, problems = stage(source, workdir, partitions)
+
+        for problem in problems[:MAX_REPORTED_PROBLEMS]:
+            logger.warning(problem)
+        if len(problems) > MAX_REPORTED_PROBLEMS:
+            logger.warning(f"... and {len(problems) - MAX_REPORTED_PROBLEMS} more")
+        duplicates = sum(1 for problem in problems if problem.startswith("duplicate"))
+        if duplicates:
+            raise BulkError(f"{duplicates} duplicate ids found; nothing was written")
+
+        logger.info(f"{source}: {count} valid rows, {len(problems)} skipped or noted")
+        if target is None:
+            return count
+
+        progress = Progress(f"write {target}")
+
+        def rows():
+            for row, _ in read_flat_csv(staging):
+                progress.tick()
+                yield row
+
+        written = _write(target, rows(), replace)
+        progress.done()
+        return written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import/export of user data")
+    parser.add_argument("command", choices=["import", "export", "validate"])
+    parser.add_argument("location", help="csv:<file>, legacy:<dir> or backend")
+    parser.add_argument("--replace", action="store_true",
+                        help="import into a backend that already has users, replacing them")
+    parser.add_argument("--partitions", type=int, default=64,
+                        help="hash partitions for the uniqueness check (more = less memory)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    try:
+        if args.command == "import":
+            copy(args.location, "backend", args.partitions, args.replace)
+        elif args.command == "export":
+            copy("backend", args.location, args.partitions, args.replace)
+        else:
+            copy(args.location, None, args.partitions, args.replace)
+    except (BulkError, OSError) as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,17 @@
 """Google Sheets storage backend"""
+import atexit
 import gspread
 import logging
+import re
+import threading
+import time
+from collections import OrderedDict
 from google.oauth2.service_account import Credentials
 from typing import Dict, List, Optional
 from pathlib import Path
+from app import metrics
 from app.config import get_settings
+from app.readiness import DISABLED, LOADING, PENDING, StartupStep
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -24,13 +31,78 @@ class GoogleSheetsStorage:
         self.client = None
         self.worksheet = None
 
-        if self.enabled:
-            try:
+        # Local view of the sheet layout so syncs don't have to re-read it:
+        # user_id -> row number, built from one column fetch and kept up to
+        # date on every append/update/delete. It is re-read before appending
+        # a user it doesn't know. None means "rebuild on next use".
+        self._sheet_lock = threading.RLock()
+        self._headers_verified = False
+        self._row_index: Optional[Dict[str, int]] = None
+        self._last_row = 0
+
+        # Write-behind queue: user_id -> (row values, columns, first enqueue time)
+        self._queue: "OrderedDict[str, tuple]" = OrderedDict()
+        self._queue_cond = threading.Condition()
+        self._worker = None
+        self._stopping = False
+        self.batch_size = settings.GOOGLE_SHEETS_BATCH_SIZE
+        self.flush_interval = settings.GOOGLE_SHEETS_FLUSH_INTERVAL
+        self.stats = {
+            "flushes": 0,
+            "rows_synced": 0,
+            "rows_coalesced": 0,
+            "failures": 0,
+            "last_flush_at": None,
+            "last_error": None,
+        }
+
+        # Opening the sheet takes several API calls, so it happens in
+        # connect(), off the startup path; rows queued meanwhile wait for it
+        self.connection = StartupStep()
+        self._connected = threading.Event()
+        if not self.enabled:
+            self.connection.status = DISABLED
+            self._connected.set()
+
+    def connect(self):
+        """Open the worksheet; blocks until done, a no-op if already started"""
+        with self._queue_cond:
+            if self.connection.status != PENDING:
+                return
+            self.connection.status = LOADING
+        try:
+            with self.connection:
                 self._initialize()
-                logger.info("Google Sheets storage initialized successfully")
-            except Exception as e:
-                logger.error(f"Failed to initialize Google Sheets: {e}")
-                self.enabled = False
+            logger.info("Google Sheets storage initialized successfully")
+        except Exception as e:
+            logger.error(f"Failed to initialize Google Sheets: {e}")
+            self.enabled = False
+            with self._queue_cond:
+                if self._queue:
+                    logger.warning(f"Dropping {len(self._queue)} rows queued for Google Sheets")
+                    self._queue.clear()
+        finally:
+            self._connected.set()
+            with self._queue_cond:
+                self._queue_cond.notify()
+
+    def connect_in_background(self):
+        if self.connection.status == PENDING:
+            threading.Thread(target=self.connect, name="sheets-connect", daemon=True).start()
+
+    def use_worksheet(self, worksheet):
+        """Sync to an already opened worksheet instead of connecting"""
+        self.worksheet = worksheet
+        self.enabled = True
+        with self.connection:
+            pass
+        self._connected.set()
+
+    def _ready(self) -> bool:
+        """For the blocking calls: connect now if nobody has, and wait for it"""
+        self.connect()
+        self._connected.wait()
+        return self.enabled and self.worksheet is not None
 
     def _initialize(self):
         """Initialize Google Sheets client"""
@@ -64,8 +136,8 @@ class GoogleSheetsStorage:
             logger.info("Created new 'Users' worksheet")
 
     def _ensure_headers(self, columns: List[str]):
-        """Ensure worksheet has proper headers"""
-        if not self.enabled or not self.worksheet:
+        """Ensure worksheet has proper headers (checked once per process)"""
+        if not self.enabled or not self.worksheet or self._headers_verified:
             return
 
         try:
@@ -76,9 +148,70 @@ class GoogleSheetsStorage:
                 # Set headers
                 self.worksheet.update('A1', [columns])
                 logger.info("Updated worksheet headers")
+            self._headers_verified = True
         except Exception as e:
             logger.error(f"Failed to set headers: {e}")
 
+    def _get_row_index(self) -> Dict[str, int]:
+        """Return the user_id -> row map, fetching column A if it is stale"""
+        if self._row_index is None:
+            user_ids = self.worksheet.col_values(1)
+            self._row_index = {
+                str(value): row_num
+                for row_num, value in enumerate(user_ids, start=1)
+                if row_num > 1 and value
+            }
+            self._last_row = max(len(user_ids), 1)
+            logger.debug(f"Loaded sheet row index for {len(self._row_index)} users")
+        return self._row_index
+
+    def _row_index_for(self, user_ids: List[str]) -> Dict[str, int]:
+        """
+        The row index, re-read first if any of user_ids is missing from it:
+        another worker may have appended that user's row since it was loaded.
+        Rows already in the index are trusted until an append lands somewhere
+        unexpected or a call fails, so updates to them cost no read.
+        """
+        if self._row_index is not None and any(user_id not in self._row_index for user_id in user_ids):
+            self._row_index = None
+        return self._get_row_index()
+
+    def invalidate_row_index(self):
+        """Forget the cached sheet layout; it is re-read on the next sync"""
+        with self._sheet_lock:
+            self._row_index = None
+            self._headers_verified = False
+
+    @staticmethod
+    def _updated_start_row(response) -> Optional[int]:
+        """Extract the first row number from an append response's updatedRange"""
+        try:
+            updated_range = response['updates']['updatedRange']
+        except (TypeError, KeyError):
+            return None
+        match = re.search(r'![A-Z]+(\d+)', updated_range)
+        return int(match.group(1)) if match else None
+
+    def _append_rows(self, user_ids: List[str], rows: List[List]):
+        """Append rows and record their positions, revalidating on mismatch"""
+        expected_row = self._last_row + 1
+        response = self.worksheet.append_rows(rows)
+        start_row = self._updated_start_row(response)
+
+        if start_row is not None and start_row != expected_row:
+            # Someone edited the sheet behind our back; re-read it next time
+            logger.warning(
+                f"Sheet row index out of date (expected row {expected_row}, "
+                f"got {start_row}), will reload"
+            )
+            self._row_index = None
+            return
+
+        start_row = start_row or expected_row
+        for offset, user_id in enumerate(user_ids):
+            self._row_index[user_id] = start_row + offset
+        self._last_row = start_row + len(rows) - 1
+
     def sync_row(self, row_data: Dict, columns: List[str]):
         """
         Sync a single row to Google Sheets
@@ -87,42 +220,185 @@ class GoogleSheetsStorage:
             row_data: Dict with row data
             columns: List of column names
         """
-        if not self.enabled or not self.worksheet:
+        if not self._ready():
             return
 
-        try:
-            # Ensure headers are set
-            self._ensure_headers(columns)
-
-            # Convert row dict to list in column order
-            values = [row_data.get(col, '') for col in columns]
-            user_id = row_data.get('user_id', '')
+        user_id = str(row_data.get('user_id', ''))
+        if not user_id:
+            logger.warning("Cannot sync row without user_id")
+            return
 
-            if not user_id:
-                logger.warning("Cannot sync row without user_id")
-                return
+        # Convert row dict to list in column order
+        values = [row_data.get(col, '') for col in columns]
 
-            # Find existing row by user_id
+        with self._sheet_lock:
             try:
-                cell = self.worksheet.find(str(user_id), in_column=1)
-                if cell:
-                    row_num = cell.row
-                    # Update existing row
+                self._ensure_headers(columns)
+
+                row_num = self._row_index_for([user_id]).get(user_id)
+                if row_num:
                     self.worksheet.update(f'A{row_num}', [values])
                     logger.debug(f"Updated row {row_num} for user {user_id}")
                 else:
-                    # Append new row if not found
-                    self.worksheet.append_row(values)
+                    self._append_rows([user_id], [values])
                     logger.debug(f"Appended new row for user {user_id}")
+
             except Exception as e:
-                # If cell not found or any other error, append new row
-                logger.debug(f"Cell not found or error searching, appending new row: {e}")
-                self.worksheet.append_row(values)
-                logger.debug(f"Appended new row for user {user_id}")
+                self._row_index = None
+                logger.error(f"Failed to sync row to Google Sheets: {e}")
+                # Don't raise - we don't want Google Sheets failures to break the app
+
+    def enqueue_row(self, row_data: Dict, columns: List[str]):
+        """
+        Queue a row for background sync and return immediately.
+
+        Later changes to the same user_id replace the queued row, so bursts
+        of updates to one user cost a single write.
+        """
+        if not self.enabled:
+            return
+
+        user_id = str(row_data.get('user_id', ''))
+        if not user_id:
+            logger.warning("Cannot sync row without user_id")
+            return
+
+        values = [row_data.get(col, '') for col in columns]
+        # Normally started by the app's lifespan; this covers other callers
+        self.connect_in_background()
+        with self._queue_cond:
+            if user_id in self._queue:
+                enqueued_at = self._queue[user_id][2]
+                self.stats["rows_coalesced"] += 1
+            else:
+                enqueued_at = time.monotonic()
+            self._queue[user_id] = (values, columns, enqueued_at)
+
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run_worker, name="sheets-sync", daemon=True
+                )
+                self._worker.start()
+                # Once per instance, however often the worker is restarted
+                atexit.unregister(self.stop)
+                atexit.register(self.stop)
+            # Wake the worker to arm the flush timer or flush a full batch
+            if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                self._queue_cond.notify()
+
+    def queue_stats(self) -> Dict:
+        """Queue depth, age of the oldest pending change and flush counters"""
+        with self._queue_cond:
+            depth = len(self._queue)
+            oldest = next(iter(self._queue.values()))[2] if self._queue else None
+            lag = time.monotonic() - oldest if oldest is not None else 0.0
+            return {"enabled": self.enabled, "queue_depth": depth, "lag_seconds": round(lag, 3), **self.stats}
+
+    def _run_worker(self):
+        while True:
+            with self._queue_cond:
+                while not self._stopping:
+                    if not self._connected.is_set():
+                        # Rows wait while the sheet is being opened; connect()
+                        # notifies once it is open (or has failed)
+                        self._queue_cond.wait()
+                        continue
+                    if len(self._queue) >= self.batch_size:
+                        break
+                    if self._queue:
+                        oldest = next(iter(self._queue.values()))[2]
+                        remaining = oldest + self.flush_interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._queue_cond.wait(remaining)
+                    else:
+                        self._queue_cond.wait()
+
+                if self._queue and not self._connected.is_set():
+                    logger.warning(
+                        f"Stopping with {len(self._queue)} rows not synced to Google Sheets "
+                        f"(still connecting)"
+                    )
+                    return
+                if self._queue and not self.enabled:
+                    # Queued just as connect() failed
+                    logger.warning(f"Dropping {len(self._queue)} rows queued for Google Sheets")
+                    self._queue.clear()
+                if not self._queue:
+                    if self._stopping:
+                        return
+                    continue
+
+                batch = []
+                while self._queue and len(batch) < self.batch_size:
+                    batch.append(self._queue.popitem(last=False))
+
+            if not self._flush_batch(batch):
+                self._requeue(batch)
+                if self._stopping:
+                    return
+                time.sleep(min(self.flush_interval, 5.0))
 
+    def _requeue(self, batch: List[tuple]):
+        with self._queue_cond:
+            for user_id, entry in reversed(batch):
+                # A newer change queued meanwhile supersedes the failed one
+                if user_id not in self._queue:
+                    self._queue[user_id] = entry
+                    self._queue.move_to_end(user_id, last=False)
+
+    def _flush_batch(self, batch: List[tuple]) -> bool:
+        """Write a batch with one batch_update for existing rows and one append for new ones"""
+        columns = batch[0][1][1]
+        started = time.perf_counter()
+        try:
+            with self._sheet_lock:
+                self._ensure_headers(columns)
+                row_index = self._row_index_for([user_id for user_id, _ in batch])
+
+                updates = []
+                append_ids = []
+                appends = []
+                for user_id, (values, _, _) in batch:
+                    row_num = row_index.get(user_id)
+                    if row_num:
+                        updates.append({'range': f'A{row_num}', 'values': [values]})
+                    else:
+                        append_ids.append(user_id)
+                        appends.append(values)
+
+                if updates:
+                    self.worksheet.batch_update(updates)
+                if appends:
+                    self._append_rows(append_ids, appends)
+
+            self.stats["flushes"] += 1
+            self.stats["rows_synced"] += len(batch)
+            self.stats["last_flush_at"] = time.time()
+            metrics.observe_since(metrics.sheets_flush_duration, started, "ok")
+            logger.debug(f"Synced {len(batch)} rows to Google Sheets ({len(updates)} updated, {len(appends)} appended)")
+            return True
         except Exception as e:
-            logger.error(f"Failed to sync row to Google Sheets: {e}")
-            # Don't raise - we don't want Google Sheets failures to break the app
+            self.invalidate_row_index()
+            self.stats["failures"] += 1
+            self.stats["last_error"] = str(e)
+            metrics.observe_since(metrics.sheets_flush_duration, started, "error")
+            logger.error(f"Failed to flush {len(batch)} rows to Google Sheets: {e}")
+            return False
+
+    def stop(self):
+        """Flush pending rows and stop the background worker; the next enqueue starts a new one"""
+        with self._queue_cond:
+            if self._worker is None or self._stopping:
+                return
+            worker = self._worker
+            self._stopping = True
+            self._queue_cond.notify()
+        worker.join(timeout=30)
+        if not worker.is_alive():
+            with self._queue_cond:
+                self._worker = None
+                self._stopping = False
 
     def sync_all_rows(self, rows: List[Dict], columns: List[str]):
         """
@@ -132,45 +408,62 @@ class GoogleSheetsStorage:
             rows: List of row dicts
             columns: List of column names
         """
-        if not self.enabled or not self.worksheet:
+        if not self._ready():
             logger.info("Google Sheets not enabled, skipping sync")
             return
 
-        try:
-            logger.info(f"Syncing {len(rows)} rows to Google Sheets...")
+        with self._sheet_lock:
+            try:
+                logger.info(f"Syncing {len(rows)} rows to Google Sheets...")
 
-            # Clear existing data
-            self.worksheet.clear()
+                # Clear existing data
+                self._row_index = None
+                self.worksheet.clear()
 
-            # Prepare data with headers
-            sheet_data = [columns]
-            for row in rows:
-                values = [row.get(col, '') for col in columns]
-                sheet_data.append(values)
+                # Prepare data with headers
+                sheet_data = [columns]
+                for row in rows:
+                    values = [row.get(col, '') for col in columns]
+                    sheet_data.append(values)
 
-            # Bulk update
-            self.worksheet.update('A1', sheet_data)
-            
-            logger.info(f"Successfully synced {len(rows)} rows to Google Sheets")
+                # Bulk update
+                self.worksheet.update('A1', sheet_data)
 
-        except Exception as e:
-            logger.error(f"Failed to bulk sync to Google Sheets: {e}")
+                self._headers_verified = True
+                self._row_index = {
+                    str(row.get('user_id', '')): row_num
+                    for row_num, row in enumerate(rows, start=2)
+                }
+                self._last_row = len(sheet_data)
+
+                logger.info(f"Successfully synced {len(rows)} rows to Google Sheets")
+
+            except Exception as e:
+                logger.error(f"Failed to bulk sync to Google Sheets: {e}")
             # Don't raise - we don't want Google Sheets failures to break the app
 
     def delete_row(self, user_id: int):
         """Delete a row by user_id"""
-        if not self.enabled or not self.worksheet:
+        if not self._ready():
             return
 
-        try:
-            cell = self.worksheet.find(str(user_id), in_column=1)
-            if cell:
-                self.worksheet.delete_rows(cell.row)
-                logger.debug(f"Deleted row for user {user_id}")
-            else:
-                logger.debug(f"Row for user {user_id} not found in sheet")
-        except Exception as e:
-            logger.error(f"Failed to delete row from Google Sheets: {e}")
+        with self._sheet_lock:
+            try:
+                row_index = self._get_row_index()
+                row_num = row_index.pop(str(user_id), None)
+                if row_num:
+                    self.worksheet.delete_rows(row_num)
+                    # Rows below the deleted one shift up by one
+                    for other_id, other_row in row_index.items():
+                        if other_row > row_num:
+                            row_index[other_id] = other_row - 1
+                    self._last_row -= 1
+                    logger.debug(f"Deleted row for user {user_id}")
+                else:
+                    logger.debug(f"Row for user {user_id} not found in sheet")
+            except Exception as e:
+                self._row_index = None
+                logger.error(f"Failed to delete row from Google Sheets: {e}")
 
 
 # Singleton instance
@@ -183,3 +476,17 @@ def get_sheets_storage() -> GoogleSheetsStorage:
     if _sheets_instance is None:
         _sheets_instance = GoogleSheetsStorage()
     return _sheets_instance
+
+
+def _sheets_stat(key: str):
+    return lambda: get_sheets_storage().queue_stats()[key]
+
+
+metrics.CallbackMetric("sheets_queue_depth", "Users waiting to be synced to Google Sheets",
+                       _sheets_stat("queue_depth"))
+metrics.CallbackMetric("sheets_lag_seconds", "Age of the oldest change waiting for Google Sheets",
+                       _sheets_stat("lag_seconds"))
+metrics.CallbackMetric("sheets_rows_synced_total", "Rows written to Google Sheets",
+                       _sheets_stat("rows_synced"), type="counter")
+metrics.CallbackMetric("sheets_flush_failures_total", "Google Sheets batch writes that failed",
+                       _sheets_stat("failures"), type="counter")
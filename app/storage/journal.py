@@ -0,0 +1,112 @@
+"""Append-only change journal for UserStorage"""
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class Journal:
+    """
+    Append-only log of storage changes, one JSON record per line.
+
+    Writers call append() while holding the storage lock and sync() after
+    releasing it. Concurrent sync() calls are group-committed: one caller
+    performs the fsync and every record written before it becomes durable.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.compacting_path = self.compacting_path_for(self.path)
+        self.records = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._written_seq = 0
+        self._synced_seq = 0
+        self._syncing = False
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    @staticmethod
+    def compacting_path_for(path: Path) -> Path:
+        """Location of a journal that has been rotated out but not yet compacted"""
+        path = Path(path)
+        return path.with_name(path.name + '.compacting')
+
+    @staticmethod
+    def read_records(path: Path) -> Iterator[Dict]:
+        """Yield records from a journal file, stopping at a torn tail"""
+        path = Path(path)
+        if not path.exists():
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_num, line in enumerate(f, start=1):
+                if not line.endswith('\n'):
+                    logger.warning(f"Ignoring incomplete record at {path}:{line_num}")
+                    return
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring corrupt record at {path}:{line_num}")
+                    return
+
+    def append(self, record: Dict) -> int:
+        """Buffer a record and return its sequence number for sync()"""
+        line = json.dumps(record, separators=(',', ':'))
+        with self._cond:
+            self._file.write(line + '\n')
+            self._written_seq += 1
+            self.records += 1
+            return self._written_seq
+
+    def sync(self, seq: int):
+        """Block until the record with sequence number seq is on disk"""
+        with self._cond:
+            while self._synced_seq < seq:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+
+                self._syncing = True
+                target = self._written_seq
+                try:
+                    self._file.flush()
+                    fd = self._file.fileno()
+                    self._cond.release()
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        self._cond.acquire()
+                    self._synced_seq = max(self._synced_seq, target)
+                finally:
+                    self._syncing = False
+                    self._cond.notify_all()
+
+    def rotate(self) -> Path:
+        """
+        Move the current journal aside for compaction and start a new one.
+
+        Must be called with the storage lock held so the caller's snapshot
+        matches exactly the records in the rotated file.
+        """
+        with self._cond:
+            while self._syncing:
+                self._cond.wait()
+
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            os.replace(self.path, self.compacting_path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+            self._synced_seq = self._written_seq
+            self.records = 0
+            self._cond.notify_all()
+            return self.compacting_path
+
+    def close(self):
+        with self._cond:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
@@ -0,0 +1,227 @@
+"""
+Compact in-memory user records and the read-only views the API gets.
+
+Numeric platform ids are kept as ints and timestamps written by
+isoformat() as microseconds since the epoch; anything else is kept as the
+original string. Platform names and usernames are interned. Records are
+immutable: changes build a new record, which lets readers use them without
+locking.
+"""
+import sys
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+MAX_INT_ID = 2 ** 63 - 1
+
+# An int for numeric ids / isoformat() timestamps, the original string otherwise
+Compact = Union[int, str]
+
+
+def encode_id(value: str) -> Compact:
+    if value.isascii() and value.isdigit() and str(int(value)) == value and int(value) <= MAX_INT_ID:
+        return int(value)
+    return value
+
+
+# Cached so rows sharing a timestamp (imports, bindings made with their user) share one int
+@lru_cache(maxsize=4096)
+def encode_time(value: str) -> Compact:
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return value
+    if moment.tzinfo is None and moment >= EPOCH and moment.isoformat() == value:
+        return (moment - EPOCH) // MICROSECOND
+    return value
+
+
+def decode_time(value: Compact) -> str:
+    if isinstance(value, int):
+        return (EPOCH + timedelta(microseconds=value)).isoformat()
+    return value
+
+
+class BindingRecord:
+    __slots__ = ('platform', 'account_id', 'username', 'created_at', 'updated_at')
+
+    def __init__(self, platform: str, account_id: Compact, username: str,
+                 created_at: Compact, updated_at: Compact):
+        self.platform = sys.intern(platform)
+        self.account_id = account_id
+        self.username = sys.intern(username or '')
+        self.created_at = created_at
+        # Share the object when nothing changed since the binding was made
+        self.updated_at = created_at if updated_at == created_at else updated_at
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "BindingRecord":
+        return cls(row['platform'], encode_id(row['platform_user_id']), row['username'],
+                   encode_time(row['created_at']), encode_time(row['updated_at']))
+
+    @property
+    def platform_user_id(self) -> str:
+        return str(self.account_id)
+
+    def row(self, user_id: int) -> Dict:
+        """BINDING_COLUMNS dict, as stored in bindings.csv"""
+        return {
+            'user_id': str(user_id),
+            'platform': self.platform,
+            'platform_user_id': self.platform_user_id,
+            'username': self.username,
+            'created_at': decode_time(self.created_at),
+            'updated_at': decode_time(self.updated_at),
+        }
+
+
+class UserRecord:
+    __slots__ = ('user_id', 'created_at', 'updated_at', 'bindings')
+
+    def __init__(self, user_id: int, created_at: Compact, updated_at: Compact,
+                 bindings: Tuple[BindingRecord, ...] = ()):
+        self.user_id = user_id
+        self.created_at = created_at
+        self.updated_at = created_at if updated_at == created_at else updated_at
+        self.bindings = bindings
+
+    @classmethod
+    def from_rows(cls, user_row: Dict, bindings: Iterable[Dict] = ()) -> "UserRecord":
+        """Build a record from a USER_COLUMNS row and its BINDING_COLUMNS rows"""
+        return cls(int(user_row['user_id']), encode_time(user_row['created_at']),
+                   encode_time(user_row['updated_at']),
+                   tuple(BindingRecord.from_row(binding) for binding in bindings))
+
+    def binding(self, platform: str) -> Optional[BindingRecord]:
+        for binding in self.bindings:
+            if binding.platform == platform:
+                return binding
+        return None
+
+    def with_binding(self, binding: BindingRecord, updated_at: Compact) -> "UserRecord":
+        """Copy with binding added, replacing any other on its platform"""
+        others = tuple(b for b in self.bindings if b.platform != binding.platform)
+        return UserRecord(self.user_id, self.created_at, updated_at, others + (binding,))
+
+    def without_binding(self, platform: str, updated_at: Compact) -> "UserRecord":
+        others = tuple(b for b in self.bindings if b.platform != platform)
+        return UserRecord(self.user_id, self.created_at, updated_at, others)
+
+    def row(self) -> Dict:
+        """USER_COLUMNS dict, as stored in users.csv"""
+        return {
+            'user_id': str(self.user_id),
+            'created_at': decode_time(self.created_at),
+            'updated_at': decode_time(self.updated_at),
+        }
+
+    def binding_rows(self) -> List[Dict]:
+        return [binding.row(self.user_id) for binding in self.bindings]
+
+
+class BindingView(Mapping):
+    """{'id', 'username', 'bound'} for one binding, built on access"""
+
+    __slots__ = ('_binding',)
+    _KEYS = ('id', 'username', 'bound')
+
+    def __init__(self, binding: BindingRecord):
+        self._binding = binding
+
+    def __getitem__(self, key: str):
+        if key == 'id':
+            # Kept a string: Discord snowflakes don't fit in a JS number
+            return self._binding.platform_user_id
+        if key == 'username':
+            return self._binding.username
+        if key == 'bound':
+            return True
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class BindingsView(Mapping):
+    """{platform: BindingView} for a user's bound platforms"""
+
+    __slots__ = ('_record',)
+
+    def __init__(self, record: UserRecord):
+        self._record = record
+
+    def __getitem__(self, platform: str) -> BindingView:
+        binding = self._record.binding(platform)
+        if binding is None:
+            raise KeyError(platform)
+        return BindingView(binding)
+
+    def __iter__(self) -> Iterator[str]:
+        return (binding.platform for binding in self._record.bindings)
+
+    def __len__(self) -> int:
+        return len(self._record.bindings)
+
+    def __repr__(self) -> str:
+        return repr({platform: dict(view) for platform, view in self.items()})
+
+
+class UserView(Mapping):
+    """
+    Read-only mapping with the keys of the API user dict:
+    id, created_at, updated_at, bindings and one key per platform
+    (its binding, or None). Values are built from the record on access.
+    """
+
+    __slots__ = ('_record', '_platforms')
+
+    def __init__(self, record: UserRecord, platforms: List[str]):
+        self._record = record
+        self._platforms = platforms
+
+    @property
+    def record(self) -> UserRecord:
+        return self._record
+
+    def __getitem__(self, key: str):
+        record = self._record
+        if key == 'id':
+            return record.user_id
+        if key == 'created_at':
+            return decode_time(record.created_at)
+        if key == 'updated_at':
+            return decode_time(record.updated_at)
+        if key == 'bindings':
+            return BindingsView(record)
+        if key in self._platforms:
+            binding = record.binding(key)
+            return BindingView(binding) if binding else None
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from ('id', 'created_at', 'updated_at', 'bindings')
+        yield from self._platforms
+
+    def __len__(self) -> int:
+        return 4 + len(self._platforms)
+
+    def to_dict(self) -> Dict:
+        """Plain nested dict, for JSON encoding or mutation"""
+        user = {key: self[key] for key in self}
+        user['bindings'] = {platform: dict(view) for platform, view in user['bindings'].items()}
+        for platform in self._platforms:
+            if user[platform] is not None:
+                user[platform] = dict(user[platform])
+        return user
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
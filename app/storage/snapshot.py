@@ -0,0 +1,333 @@
+"""
+Binary snapshot of the CSV store (users.snap), opened with mmap at startup.
+
+Layout, little-endian; every section but the string table is fixed-width:
+
+    header      HEADER
+    platforms   platform_count x u32       string offsets of the platform names
+    users       user_count x USER          sorted by user_id
+    bindings    binding_count x BINDING    sorted by (user_id, platform)
+    accounts    binding_count x u32        binding numbers sorted by (platform, account id)
+    strings     u32 length + UTF-8 bytes each, addressed by offset
+
+Timestamps and account ids are stored as UserRecords hold them (see
+app/storage/records.py): integers where they could be compacted, otherwise
+the string goes to the string table and is stored as -1 - offset. Users
+are read back as UserRecords.
+
+The header records the size and mtime of the users.csv and bindings.csv
+the snapshot was written with, plus a CRC32 of everything after the
+header. A snapshot that doesn't match the CSVs is ignored.
+"""
+import logging
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from app.storage.records import BindingRecord, Compact, UserRecord
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"USRSNAP1"
+FORMAT_VERSION = 1
+
+# magic, format version, platform count, user count, binding count,
+# string table size, users.csv size + mtime_ns, bindings.csv size + mtime_ns, CRC32
+HEADER = struct.Struct("<8sIIQQQQQQQI")
+# user_id, created_at, updated_at, first binding number, binding count
+USER = struct.Struct("<QqqII")
+# user_id, platform number, account id, username, created_at, updated_at
+BINDING = struct.Struct("<QIqIqq")
+U32 = struct.Struct("<I")
+# array typecode for the accounts section's u32 items
+_U32_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+
+# (users.csv size, users.csv mtime_ns, bindings.csv size, bindings.csv mtime_ns)
+Fingerprint = Tuple[int, int, int, int]
+
+
+def csv_fingerprint(users_file: Path, bindings_file: Path) -> Fingerprint:
+    users, bindings = os.stat(users_file), os.stat(bindings_file)
+    return users.st_size, users.st_mtime_ns, bindings.st_size, bindings.st_mtime_ns
+
+
+class _StringTable:
+    """Append-only string table spooled to a temporary file"""
+
+    def __init__(self, directory: Path):
+        self.file = tempfile.TemporaryFile(dir=directory)
+        self.size = 0
+        self.add("")
+
+    def add(self, value: str) -> int:
+        if not value and self.size:
+            return 0
+        data = value.encode()
+        offset = self.size
+        self.file.write(U32.pack(len(data)) + data)
+        self.size += U32.size + len(data)
+        return offset
+
+
+def _encode(value: Compact, strings: _StringTable) -> int:
+    return value if isinstance(value, int) else -1 - strings.add(value)
+
+
+def _account_key(account_id: Compact) -> tuple:
+    """Sort key of an account id: numeric ids first, then the others by their bytes"""
+    return (0, account_id) if isinstance(account_id, int) else (1, account_id.encode())
+
+
+def _copy(source, target, crc: int) -> int:
+    source.seek(0)
+    while True:
+        chunk = source.read(1 << 20)
+        if not chunk:
+            return crc
+        target.write(chunk)
+        crc = zlib.crc32(chunk, crc)
+
+
+def write_snapshot(path: Path, versions: Iterable[UserRecord], platforms: List[str],
+                   fingerprint: Fingerprint) -> int:
+    """Write user records, in user_id order, to path; returns the user count"""
+    path = Path(path)
+    platform_numbers = {platform: number for number, platform in enumerate(platforms)}
+    strings = _StringTable(path.parent)
+    platform_refs = [strings.add(platform) for platform in platforms]
+    # Account ids per platform, to build the lookup index once all are known.
+    # Numeric ids are packed with their binding number into one int (id << 32 | number)
+    numeric_accounts: List[List[int]] = [[] for _ in platforms]
+    other_accounts: List[List[Tuple[bytes, int]]] = [[] for _ in platforms]
+
+    users_file = tempfile.TemporaryFile(dir=path.parent)
+    bindings_file = tempfile.TemporaryFile(dir=path.parent)
+    user_count = binding_count = 0
+    last_user_id = 0
+    try:
+        for version in versions:
+            user_id = version.user_id
+            if user_id <= last_user_id:
+                raise ValueError(f"Snapshot users out of order at user {user_id}")
+            last_user_id = user_id
+
+            first_binding = binding_count
+            for platform in platforms:
+                binding = version.binding(platform)
+                if binding is None:
+                    continue
+                bindings_file.write(BINDING.pack(
+                    user_id, platform_numbers[platform], _encode(binding.account_id, strings),
+                    strings.add(binding.username),
+                    _encode(binding.created_at, strings), _encode(binding.updated_at, strings),
+                ))
+                kind, key = _account_key(binding.account_id)
+                if kind == 0:
+                    numeric_accounts[platform_numbers[platform]].append(key << 32 | binding_count)
+                else:
+                    other_accounts[platform_numbers[platform]].append((key, binding_count))
+                binding_count += 1
+
+            users_file.write(USER.pack(
+                user_id, _encode(version.created_at, strings), _encode(version.updated_at, strings),
+                first_binding, binding_count - first_binding,
+            ))
+            user_count += 1
+
+        # Numeric ids sort before the others, matching _account_key
+        accounts = array(_U32_TYPECODE)
+        for numeric, other in zip(numeric_accounts, other_accounts):
+            numeric.sort()
+            accounts.extend(packed & 0xFFFFFFFF for packed in numeric)
+            other.sort()
+            accounts.extend(number for _, number in other)
+            numeric.clear()
+            other.clear()
+        if sys.byteorder != 'little':
+            accounts.byteswap()
+
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(bytes(HEADER.size))
+                platforms_section = b"".join(U32.pack(ref) for ref in platform_refs)
+                f.write(platforms_section)
+                crc = zlib.crc32(platforms_section)
+                crc = _copy(users_file, f, crc)
+                crc = _copy(bindings_file, f, crc)
+                accounts_section = accounts.tobytes()
+                f.write(accounts_section)
+                crc = zlib.crc32(accounts_section, crc)
+                crc = _copy(strings.file, f, crc)
+
+                f.seek(0)
+                f.write(HEADER.pack(
+                    MAGIC, FORMAT_VERSION, len(platforms), user_count, binding_count, strings.size,
+                    *fingerprint, crc,
+                ))
+                f.flush()
+                os.fsync(f.fileno())
+            shutil.move(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    finally:
+        users_file.close()
+        bindings_file.close()
+        strings.file.close()
+
+    logger.info(f"Wrote binary snapshot of {user_count} users and {binding_count} bindings to {path}")
+    return user_count
+
+
+class Snapshot:
+    """
+    Read-only view of a users.snap file. Lookups binary-search the mapped
+    sections and decode only the records they return; nothing is parsed
+    up front.
+    """
+
+    def __init__(self, path: Path, mm: mmap.mmap, header: tuple):
+        self.path = path
+        self._mm = mm
+        (_, _, platform_count, self.user_count, self.binding_count,
+         strings_size, *_fingerprint, _crc) = header
+        self._platforms_at = HEADER.size
+        self._users_at = self._platforms_at + platform_count * U32.size
+        self._bindings_at = self._users_at + self.user_count * USER.size
+        self._accounts_at = self._bindings_at + self.binding_count * BINDING.size
+        self._strings_at = self._accounts_at + self.binding_count * U32.size
+        self.platforms = [
+            self._string(U32.unpack_from(mm, self._platforms_at + i * U32.size)[0])
+            for i in range(platform_count)
+        ]
+        self._platform_numbers = {platform: number for number, platform in enumerate(self.platforms)}
+        self._first_user_id = self._user_record(0)[0] if self.user_count else 0
+        self.max_user_id = self._user_record(self.user_count - 1)[0] if self.user_count else 0
+
+    @classmethod
+    def open(cls, path: Path, fingerprint: Fingerprint, platforms: List[str]) -> Optional["Snapshot"]:
+        """Map a snapshot, or return None if it is missing, corrupt or stale"""
+        path = Path(path)
+        try:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < HEADER.size:
+                    logger.warning(f"Ignoring truncated snapshot {path}")
+                    return None
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+
+        header = HEADER.unpack_from(mm, 0)
+        magic, version, platform_count, user_count, binding_count, strings_size = header[:6]
+        expected_size = (HEADER.size + platform_count * U32.size + user_count * USER.size
+                         + binding_count * (BINDING.size + U32.size) + strings_size)
+        reason = None
+        if magic != MAGIC or version != FORMAT_VERSION:
+            reason = "unknown format"
+        elif len(mm) != expected_size:
+            reason = "size mismatch"
+        elif tuple(header[6:10]) != tuple(fingerprint):
+            reason = "CSV files changed since it was written"
+        else:
+            with memoryview(mm) as view, view[HEADER.size:] as body:
+                if zlib.crc32(body) != header[10]:
+                    reason = "checksum mismatch"
+        if reason is None:
+            snapshot = cls(path, mm, header)
+            if snapshot.platforms == list(platforms):
+                return snapshot
+            reason = "platform list changed"
+        mm.close()
+        logger.warning(f"Ignoring snapshot {path}: {reason}")
+        return None
+
+    def close(self):
+        self._mm.close()
+
+    def __len__(self) -> int:
+        return self.user_count
+
+    def _string(self, offset: int) -> str:
+        start = self._strings_at + offset
+        length = U32.unpack_from(self._mm, start)[0]
+        return self._mm[start + U32.size:start + U32.size + length].decode()
+
+    def _compact(self, value: int) -> Compact:
+        return self._string(-1 - value) if value < 0 else value
+
+    def _user_record(self, index: int) -> tuple:
+        return USER.unpack_from(self._mm, self._users_at + index * USER.size)
+
+    def _binding_record(self, number: int) -> tuple:
+        return BINDING.unpack_from(self._mm, self._bindings_at + number * BINDING.size)
+
+    def _find_user(self, user_id: int) -> Optional[int]:
+        # Ids are usually dense, so try the direct position first
+        guess = user_id - self._first_user_id
+        if 0 <= guess < self.user_count and self._user_record(guess)[0] == user_id:
+            return guess
+        low, high = 0, self.user_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._user_record(middle)[0] < user_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.user_count and self._user_record(low)[0] == user_id:
+            return low
+        return None
+
+    def _version(self, record: tuple) -> UserRecord:
+        user_id, created_at, updated_at, first_binding, binding_count = record
+        bindings = []
+        for number in range(first_binding, first_binding + binding_count):
+            _, platform_number, account_id, username, b_created_at, b_updated_at = self._binding_record(number)
+            bindings.append(BindingRecord(
+                self.platforms[platform_number], self._compact(account_id), self._string(username),
+                self._compact(b_created_at), self._compact(b_updated_at),
+            ))
+        return UserRecord(user_id, self._compact(created_at), self._compact(updated_at), tuple(bindings))
+
+    def version(self, user_id: int) -> Optional[UserRecord]:
+        """The user's record as of the snapshot, or None"""
+        index = self._find_user(user_id)
+        return self._version(self._user_record(index)) if index is not None else None
+
+    def _account_key(self, position: int) -> tuple:
+        number = U32.unpack_from(self._mm, self._accounts_at + position * U32.size)[0]
+        _, platform_number, account_id, *_ = self._binding_record(number)
+        if account_id < 0:
+            return platform_number, 1, self._string(-1 - account_id).encode(), number
+        return platform_number, 0, account_id, number
+
+    def owner(self, platform: str, account_id: Compact) -> Optional[int]:
+        """user_id holding the account (an encode_id key) when the snapshot was written"""
+        platform_number = self._platform_numbers.get(platform)
+        if platform_number is None:
+            return None
+        target = (platform_number, *_account_key(account_id))
+        low, high = 0, self.binding_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._account_key(middle)[:3] < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.binding_count:
+            key = self._account_key(low)
+            if key[:3] == target:
+                return self._binding_record(key[3])[0]
+        return None
+
+    def __iter__(self) -> Iterator[UserRecord]:
+        for index in range(self.user_count):
+            yield self._version(self._user_record(index))
@@ -0,0 +1,281 @@
+"""SQL storage backend (SQLite by default, PostgreSQL via DATABASE_URL)"""
+import logging
+from datetime import datetime
+from pathlib import Path
+from itertools import groupby, islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import (
+    Column, ForeignKey, Integer, MetaData, PrimaryKeyConstraint, Sequence, String, Table,
+    UniqueConstraint, create_engine, event, func, select, text,
+)
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+
+from app.storage.base import UserStorageBackend
+from app.storage.google_sheets import get_sheets_storage
+from app.storage.records import UserRecord, UserView
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 5000
+
+metadata = MetaData()
+
+users_table = Table(
+    "users",
+    metadata,
+    Column("user_id", Integer, Sequence("users_user_id_seq"), primary_key=True),
+    Column("created_at", String(32), nullable=False),
+    Column("updated_at", String(32), nullable=False),
+    sqlite_autoincrement=True,
+)
+
+bindings_table = Table(
+    "bindings",
+    metadata,
+    Column("user_id", Integer, ForeignKey("users.user_id"), nullable=False),
+    Column("platform", String(32), nullable=False),
+    Column("platform_user_id", String(64), nullable=False),
+    Column("username", String(255), nullable=False, default=''),
+    Column("created_at", String(32), nullable=False),
+    Column("updated_at", String(32), nullable=False),
+    # One account per platform per user, and each account bound only once
+    PrimaryKeyConstraint("user_id", "platform"),
+    UniqueConstraint("platform", "platform_user_id", name="uq_bindings_platform_account"),
+)
+
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets several uvicorn workers read while one writes
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+class SQLUserStorage(UserStorageBackend):
+    """User storage on a SQL database via SQLAlchemy Core"""
+
+    def __init__(self, database_url: str):
+        super().__init__()
+        url = make_url(database_url)
+        engine_kwargs = {"pool_pre_ping": True}
+
+        if url.get_backend_name() == "sqlite":
+            if url.database:
+                Path(url.database).parent.mkdir(parents=True, exist_ok=True)
+            engine_kwargs["connect_args"] = {"check_same_thread": False}
+
+        self.engine = create_engine(url, **engine_kwargs)
+        if url.get_backend_name() == "sqlite":
+            event.listen(self.engine, "connect", _configure_sqlite)
+
+        metadata.create_all(self.engine)
+        self.sheets = get_sheets_storage()
+        logger.info(f"Initialized SQL storage: {url.render_as_string(hide_password=True)}")
+
+    @staticmethod
+    def _user_row(record) -> Dict:
+        return {
+            'user_id': str(record['user_id']),
+            'created_at': record['created_at'],
+            'updated_at': record['updated_at'],
+        }
+
+    @staticmethod
+    def _binding(record) -> Dict:
+        return {
+            'user_id': str(record['user_id']),
+            'platform': record['platform'],
+            'platform_user_id': record['platform_user_id'],
+            'username': record['username'] or '',
+            'created_at': record['created_at'],
+            'updated_at': record['updated_at'],
+        }
+
+    def _load(self, conn, user_id: int) -> Optional[UserRecord]:
+        record = conn.execute(
+            select(users_table.c.user_id, users_table.c.created_at, users_table.c.updated_at)
+            .where(users_table.c.user_id == user_id)
+        ).mappings().first()
+        if record is None:
+            return None
+        bindings = conn.execute(
+            select(bindings_table).where(bindings_table.c.user_id == user_id)
+        ).mappings()
+        return UserRecord.from_rows(self._user_row(record), (self._binding(b) for b in bindings))
+
+    def _check_platform(self, platform: str):
+        if platform not in self.PLATFORMS:
+            raise ValueError(f"Unsupported platform: {platform}")
+
+    def _finish_write(self, user_id: int, loaded: UserRecord) -> UserView:
+        self.sheets.enqueue_row(self._flat_row(loaded), self.COLUMNS)
+        self._notify_change(user_id)
+        return self._to_user(loaded)
+
+    def create_user(self) -> UserView:
+        now = datetime.utcnow().isoformat()
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                users_table.insert().values(created_at=now, updated_at=now)
+            )
+            user_id = result.inserted_primary_key[0]
+
+        user_row = {'user_id': str(user_id), 'created_at': now, 'updated_at': now}
+        return self._finish_write(user_id, UserRecord.from_rows(user_row))
+
+    def get_user(self, user_id: int) -> Optional[UserView]:
+        with self.engine.connect() as conn:
+            loaded = self._load(conn, user_id)
+        return self._to_user(loaded) if loaded else None
+
+    def get_user_by_platform(self, platform: str, platform_user_id: str) -> Optional[UserView]:
+        if platform not in self.PLATFORMS:
+            return None
+        with self.engine.connect() as conn:
+            user_id = conn.execute(
+                select(bindings_table.c.user_id).where(
+                    bindings_table.c.platform == platform,
+                    bindings_table.c.platform_user_id == platform_user_id
+                )
+            ).scalar()
+            loaded = self._load(conn, user_id) if user_id is not None else None
+        return self._to_user(loaded) if loaded else None
+
+    def bind_platform(self, user_id: int, platform: str,
+                      platform_user_id: str, username: Optional[str] = None) -> UserView:
+        self._check_platform(platform)
+        now = datetime.utcnow().isoformat()
+
+        try:
+            with self.engine.begin() as conn:
+                existing_user_id = conn.execute(
+                    select(bindings_table.c.user_id).where(
+                        bindings_table.c.platform == platform,
+                        bindings_table.c.platform_user_id == platform_user_id
+                    )
+                ).scalar()
+                if existing_user_id is not None and existing_user_id != user_id:
+                    logger.warning(
+                        f"Attempted duplicate binding: {platform} ID {platform_user_id} "
+                        f"already bound to user {existing_user_id}"
+                    )
+                    raise self.duplicate_binding_error(platform)
+
+                result = conn.execute(
+                    users_table.update()
+                    .where(users_table.c.user_id == user_id)
+                    .values(updated_at=now)
+                )
+                if result.rowcount == 0:
+                    logger.error(f"User {user_id} not found for platform binding")
+                    raise ValueError(f"User {user_id} not found")
+
+                user_binding = (bindings_table.c.user_id == user_id) & (bindings_table.c.platform == platform)
+                if existing_user_id == user_id:
+                    conn.execute(
+                        bindings_table.update().where(user_binding)
+                        .values(username=username or '', updated_at=now)
+                    )
+                else:
+                    conn.execute(bindings_table.delete().where(user_binding))
+                    conn.execute(bindings_table.insert().values(
+                        user_id=user_id, platform=platform, platform_user_id=platform_user_id,
+                        username=username or '', created_at=now, updated_at=now
+                    ))
+
+                loaded = self._load(conn, user_id)
+        except IntegrityError:
+            # Lost a race with a concurrent bind of the same account
+            logger.warning(f"Concurrent duplicate binding of {platform} ID {platform_user_id}")
+            raise self.duplicate_binding_error(platform)
+
+        logger.info(f"Successfully bound {platform} ID {platform_user_id} to user {user_id}")
+        return self._finish_write(user_id, loaded)
+
+    def unbind_platform(self, user_id: int, platform: str) -> Optional[UserView]:
+        self._check_platform(platform)
+        with self.engine.begin() as conn:
+            conn.execute(
+                bindings_table.delete().where(
+                    bindings_table.c.user_id == user_id,
+                    bindings_table.c.platform == platform
+                )
+            )
+            conn.execute(
+                users_table.update()
+                .where(users_table.c.user_id == user_id)
+                .values(updated_at=datetime.utcnow().isoformat())
+            )
+            loaded = self._load(conn, user_id)
+
+        if loaded is None:
+            return None
+        logger.info(f"Successfully unbound {platform} from user {user_id}")
+        return self._finish_write(user_id, loaded)
+
+    def _iter_loaded(self, stream: bool = False) -> Iterator[UserRecord]:
+        """Merge-join users and bindings, both ordered by user_id"""
+        options = {"stream_results": True, "yield_per": IMPORT_BATCH_SIZE} if stream else {}
+        with self.engine.connect() as users_conn, self.engine.connect() as bindings_conn:
+            users = users_conn.execution_options(**options).execute(
+                select(users_table.c.user_id, users_table.c.created_at, users_table.c.updated_at)
+                .order_by(users_table.c.user_id)
+            ).mappings()
+            bindings = bindings_conn.execution_options(**options).execute(
+                select(bindings_table).order_by(bindings_table.c.user_id)
+            ).mappings()
+            grouped = groupby(bindings, key=lambda b: b['user_id'])
+            pending = next(grouped, None)
+
+            for record in users:
+                user_id = record['user_id']
+                while pending is not None and pending[0] < user_id:
+                    pending = next(grouped, None)
+                user_bindings = ()
+                if pending is not None and pending[0] == user_id:
+                    user_bindings = [self._binding(b) for b in pending[1]]
+                    pending = next(grouped, None)
+                yield UserRecord.from_rows(self._user_row(record), user_bindings)
+
+    def get_all_users(self) -> List[UserView]:
+        return [self._to_user(loaded) for loaded in self._iter_loaded()]
+
+    def iter_rows(self) -> Iterator[Dict]:
+        for loaded in self._iter_loaded(stream=True):
+            yield self._flat_row(loaded)
+
+    def import_rows(self, rows: Iterable[Dict], replace: bool = False) -> int:
+        count = 0
+        with self.engine.begin() as conn:
+            if replace:
+                conn.execute(bindings_table.delete())
+                conn.execute(users_table.delete())
+            elif conn.execute(select(func.count()).select_from(users_table)).scalar():
+                raise ValueError("The users table already contains users")
+
+            rows = iter(rows)
+            while True:
+                users, bindings = [], []
+                for row in islice(rows, IMPORT_BATCH_SIZE):
+                    user_row, user_bindings = self._split_flat_row(row)
+                    users.append({**user_row, 'user_id': int(user_row['user_id'])})
+                    bindings.extend({**b, 'user_id': int(b['user_id'])} for b in user_bindings)
+                if not users:
+                    break
+                conn.execute(users_table.insert(), users)
+                if bindings:
+                    conn.execute(bindings_table.insert(), bindings)
+                count += len(users)
+
+            if self.engine.dialect.name == "postgresql":
+                # Explicit ids bypass the sequence; move it past them
+                conn.execute(text(
+                    "SELECT setval('users_user_id_seq', COALESCE((SELECT MAX(user_id) FROM users), 0) + 1, false)"
+                ))
+
+        logger.info(f"Imported {count} users")
+        return count
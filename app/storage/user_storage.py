@@ -4,53 +4,89 @@ import tempfile
 import shutil
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Callable, Dict, Iterable, Iterator, Optional, List
 import threading
 import logging
 
+from app import metrics
 from app.config import get_settings
+from app.storage.base import UserStorageBackend
+from app.storage.bindings import BindingIndex
 from app.storage.google_sheets import get_sheets_storage
+from app.storage.journal import Journal
+from app.storage.records import BindingRecord, Compact, UserRecord, UserView, encode_id, encode_time
+from app.storage.snapshot import Snapshot, csv_fingerprint, write_snapshot
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
 
-class UserStorage:
-    COLUMNS = [
-        'user_id', 'created_at', 'updated_at',
-        'discord_id', 'discord_username',
-        'telegram_id', 'telegram_username'
-    ]
+class UserStorage(UserStorageBackend):
+    """
+    CSV-backed storage: users.csv and bindings.csv snapshots plus users.journal change log.
+
+    Each snapshot is also written as users.snap (see app/storage/snapshot.py),
+    which is memory-mapped at startup instead of parsing the CSVs. Users are
+    read from it on demand; self._users and self.bindings only hold users
+    changed since the process started (or everyone, if the CSVs had to be
+    parsed and no snapshot could be written).
+
+    Users are held as compact UserRecords (see app/storage/records.py).
+    Only writers take self.lock. Records are immutable and each change is
+    published as a new record with a single dict assignment, so readers
+    look users up without locking and always see a consistent user, either
+    just before or just after a concurrent write.
+    """
 
     def __init__(self, data_dir: str = "data"):
+        super().__init__()
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         self.users_file = self.data_dir / "users.csv"
-        self.lock = threading.Lock()
+        self.bindings_file = self.data_dir / "bindings.csv"
+        self.journal_file = self.data_dir / "users.journal"
+        self.snapshot_file = self.data_dir / "users.snap"
+        self.lock = metrics.TimedLock()
         self.sheets = get_sheets_storage()
+        # user_id -> record; records are replaced, never mutated
+        self._users: Dict[int, UserRecord] = {}
+        self.bindings = BindingIndex(self.PLATFORMS)
+        self._snapshot: Optional[Snapshot] = None
+        self._next_user_id = 1
+        self._compacting = False
         self._init_file()
+        self._load()
+        self._replay_journal()
+        self.journal = Journal(self.journal_file)
 
     def _init_file(self):
-        if not self.users_file.exists():
-            try:
-                with open(self.users_file, 'w', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(self.COLUMNS)
-                logger.info(f"Initialized CSV file: {self.users_file}")
-            except Exception as e:
-                logger.error(f"Failed to initialize CSV file: {e}")
-                raise
+        try:
+            for path, columns in ((self.users_file, self.USER_COLUMNS),
+                                  (self.bindings_file, self.BINDING_COLUMNS)):
+                if not path.exists():
+                    with open(path, 'w', newline='') as f:
+                        writer = csv.writer(f)
+                        writer.writerow(columns)
+                    logger.info(f"Initialized CSV file: {path}")
+        except Exception as e:
+            logger.error(f"Failed to initialize CSV file: {e}")
+            raise
 
-    def _safe_write_csv(self, rows: List[Dict]):
+    def _safe_write_csv(self, path: Path, columns: List[str], rows: Iterable[Dict]) -> int:
+        count = 0
         try:
             temp_fd, temp_path = tempfile.mkstemp(dir=self.data_dir, suffix='.tmp')
             try:
                 with os.fdopen(temp_fd, 'w', newline='') as f:
-                    writer = csv.DictWriter(f, fieldnames=self.COLUMNS)
+                    writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
                     writer.writeheader()
-                    writer.writerows(rows)
-                shutil.move(temp_path, self.users_file)
-                logger.debug(f"Successfully wrote {len(rows)} rows to CSV")
+                    for row in rows:
+                        writer.writerow(row)
+                        count += 1
+                    f.flush()
+                    os.fsync(f.fileno())
+                shutil.move(temp_path, path)
+                logger.debug(f"Successfully wrote {count} rows to {path.name}")
             except Exception as e:
                 if os.path.exists(temp_path):
                     os.remove(temp_path)
@@ -58,174 +94,421 @@ class UserStorage:
         except Exception as e:
             logger.error(f"Failed to write CSV file: {e}")
             raise
-
-    def _get_next_user_id(self) -> int:
+        return count
+
+    def _write_csv_snapshot(self, versions: Callable[[], Iterator[UserRecord]]):
+        # Bindings first: a crash in between leaves old users.csv plus the
+        # journal, and replaying the journal over either snapshot is safe
+        self._safe_write_csv(
+            self.bindings_file, self.BINDING_COLUMNS,
+            (row for version in versions() for row in version.binding_rows())
+        )
+        self._safe_write_csv(self.users_file, self.USER_COLUMNS, (version.row() for version in versions()))
+
+    def _write_binary_snapshot(self, versions: Callable[[], Iterator[UserRecord]]) -> bool:
         try:
-            with open(self.users_file, 'r') as f:
-                reader = csv.DictReader(f)
-                rows = list(reader)
-                if not rows:
-                    return 1
-                return max(int(row['user_id']) for row in rows) + 1
+            write_snapshot(self.snapshot_file, versions(), self.PLATFORMS, self._csv_fingerprint())
+            return True
         except Exception as e:
-            logger.error(f"Failed to get next user ID: {e}")
-            return 1
-
-    def _row_to_user(self, row: Dict) -> Dict:
-        return {
-            'id': int(row['user_id']),
-            'created_at': row['created_at'],
-            'updated_at': row['updated_at'],
-            'discord': {
-                'id': row['discord_id'],
-                'username': row['discord_username'],
-                'bound': bool(row['discord_id'])
-            } if row['discord_id'] else None,
-            'telegram': {
-                'id': row['telegram_id'],
-                'username': row['telegram_username'],
-                'bound': bool(row['telegram_id'])
-            } if row['telegram_id'] else None
-        }
-
-    def create_user(self) -> Dict:
+            # Startup falls back to the CSVs, which the old snapshot no longer matches
+            logger.error(f"Failed to write binary snapshot: {e}")
+            return False
+
+    def _write_snapshot(self, versions: Callable[[], Iterator[UserRecord]]):
+        """Write users.csv, bindings.csv and users.snap; versions() must yield users in id order"""
+        self._write_csv_snapshot(versions)
+        self._write_binary_snapshot(versions)
+
+    def _csv_fingerprint(self):
+        return csv_fingerprint(self.users_file, self.bindings_file)
+
+    @staticmethod
+    def _merge(snapshot: Optional[Snapshot], overlay: Dict[int, UserRecord]) -> Iterator[UserRecord]:
+        """Every user's current version in user_id order: overlay entries win over the snapshot"""
+        pending = sorted(overlay)
+        position = 0
+        for version in snapshot or ():
+            user_id = version.user_id
+            while position < len(pending) and pending[position] < user_id:
+                yield overlay[pending[position]]
+                position += 1
+            if position < len(pending) and pending[position] == user_id:
+                yield overlay[user_id]
+                position += 1
+            else:
+                yield version
+        for user_id in pending[position:]:
+            yield overlay[user_id]
+
+    def _current(self) -> Callable[[], Iterator[UserRecord]]:
+        """Freeze the current state; the returned callable can be iterated without the lock"""
         with self.lock:
-            user_id = self._get_next_user_id()
-            now = datetime.utcnow().isoformat()
-
-            row = {col: '' for col in self.COLUMNS}
-            row['user_id'] = user_id
-            row['created_at'] = now
-            row['updated_at'] = now
-
-            with open(self.users_file, 'a', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=self.COLUMNS)
-                writer.writerow(row)
-
-            self.sheets.sync_row(row, self.COLUMNS)
-
-            return {
-                'id': user_id,
-                'created_at': now,
-                'updated_at': now,
-                'discord': None,
-                'telegram': None
-            }
-
-    def get_user(self, user_id: int) -> Optional[Dict]:
-        with self.lock:
-            with open(self.users_file, 'r') as f:
+            overlay = dict(self._users)
+            snapshot = self._snapshot
+        return lambda: self._merge(snapshot, overlay)
+
+    def _use_snapshot(self, snapshot: Snapshot):
+        """Serve from snapshot alone; only valid before serving, when nothing is newer"""
+        # Any previous map is left for GC: lock-free readers may still hold it
+        self._snapshot = snapshot
+        self._users = {}
+        self.bindings = BindingIndex(self.PLATFORMS)
+        self._next_user_id = max(self._next_user_id, snapshot.max_user_id + 1)
+
+    def _rebase(self):
+        """After writing a snapshot during startup, drop the in-memory copy and map the file"""
+        snapshot = Snapshot.open(self.snapshot_file, self._csv_fingerprint(), self.PLATFORMS)
+        if snapshot is not None:
+            self._use_snapshot(snapshot)
+
+    def _load(self):
+        """Map users.snap if it matches the CSVs; otherwise parse the CSVs and write it"""
+        snapshot = Snapshot.open(self.snapshot_file, self._csv_fingerprint(), self.PLATFORMS)
+        if snapshot is not None:
+            self._use_snapshot(snapshot)
+            logger.info(f"Opened snapshot of {len(snapshot)} users from {self.snapshot_file}")
+            return
+
+        self._load_csv()
+        if self._write_binary_snapshot(lambda: self._merge(None, self._users)):
+            self._rebase()
+
+    def _load_csv(self):
+        """Read users.csv and bindings.csv once and build the in-memory indexes"""
+        try:
+            with open(self.users_file, 'r', newline='') as f:
                 reader = csv.DictReader(f)
+                if 'discord_id' in (reader.fieldnames or []):
+                    rows = list(reader)
+                    return self._load_wide_layout(rows)
                 for row in reader:
-                    if int(row['user_id']) == user_id:
-                        return self._row_to_user(row)
-        return None
+                    self._add_user(UserRecord.from_rows({col: row.get(col) or '' for col in self.USER_COLUMNS}))
+
+            with open(self.bindings_file, 'r', newline='') as f:
+                for row in csv.DictReader(f):
+                    row = {col: row.get(col) or '' for col in self.BINDING_COLUMNS}
+                    if not self.bindings.supports(row['platform']):
+                        logger.warning(f"Skipping binding for unsupported platform {row['platform']}")
+                        continue
+                    version = self._users.get(int(row['user_id']))
+                    if version is None:
+                        logger.warning(f"Skipping {row['platform']} binding of unknown user {row['user_id']}")
+                        continue
+                    self._set_binding(version, BindingRecord.from_row(row), version.updated_at)
+            logger.info(
+                f"Loaded {len(self._users)} users and {len(self.bindings)} bindings from {self.data_dir}"
+            )
+        except Exception as e:
+            logger.error(f"Failed to load CSV file: {e}")
+            raise
+
+    def _load_wide_layout(self, rows: List[Dict]):
+        """Migrate a users.csv with one id/username column pair per platform"""
+        for row in rows:
+            version = UserRecord.from_rows(*self._split_flat_row(row))
+            self._add_user(version)
+            for binding in version.bindings:
+                self.bindings.put(binding.platform, binding.account_id, version.user_id)
+        self._write_csv_snapshot(lambda: self._merge(None, self._users))
+        logger.info(f"Migrated {len(self._users)} users to users.csv + bindings.csv")
+
+    def _add_user(self, version: UserRecord):
+        self._users[version.user_id] = version
+        if version.user_id >= self._next_user_id:
+            self._next_user_id = version.user_id + 1
+
+    def _set_binding(self, version: UserRecord, binding: BindingRecord, updated_at: Compact) -> UserRecord:
+        """Publish version with binding, replacing the user's account on that platform (lock held)"""
+        previous = version.binding(binding.platform)
+        if previous is not None and previous.account_id != binding.account_id:
+            self.bindings.remove(previous.platform, previous.account_id, version.user_id)
+        self.bindings.put(binding.platform, binding.account_id, version.user_id)
+        version = version.with_binding(binding, updated_at)
+        self._users[version.user_id] = version
+        return version
+
+    def _replay_journal(self):
+        """Apply journal records left over from the previous run, then compact them"""
+        journal_files = [
+            Journal.compacting_path_for(self.journal_file),
+            self.journal_file,
+        ]
+        replayed = 0
+        for path in journal_files:
+            for record in Journal.read_records(path):
+                self._apply(record)
+                replayed += 1
+
+        if replayed:
+            logger.info(f"Replayed {replayed} journal records, writing fresh snapshot")
+            self._write_snapshot(lambda: self._merge(self._snapshot, self._users))
+        for path in journal_files:
+            if path.exists():
+                path.unlink()
+        if replayed:
+            self._rebase()
+
+    def _apply(self, record: Dict) -> Optional[UserRecord]:
+        """Apply a journal record to the in-memory state and return the user's new record"""
+        user_id = int(record['user_id'])
+        op = record['op']
+        at = encode_time(record['at'])
+
+        if op == 'create':
+            version = UserRecord(user_id, at, at)
+            self._add_user(version)
+            return version
+
+        version = self._materialize(user_id)
+        if version is None:
+            return None
+        platform = record['platform']
+        previous = version.binding(platform)
+        if op == 'bind':
+            account_id = encode_id(record['platform_user_id'])
+            same_account = previous is not None and previous.account_id == account_id
+            binding = BindingRecord(
+                platform, account_id, record['username'],
+                previous.created_at if same_account else at, at,
+            )
+            return self._set_binding(version, binding, at)
+        elif op == 'unbind':
+            if previous is not None:
+                self.bindings.remove(platform, previous.account_id, user_id)
+            version = version.without_binding(platform, at)
+            self._users[user_id] = version
+            return version
+        else:
+            logger.warning(f"Skipping unknown journal operation: {op}")
+            return None
+
+    def _commit(self, seq: int):
+        self.journal.sync(seq)
 
-    def get_user_by_platform(self, platform: str, platform_user_id: str) -> Optional[Dict]:
         with self.lock:
-            with open(self.users_file, 'r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row[f'{platform}_id'] == platform_user_id:
-                        return self._row_to_user(row)
-        return None
+            if self._compacting or self.journal.records < settings.JOURNAL_COMPACT_THRESHOLD:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, name="user-storage-compaction", daemon=True).start()
 
-    def bind_platform(self, user_id: int, platform: str,
-                      platform_user_id: str, username: Optional[str] = None) -> Dict:
+    def compact(self):
+        """Write fresh CSV snapshots and drop the journal records they cover"""
+        try:
+            with self.lock:
+                overlay = dict(self._users)
+                snapshot = self._snapshot
+                if not self.journal.compacting_path.exists():
+                    self.journal.rotate()
+
+            self._write_snapshot(lambda: self._merge(snapshot, overlay))
+            self.journal.compacting_path.unlink()
+            logger.info("Compacted journal into a fresh snapshot")
+        except Exception as e:
+            logger.error(f"Journal compaction failed: {e}")
+        finally:
+            with self.lock:
+                self._compacting = False
+
+    def _check_platform(self, platform: str):
+        if not self.bindings.supports(platform):
+            raise ValueError(f"Unsupported platform: {platform}")
+
+    def _version(self, user_id: int) -> Optional[UserRecord]:
+        version = self._users.get(user_id)
+        # Read once: import_rows may swap it out under a lock-free reader
+        snapshot = self._snapshot
+        if version is None and snapshot is not None:
+            version = snapshot.version(user_id)
+        return version
+
+    def _materialize(self, user_id: int) -> Optional[UserRecord]:
+        """Copy a user from the snapshot into the in-memory indexes before changing it (lock held)"""
+        version = self._users.get(user_id)
+        if version is None and self._snapshot is not None:
+            version = self._snapshot.version(user_id)
+            if version is not None:
+                for binding in version.bindings:
+                    self.bindings.put(binding.platform, binding.account_id, user_id)
+                self._users[user_id] = version
+        return version
+
+    def _lookup(self, platform: str, platform_user_id: str) -> Optional[UserRecord]:
+        """Current record of the user holding an account, or None"""
+        account_id = encode_id(platform_user_id)
+        user_id = self.bindings.owner(platform, account_id)
+        snapshot = self._snapshot
+        if user_id is None and snapshot is not None:
+            user_id = snapshot.owner(platform, account_id)
+        version = self._version(user_id) if user_id is not None else None
+        # The account may have moved since the snapshot, or between the two
+        # lookups; only answer with a record of the user that holds it
+        held = version.binding(platform) if version else None
+        if held is None or held.account_id != account_id:
+            return None
+        return version
+
+    def _user(self, user_id: int) -> Optional[UserView]:
+        version = self._version(user_id)
+        return self._to_user(version) if version else None
+
+    def _enqueue_sheets(self, user_id: int):
+        self.sheets.enqueue_row(self._flat_row(self._users[user_id]), self.COLUMNS)
+
+    def create_user(self) -> UserView:
         with self.lock:
-            rows = []
-            updated_user = None
-            user_found = False
+            user_id = self._next_user_id
             now = datetime.utcnow().isoformat()
 
-            try:
-                with open(self.users_file, 'r') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        existing_platform_id = row.get(f'{platform}_id', '')
-                        if existing_platform_id and existing_platform_id == platform_user_id:
-                            if int(row['user_id']) != user_id:
-                                logger.warning(
-                                    f"Attempted duplicate binding: {platform} ID {platform_user_id} "
-                                    f"already bound to user {row['user_id']}"
-                                )
-                                platform_name = platform.capitalize()
-                                raise ValueError(
-                                    f"This {platform_name} account is already connected. Please use a different {platform_name} account or contact support."
-                                )
-            except FileNotFoundError:
-                logger.error("CSV file not found during duplicate check")
-                raise
+            record = {'op': 'create', 'user_id': user_id, 'at': now}
+            seq = self.journal.append(record)
+            self._apply(record)
+            self._enqueue_sheets(user_id)
+            user = self._user(user_id)
 
-            try:
-                with open(self.users_file, 'r') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        if int(row['user_id']) == user_id:
-                            user_found = True
-                            row[f'{platform}_id'] = platform_user_id
-                            row[f'{platform}_username'] = username or ''
-                            row['updated_at'] = now
-                            updated_user = self._row_to_user(row)
-                        rows.append(row)
-
-                if not user_found:
+        self._commit(seq)
+        self._notify_change(user_id)
+        return user
+
+    def get_user(self, user_id: int) -> Optional[UserView]:
+        return self._user(user_id)
+
+    def get_user_by_platform(self, platform: str, platform_user_id: str) -> Optional[UserView]:
+        version = self._lookup(platform, platform_user_id)
+        return self._to_user(version) if version else None
+
+    def bind_platform(self, user_id: int, platform: str,
+                      platform_user_id: str, username: Optional[str] = None) -> UserView:
+        try:
+            with self.lock:
+                self._check_platform(platform)
+                existing = self._lookup(platform, platform_user_id)
+                existing_user_id = existing.user_id if existing else None
+                if existing_user_id is not None and existing_user_id != user_id:
+                    logger.warning(
+                        f"Attempted duplicate binding: {platform} ID {platform_user_id} "
+                        f"already bound to user {existing_user_id}"
+                    )
+                    raise self.duplicate_binding_error(platform)
+
+                if self._materialize(user_id) is None:
                     logger.error(f"User {user_id} not found for platform binding")
                     raise ValueError(f"User {user_id} not found")
 
-                self._safe_write_csv(rows)
-                logger.info(f"Successfully bound {platform} ID {platform_user_id} to user {user_id}")
+                record = {
+                    'op': 'bind',
+                    'user_id': user_id,
+                    'platform': platform,
+                    'platform_user_id': platform_user_id,
+                    'username': username or '',
+                    'at': datetime.utcnow().isoformat(),
+                }
+                seq = self.journal.append(record)
+                self._apply(record)
+                self._enqueue_sheets(user_id)
+                user = self._user(user_id)
+
+            self._commit(seq)
+            self._notify_change(user_id)
+            logger.info(f"Successfully bound {platform} ID {platform_user_id} to user {user_id}")
+            return user
+        except Exception as e:
+            logger.error(f"Failed to bind platform: {e}")
+            raise
+
+    def unbind_platform(self, user_id: int, platform: str) -> Optional[UserView]:
+        try:
+            with self.lock:
+                self._check_platform(platform)
+                if self._materialize(user_id) is None:
+                    return None
+
+                record = {
+                    'op': 'unbind',
+                    'user_id': user_id,
+                    'platform': platform,
+                    'at': datetime.utcnow().isoformat(),
+                }
+                seq = self.journal.append(record)
+                self._apply(record)
+                self._enqueue_sheets(user_id)
+                user = self._user(user_id)
+
+            self._commit(seq)
+            self._notify_change(user_id)
+            logger.info(f"Successfully unbound {platform} from user {user_id}")
+            return user
+        except Exception as e:
+            logger.error(f"Failed to unbind platform: {e}")
+            raise
 
-                for row in rows:
-                    if int(row['user_id']) == user_id:
-                        self.sheets.sync_row(row, self.COLUMNS)
-                        break
+    def get_all_users(self) -> List[UserView]:
+        return [self._to_user(version) for version in self._current()()]
 
-                return updated_user
-            except Exception as e:
-                logger.error(f"Failed to bind platform: {e}")
-                raise
+    def iter_rows(self) -> Iterator[Dict]:
+        for version in self._current()():
+            yield self._flat_row(version)
 
-    def unbind_platform(self, user_id: int, platform: str) -> Optional[Dict]:
+    def import_rows(self, rows: Iterable[Dict], replace: bool = False) -> int:
         with self.lock:
-            rows = []
-            updated_user = None
-            now = datetime.utcnow().isoformat()
+            if (self._users or self._snapshot) and not replace:
+                raise ValueError(f"{self.users_file} already contains users")
 
+            bindings_fd, bindings_path = tempfile.mkstemp(dir=self.data_dir, suffix='.tmp')
             try:
-                with open(self.users_file, 'r') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        if int(row['user_id']) == user_id:
-                            row[f'{platform}_id'] = ''
-                            row[f'{platform}_username'] = ''
-                            row['updated_at'] = now
-                            updated_user = self._row_to_user(row)
-                        rows.append(row)
-
-                self._safe_write_csv(rows)
-                logger.info(f"Successfully unbound {platform} from user {user_id}")
-
-                return updated_user
-            except Exception as e:
-                logger.error(f"Failed to unbind platform: {e}")
+                # Stream users straight to disk; bindings go to a side file
+                # that is swapped in alongside
+                with os.fdopen(bindings_fd, 'w', newline='') as bindings_f:
+                    bindings_writer = csv.DictWriter(bindings_f, fieldnames=self.BINDING_COLUMNS)
+                    bindings_writer.writeheader()
+
+                    def user_rows():
+                        for row in rows:
+                            user_row, bindings = self._split_flat_row(row)
+                            bindings_writer.writerows(bindings)
+                            yield user_row
+
+                    users_path = self.data_dir / "users.csv.import"
+                    count = self._safe_write_csv(users_path, self.USER_COLUMNS, user_rows())
+                    bindings_f.flush()
+                    os.fsync(bindings_f.fileno())
+            except Exception:
+                os.remove(bindings_path)
                 raise
 
-    def get_all_users(self) -> List[Dict]:
-        with self.lock:
-            users = []
-            with open(self.users_file, 'r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    users.append(self._row_to_user(row))
-            return users
+            # The journal only holds changes to the data being replaced
+            self.journal.close()
+            os.replace(bindings_path, self.bindings_file)
+            os.replace(users_path, self.users_file)
+            for path in (self.journal_file, self.journal.compacting_path):
+                if path.exists():
+                    path.unlink()
+
+            self._users = {}
+            self.bindings = BindingIndex(self.PLATFORMS)
+            # Dropped, not closed: readers without the lock may still be using
+            # the old map, which is unmapped once the last of them lets go
+            self._snapshot = None
+            self._next_user_id = 1
+            self._load()
+            self.journal = Journal(self.journal_file)
+
+        logger.info(f"Imported {count} users into {self.data_dir}")
+        return count
 
 
 _storage_instance = None
 
 
-def get_user_storage() -> UserStorage:
+def get_user_storage() -> UserStorageBackend:
     global _storage_instance
     if _storage_instance is None:
-        _storage_instance = UserStorage(settings.CSV_DATA_DIR)
+        backend = settings.STORAGE_BACKEND.lower()
+        if backend == "csv":
+            _storage_instance = UserStorage(settings.CSV_DATA_DIR)
+        elif backend == "sql":
+            from app.storage.sql_storage import SQLUserStorage
+            database_url = settings.DATABASE_URL or f"sqlite:///{settings.CSV_DATA_DIR}/users.db"
+            _storage_instance = SQLUserStorage(database_url)
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
     return _storage_instance
@@ -0,0 +1,103 @@
+"""Bounded in-memory key/value store with per-entry expiry"""
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.state_store import AsyncStateStore, StateStore
+
+logger = logging.getLogger(__name__)
+
+
+class TTLStore(StateStore):
+    """
+    Dict-like store whose entries expire after a TTL.
+
+    Expiry times live in a min-heap so sweep() only touches entries that are
+    actually due. The store never holds more than max_size entries: inserting
+    into a full store evicts the entry closest to expiry.
+    """
+
+    def __init__(self, default_ttl: float, max_size: int, name: str = "store"):
+        self.default_ttl = default_ttl
+        self.max_size = max_size
+        self.name = name
+        self._data: Dict[str, Tuple[float, Any]] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.default_ttl)
+        with self._lock:
+            if key not in self._data:
+                while len(self._data) >= self.max_size and self._evict_one():
+                    pass
+            self._data[key] = (expires_at, value)
+            heapq.heappush(self._heap, (expires_at, key))
+            # Heap entries for popped/overwritten keys linger until they are
+            # due; rebuild if they start to dominate
+            if len(self._heap) > 2 * len(self._data) + 1024:
+                self._heap = [(exp, k) for k, (exp, _) in self._data.items()]
+                heapq.heapify(self._heap)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            with self._lock:
+                if self._data.get(key) is entry:
+                    del self._data[key]
+            return default
+        return value
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        """Atomically remove and return a live entry"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is None or time.monotonic() >= entry[0]:
+            return default
+        return entry[1]
+
+    def _evict_one(self) -> bool:
+        while self._heap:
+            expires_at, key = heapq.heappop(self._heap)
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == expires_at:
+                del self._data[key]
+                self.evictions += 1
+                return True
+        return False
+
+    def sweep(self) -> int:
+        """Drop every expired entry and return how many were removed"""
+        now = time.monotonic()
+        removed = 0
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                expires_at, key = heapq.heappop(self._heap)
+                entry = self._data.get(key)
+                if entry is not None and entry[0] == expires_at:
+                    del self._data[key]
+                    removed += 1
+        if removed:
+            logger.debug(f"Expired {removed} entries from {self.name}")
+        return removed
+
+
+async def run_sweeper(stores: List[AsyncStateStore], interval: float):
+    """Periodically sweep expired entries; run as a background task"""
+    while True:
+        await asyncio.sleep(interval)
+        for store in stores:
+            try:
+                await store.sweep()
+            except Exception as e:
+                logger.error(f"Failed to sweep {store.name}: {e}")
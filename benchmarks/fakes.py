@@ -0,0 +1,114 @@
+"""In-process stand-ins for the Discord, Telegram and Google Sheets APIs"""
+import asyncio
+import json
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import parse_qs
+
+import httpx
+
+
+class FakeUpstreams:
+    """
+    httpx.MockTransport handler answering the Discord OAuth and Telegram Bot
+    API calls the app makes, after a fixed simulated network latency.
+
+    The Discord user id is the authorization code itself, so a flow picks
+    the account it logs in as by the code it sends to the callback.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self.transport = httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        path = request.url.path
+
+        if path.endswith("/oauth2/token"):
+            self._count("discord.token")
+            code = parse_qs(request.content.decode())["code"][0]
+            return httpx.Response(200, json={"access_token": f"token-{code}", "token_type": "Bearer"})
+        if path.endswith("/users/@me"):
+            self._count("discord.me")
+            discord_id = request.headers["authorization"].rsplit("token-", 1)[1]
+            return httpx.Response(200, json={"id": discord_id, "username": f"user{discord_id}"})
+        if path.endswith("/sendMessage"):
+            self._count("telegram.sendMessage")
+            payload = json.loads(request.content)
+            return httpx.Response(200, json={"ok": True, "result": {"chat": {"id": payload["chat_id"]}}})
+        if path.endswith("/getMe"):
+            return httpx.Response(200, json={"ok": True, "result": {"id": 1, "username": "bench_bot"}})
+
+        self._count("unknown")
+        return httpx.Response(404, json={"ok": False})
+
+    def _count(self, name: str):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+
+class FakeWorksheet:
+    """
+    The slice of gspread's Worksheet that GoogleSheetsStorage uses, kept in
+    memory. Each call blocks the Sheets worker thread for `latency` seconds,
+    like a round trip to the Sheets API would.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.rows: List[List] = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def row_values(self, row: int) -> List:
+        self._call()
+        with self._lock:
+            return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def col_values(self, col: int) -> List:
+        self._call()
+        with self._lock:
+            return [row[col - 1] if len(row) >= col else '' for row in self.rows]
+
+    def update(self, cell: str, values: List[List]):
+        self._call()
+        with self._lock:
+            self._write(int(cell[1:]), values)
+
+    def batch_update(self, updates: List[Dict]):
+        self._call()
+        with self._lock:
+            for update in updates:
+                self._write(int(update['range'][1:]), update['values'])
+
+    def append_rows(self, values: List[List]) -> Dict:
+        self._call()
+        with self._lock:
+            start = len(self.rows) + 1
+            self.rows.extend(list(row) for row in values)
+            return {"updates": {"updatedRange": f"Users!A{start}:Z{len(self.rows)}"}}
+
+    def clear(self):
+        self._call()
+        with self._lock:
+            self.rows = []
+
+    def delete_rows(self, row: int):
+        self._call()
+        with self._lock:
+            del self.rows[row - 1]
+
+    def _write(self, start_row: int, values: List[List]):
+        for offset, row in enumerate(values):
+            index = start_row - 1 + offset
+            while len(self.rows) <= index:
+                self.rows.append([])
+            self.rows[index] = list(row)
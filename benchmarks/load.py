@@ -0,0 +1,383 @@
+"""
+End-to-end load benchmark.
+
+Boots app.main:app in-process against local Discord, Telegram and Sheets
+stand-ins (benchmarks/fakes.py) and drives the full binding flow through
+httpx's ASGI transport:
+
+    GET /  ->  GET /auth/discord  ->  GET /auth/discord/callback  ->
+    GET /dashboard  ->  GET /auth/telegram  ->  POST /auth/telegram/webhook
+    ->  GET /auth/me (polled until the Telegram binding shows up)
+
+The client shares the app's event loop, so absolute latencies include
+client overhead; compare runs against each other, not against production.
+Each dataset size is seeded once and run in its own process, so storage
+load time and peak memory are measured per size too:
+
+    python -m benchmarks.load                               # 1k, 100k and 1M users
+    python -m benchmarks.load --users 1000 --flows 500
+    python -m benchmarks.load --backend sql --json bench.json
+
+Pass --data-dir to keep seeded datasets between runs; every run starts
+from a copy, so results stay comparable.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DATASETS = [1000, 100000, 1000000]
+DISCORD_ID_BASE = 10 ** 17
+TELEGRAM_ID_BASE = 10 ** 9
+# Share of seeded users that already have Telegram bound
+SEEDED_TELEGRAM_SHARE = 0.7
+
+BENCH_ENV = {
+    "DISCORD_CLIENT_ID": "bench",
+    "DISCORD_CLIENT_SECRET": "bench",
+    "DISCORD_REDIRECT_URI": "http://testserver/auth/discord/callback",
+    "TELEGRAM_BOT_TOKEN": "123456:bench",
+    "TELEGRAM_BOT_USERNAME": "bench_bot",
+    "TELEGRAM_INGESTION_MODE": "webhook",
+    # The stand-in has no rate limit; don't let the real one queue replies
+    "TELEGRAM_GLOBAL_RATE": "100000",
+    "GOOGLE_SHEETS_ENABLED": "false",
+    "ENVIRONMENT": "benchmark",
+}
+
+
+class LatencyStats:
+    """Per-route latencies (seconds) and error counts"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, route: str, seconds: float, ok: bool = True):
+        self.samples.setdefault(route, []).append(seconds)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def error(self, route: str):
+        self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict]:
+        routes = {}
+        for route, samples in self.samples.items():
+            samples.sort()
+            routes[route] = {
+                "count": len(samples),
+                "errors": self.errors.get(route, 0),
+                "rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+                **{f"p{p}_ms": round(percentile(samples, p) * 1000, 2) for p in (50, 95, 99)},
+            }
+        for route, errors in self.errors.items():
+            routes.setdefault(route, {"count": 0, "errors": errors})
+        return routes
+
+
+def percentile(sorted_samples: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, -(-len(sorted_samples) * p // 100))
+    return sorted_samples[int(rank) - 1]
+
+
+def seed_rows(count: int) -> Iterator[Dict]:
+    """Flat user rows (UserStorageBackend.COLUMNS) for a synthetic dataset"""
+    created_at = "2025-01-01T00:00:00"
+    for user_id in range(1, count + 1):
+        row = {
+            "user_id": str(user_id),
+            "created_at": created_at,
+            "updated_at": created_at,
+            "discord_id": str(DISCORD_ID_BASE + user_id),
+            "discord_username": f"seed{user_id}",
+        }
+        if user_id % 10 < SEEDED_TELEGRAM_SHARE * 10:
+            row["telegram_id"] = str(TELEGRAM_ID_BASE + user_id)
+            row["telegram_username"] = f"seed_tg{user_id}"
+        yield row
+
+
+class FlowRunner:
+    """Runs binding flows against the app and records per-route latencies"""
+
+    def __init__(self, app, users: int, returning: float, polls: int, poll_interval: float, seed: int):
+        self.transport = httpx.ASGITransport(app=app)
+        self.users = users
+        self.returning = returning
+        self.polls = polls
+        self.poll_interval = poll_interval
+        self.random = random.Random(seed)
+        self.stats = LatencyStats()
+        # Numbers flows across runs (warmup included) so account and update ids never repeat
+        self._flow_ids = itertools.count()
+        self._returning_ids = set()
+
+    async def _request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.stats.record(route, time.perf_counter() - started, response.status_code < 400)
+        return response
+
+    async def flow(self):
+        index = next(self._flow_ids)
+        # Returning users log in with a seeded Discord account (each one at
+        # most once); either way the Telegram account is new, so the bind is
+        # observable on /auth/me
+        discord_id = DISCORD_ID_BASE + self.users + index + 1
+        if len(self._returning_ids) < self.users and self.random.random() < self.returning:
+            seeded_id = self.random.randint(1, self.users)
+            while seeded_id in self._returning_ids:
+                seeded_id = self.random.randint(1, self.users)
+            self._returning_ids.add(seeded_id)
+            discord_id = DISCORD_ID_BASE + seeded_id
+        telegram_id = TELEGRAM_ID_BASE + self.users + index + 1
+
+        async with httpx.AsyncClient(transport=self.transport, base_url="http://testserver") as client:
+            await self._request(client, "GET /", "GET", "/")
+
+            response = await self._request(client, "GET /auth/discord", "GET", "/auth/discord")
+            state = parse_qs(urlsplit(response.headers["location"]).query)["state"][0]
+            response = await self._request(
+                client, "GET /auth/discord/callback", "GET", "/auth/discord/callback",
+                params={"code": str(discord_id), "state": state}
+            )
+            if "session" not in client.cookies:
+                self.stats.error("login")
+                return
+
+            await self._request(client, "GET /dashboard", "GET", "/dashboard")
+            response = await self._request(client, "GET /auth/me", "GET", "/auth/me")
+            etag = response.headers.get("etag")
+
+            response = await self._request(client, "GET /auth/telegram", "GET", "/auth/telegram")
+            auth_code = response.json()["auth_url"].split("start=", 1)[1]
+            update = {
+                "update_id": index + 1,
+                "message": {
+                    "message_id": 1,
+                    "chat": {"id": telegram_id, "type": "private"},
+                    "from": {"id": telegram_id, "username": f"tg{telegram_id}"},
+                    "text": f"/start {auth_code}",
+                },
+            }
+            bind_started = time.perf_counter()
+            await self._request(client, "POST /auth/telegram/webhook", "POST", "/auth/telegram/webhook", json=update)
+
+            for _ in range(self.polls):
+                headers = {"If-None-Match": etag} if etag else {}
+                response = await self._request(client, "GET /auth/me", "GET", "/auth/me", headers=headers)
+                if response.status_code == 200:
+                    etag = response.headers.get("etag")
+                    telegram = response.json()["bindings"].get("telegram") or {}
+                    if telegram.get("platform_user_id") == str(telegram_id):
+                        self.stats.record("telegram bind (webhook -> /auth/me)", time.perf_counter() - bind_started)
+                        return
+                await asyncio.sleep(self.poll_interval)
+            self.stats.error("telegram bind (webhook -> /auth/me)")
+
+    async def run(self, flows: int, concurrency: int) -> float:
+        pending = iter(range(flows))
+
+        async def worker():
+            for _ in pending:
+                try:
+                    await self.flow()
+                except Exception as e:
+                    logger.warning(f"Flow failed: {e!r}")
+                    self.stats.error("flow")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def seed_dataset(users: int):
+    """Worker: import a synthetic dataset into the configured backend"""
+    from app.storage.user_storage import get_user_storage
+
+    get_user_storage().import_rows(seed_rows(users))
+
+
+async def _run_flows(args) -> Dict:
+    from app.storage.user_storage import get_user_storage
+    from app.storage.google_sheets import get_sheets_storage
+    from benchmarks.fakes import FakeUpstreams, FakeWorksheet
+
+    started = time.perf_counter()
+    get_user_storage()
+    storage_load = time.perf_counter() - started
+
+    from app.main import app
+    from app.oauth import http_clients
+    from app.oauth.telegram_dispatcher import get_dispatcher
+
+    upstreams = FakeUpstreams(args.upstream_latency / 1000)
+    # Clients created here are kept by the lifespan's start_clients()
+    await http_clients.start_clients(upstreams.transport)
+    sheets = get_sheets_storage()
+    sheets.use_worksheet(FakeWorksheet(args.sheets_latency / 1000))
+
+    runner = FlowRunner(app, args.users[0], args.returning, args.polls, args.poll_interval / 1000, args.seed)
+    async with app.router.lifespan_context(app):
+        if args.warmup:
+            await runner.run(args.warmup, min(args.concurrency, args.warmup))
+            # Only the measured flows count, for calls as for latencies; the
+            # warmup's replies are still queued in the Telegram dispatcher
+            dispatcher = get_dispatcher()
+            while dispatcher.queue_depth:
+                await asyncio.sleep(0.01)
+            runner.stats = LatencyStats()
+            upstreams.calls.clear()
+        sheets_before = sheets.queue_stats()
+        elapsed = await runner.run(args.flows, args.concurrency)
+        sheets_stats = sheets.queue_stats()
+
+    requests = sum(len(samples) for route, samples in runner.stats.samples.items() if route.startswith(("GET", "POST")))
+    return {
+        "users": args.users[0],
+        "backend": os.environ.get("STORAGE_BACKEND", "csv"),
+        "flows": args.flows,
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(requests / elapsed, 1) if elapsed else 0.0,
+        "storage_load_s": round(storage_load, 3),
+        "peak_rss_mb": _peak_rss_mb(),
+        "routes": runner.stats.summary(elapsed),
+        "upstream_calls": upstreams.calls,
+        "sheets": {
+            "queue_depth": sheets_stats["queue_depth"],
+            **{key: sheets_stats[key] - sheets_before[key] for key in ("flushes", "rows_synced", "failures")},
+        },
+    }
+
+
+def _spawn(worker: str, args, users: int, data_dir: Path, build_dir: Path, result: Optional[Path] = None):
+    env = {**BENCH_ENV, **os.environ}
+    env.update({
+        "STORAGE_BACKEND": args.backend,
+        "CSV_DATA_DIR": str(data_dir),
+        "STATIC_BUILD_DIR": str(build_dir),
+    })
+    if args.backend == "sql":
+        env.pop("DATABASE_URL", None)
+    command = [
+        sys.executable, "-m", "benchmarks.load", "--worker", worker, "--users", str(users),
+        "--flows", str(args.flows), "--concurrency", str(args.concurrency), "--warmup", str(args.warmup),
+        "--returning", str(args.returning), "--polls", str(args.polls),
+        "--poll-interval", str(args.poll_interval), "--upstream-latency", str(args.upstream_latency),
+        "--sheets-latency", str(args.sheets_latency), "--seed", str(args.seed),
+    ]
+    if result is not None:
+        command += ["--result", str(result)]
+    subprocess.run(command, env=env, check=True, cwd=Path(__file__).resolve().parent.parent)
+
+
+def run_dataset(args, users: int, work_dir: Path, data_dir: Optional[Path]) -> Dict:
+    seeded = (data_dir or work_dir) / f"{args.backend}-{users}"
+    if not (seeded / ".seeded").exists():
+        shutil.rmtree(seeded, ignore_errors=True)
+        seeded.mkdir(parents=True)
+        started = time.perf_counter()
+        _spawn("seed", args, users, seeded, work_dir / "static")
+        (seeded / ".seeded").touch()
+        logger.info(f"Seeded {users} users in {time.perf_counter() - started:.1f}s")
+
+    run_dir = work_dir / f"run-{args.backend}-{users}"
+    shutil.rmtree(run_dir, ignore_errors=True)
+    shutil.copytree(seeded, run_dir)
+    result = work_dir / f"result-{users}.json"
+    _spawn("run", args, users, run_dir, work_dir / "static", result)
+    shutil.rmtree(run_dir, ignore_errors=True)
+    return json.loads(result.read_text())
+
+
+def format_result(result: Dict) -> str:
+    lines = [
+        f"== {result['users']:,} users ({result['backend']}): {result['flows']:,} flows, "
+        f"concurrency {result['concurrency']}, {result['elapsed_s']}s, "
+        f"{result['requests_per_s']} req/s, storage load {result['storage_load_s']}s, "
+        f"peak RSS {result['peak_rss_mb']} MB",
+        f"{'route':<40} {'count':>8} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}",
+    ]
+    for route, row in sorted(result["routes"].items()):
+        lines.append(
+            f"{route:<40} {row['count']:>8} {row['errors']:>7} {row.get('rps', 0):>9} "
+            f"{row.get('p50_ms', 0):>9} {row.get('p95_ms', 0):>9} {row.get('p99_ms', 0):>9}"
+        )
+    lines.append(f"upstream calls: {result['upstream_calls']}  sheets: {result['sheets']}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end load benchmark")
+    parser.add_argument("--users", type=int, nargs="+", default=DATASETS,
+                        help="dataset sizes to seed and run against")
+    parser.add_argument("--backend", choices=["csv", "sql"], default="csv")
+    parser.add_argument("--flows", type=int, default=2000, help="binding flows per dataset")
+    parser.add_argument("--concurrency", type=int, default=50, help="flows in flight at once")
+    parser.add_argument("--warmup", type=int, default=50, help="flows run before measuring")
+    parser.add_argument("--returning", type=float, default=0.2,
+                        help="share of flows logging in with an already seeded Discord account")
+    parser.add_argument("--polls", type=int, default=50, help="/auth/me polls before a bind counts as failed")
+    parser.add_argument("--poll-interval", type=float, default=20.0, help="ms between /auth/me polls")
+    parser.add_argument("--upstream-latency", type=float, default=20.0,
+                        help="simulated Discord/Telegram API latency in ms")
+    parser.add_argument("--sheets-latency", type=float, default=200.0,
+                        help="simulated Google Sheets API latency in ms")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", type=Path, help="keep seeded datasets here between runs")
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    parser.add_argument("--worker", choices=["seed", "run"], help=argparse.SUPPRESS)
+    parser.add_argument("--result", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    if args.worker:
+        # The app's own per-request logging would dominate the measurements
+        for name in ("app", "httpx"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+        if args.worker == "seed":
+            seed_dataset(args.users[0])
+        else:
+            args.result.write_text(json.dumps(asyncio.run(_run_flows(args))))
+        return 0
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-") as work_dir:
+        for users in args.users:
+            result = run_dataset(args, users, Path(work_dir), args.data_dir)
+            print(format_result(result), flush=True)
+            results.append(result)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
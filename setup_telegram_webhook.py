@@ -8,8 +8,16 @@ import sys
 import asyncio
 from app.config import get_settings
 from app.oauth.telegram_webhook import set_webhook, get_webhook_info
+from app.oauth.http_clients import close_clients
 
 async def main():
+    try:
+        await setup_webhook()
+    finally:
+        await close_clients()
+
+
+async def setup_webhook():
     settings = get_settings()
 
     webhook_url = f"{settings.BASE_URL}/auth/telegram/webhook"
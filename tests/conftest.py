@@ -0,0 +1,17 @@
+import os
+import tempfile
+
+# Required settings without defaults; tests never reach the real services
+for name, value in {
+    "DISCORD_CLIENT_ID": "test-client",
+    "DISCORD_CLIENT_SECRET": "test-secret",
+    "DISCORD_REDIRECT_URI": "http://localhost/auth/discord/callback",
+    "TELEGRAM_BOT_TOKEN": "123:test",
+    "TELEGRAM_BOT_USERNAME": "test_bot",
+}.items():
+    os.environ.setdefault(name, value)
+
+# Anything that loads the app's store or builds assets writes here, not into the checkout
+_scratch = tempfile.mkdtemp(prefix="binding-tests-")
+os.environ.setdefault("CSV_DATA_DIR", os.path.join(_scratch, "data"))
+os.environ.setdefault("STATIC_BUILD_DIR", os.path.join(_scratch, "build", "static"))
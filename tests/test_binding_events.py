@@ -0,0 +1,19 @@
+import asyncio
+
+from app.binding_events import BindingNotifier
+
+
+def test_change_during_read_is_not_missed():
+    async def scenario():
+        notifier = BindingNotifier()
+        with notifier.watch(1) as changes:
+            changes.arm()
+            # The change lands after arm() but before wait(), i.e. during the read
+            notifier.notify(1)
+            assert await changes.wait(0.01) is True
+            changes.arm()
+            assert await changes.wait(0.01) is False
+        assert notifier.waiting_users == 0
+        assert not notifier._events
+
+    asyncio.run(scenario())
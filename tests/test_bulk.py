@@ -0,0 +1,73 @@
+import csv
+
+from app.storage import bulk
+from app.storage.user_storage import UserStorage
+
+
+def _write_csv(path, header, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def _legacy_dir(tmp_path):
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    _write_csv(legacy / "users.csv", bulk.LEGACY_USER_COLUMNS, [
+        [1, "2025-01-15T10:30:00", "2025-01-15T10:30:00"],
+        [2, "2025-01-16T09:00:00", "2025-01-16T09:00:00"],
+    ])
+    _write_csv(legacy / "bindings.csv", bulk.LEGACY_BINDING_COLUMNS, [
+        [1, 1, "discord", "123456789012345678", "alice", "token", "", "2025-01-15T10:31:00", "2025-02-01T08:00:00"],
+        [2, 1, "telegram", "987654321", "alice_tg", "", "", "2025-01-15T10:35:00", "2025-01-15T10:35:00"],
+        [3, 1, "discord", "555", "alice_alt", "", "", "2025-01-20T00:00:00", "2025-01-20T00:00:00"],
+        [4, 9, "discord", "777", "ghost", "", "", "2025-01-20T00:00:00", "2025-01-20T00:00:00"],
+        [5, 2, "github", "42", "bob", "", "", "2025-01-20T00:00:00", "2025-01-20T00:00:00"],
+    ])
+    return legacy
+
+
+def test_legacy_join_keeps_binding_timestamps(tmp_path):
+    workdir = tmp_path / "work"
+    workdir.mkdir()
+    staging, count, problems = bulk.stage(f"legacy:{_legacy_dir(tmp_path)}", workdir, partitions=4)
+
+    assert count == 2
+    assert sorted(problems) == sorted([
+        "skipped 1 github bindings (platform not supported)",
+        "user 1 has more than one discord binding; keeping the first",
+        "discord binding 777 refers to unknown user '9'",
+    ])
+    rows = {row['user_id']: row for row, _ in bulk.read_flat_csv(staging)}
+    alice = rows['1']
+    assert (alice['discord_id'], alice['discord_username']) == ("123456789012345678", "alice")
+    assert alice['discord_created_at'] == "2025-01-15T10:31:00"
+    assert alice['discord_updated_at'] == "2025-02-01T08:00:00"
+    assert alice['telegram_created_at'] == "2025-01-15T10:35:00"
+    # The user was last changed when a binding was
+    assert alice['updated_at'] == "2025-02-01T08:00:00"
+    assert rows['2']['discord_id'] == rows['2']['discord_created_at'] == ""
+
+    storage = UserStorage(str(tmp_path / "data"))
+    storage.import_rows(row for row, _ in bulk.read_flat_csv(staging))
+    discord = storage.get_user(1).record.binding('discord').row(1)
+    assert discord['created_at'] == "2025-01-15T10:31:00"
+    assert discord['updated_at'] == "2025-02-01T08:00:00"
+
+
+def test_legacy_export_round_trips_binding_timestamps(tmp_path):
+    source = _legacy_dir(tmp_path)
+    target = tmp_path / "exported"
+    assert bulk.copy(f"legacy:{source}", f"legacy:{target}", partitions=4, replace=False) == 2
+
+    with open(target / "bindings.csv", newline='') as f:
+        exported = {(row['user_id'], row['platform']): row for row in csv.DictReader(f)}
+    assert exported[('1', 'discord')]['created_at'] == "2025-01-15T10:31:00"
+    assert exported[('1', 'telegram')]['updated_at'] == "2025-01-15T10:35:00"
+
+    # The flat CSV export keeps its documented columns
+    flat = tmp_path / "users.csv"
+    bulk.copy(f"legacy:{source}", f"csv:{flat}", partitions=4, replace=False)
+    with open(flat, newline='') as f:
+        assert csv.DictReader(f).fieldnames == bulk.COLUMNS
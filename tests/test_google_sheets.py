@@ -0,0 +1,139 @@
+import threading
+import time
+
+from app.storage import google_sheets
+from benchmarks.fakes import FakeWorksheet
+
+COLUMNS = ["user_id", "created_at"]
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_rows_queued_during_a_slow_connect_are_written(monkeypatch):
+    monkeypatch.setattr(google_sheets.settings, "GOOGLE_SHEETS_ENABLED", True)
+    worksheet = FakeWorksheet(0)
+    opened = threading.Event()
+
+    def slow_initialize(self):
+        opened.wait(5)
+        self.worksheet = worksheet
+
+    monkeypatch.setattr(google_sheets.GoogleSheetsStorage, "_initialize", slow_initialize)
+    sheets = google_sheets.GoogleSheetsStorage()
+    sheets.batch_size = 3
+    sheets.flush_interval = 0.05
+    try:
+        # Several batches' worth, spread past the flush interval, so the
+        # worker is woken with full batches that are already due
+        for user_id in range(1, 11):
+            sheets.enqueue_row({"user_id": user_id, "created_at": "t"}, COLUMNS)
+            time.sleep(0.03)
+        assert sheets.queue_stats()["queue_depth"] == 10
+
+        opened.set()
+        _wait_for(lambda: sheets.queue_stats()["rows_synced"] == 10)
+        assert sorted(int(row[0]) for row in worksheet.rows[1:]) == list(range(1, 11))
+    finally:
+        opened.set()
+        sheets.stop()
+
+
+def test_failed_connect_drops_queued_rows(monkeypatch, caplog):
+    monkeypatch.setattr(google_sheets.settings, "GOOGLE_SHEETS_ENABLED", True)
+    opened = threading.Event()
+
+    def failing_initialize(self):
+        opened.wait(5)
+        raise RuntimeError("no credentials")
+
+    monkeypatch.setattr(google_sheets.GoogleSheetsStorage, "_initialize", failing_initialize)
+    sheets = google_sheets.GoogleSheetsStorage()
+    try:
+        sheets.enqueue_row({"user_id": 1, "created_at": "t"}, COLUMNS)
+        opened.set()
+        _wait_for(lambda: sheets.connection()["status"] == "failed")
+        assert sheets.queue_stats()["queue_depth"] == 0
+        assert "Dropping 1 rows" in caplog.text
+    finally:
+        opened.set()
+        sheets.stop()
+
+
+
+def _connected_sheets(monkeypatch, worksheet):
+    monkeypatch.setattr(google_sheets.settings, "GOOGLE_SHEETS_ENABLED", True)
+    monkeypatch.setattr(google_sheets.GoogleSheetsStorage, "_initialize",
+                        lambda self: setattr(self, "worksheet", worksheet))
+    sheets = google_sheets.GoogleSheetsStorage()
+    sheets.connect()
+    return sheets
+
+
+def _row(user_id, value):
+    return (user_id, ([user_id, value], COLUMNS, 0))
+
+
+def test_updates_to_known_rows_cost_one_write(monkeypatch):
+    worksheet = FakeWorksheet(0)
+    sheets = _connected_sheets(monkeypatch, worksheet)
+    assert sheets._flush_batch([_row("1", "a"), _row("2", "a")])
+
+    calls = worksheet.calls
+    assert sheets._flush_batch([_row("1", "b"), _row("2", "b")])
+    assert worksheet.calls == calls + 1
+    assert worksheet.rows[1:] == [["1", "b"], ["2", "b"]]
+
+
+def test_user_appended_by_another_worker_is_updated_not_duplicated(monkeypatch):
+    worksheet = FakeWorksheet(0)
+    worker_a = _connected_sheets(monkeypatch, worksheet)
+    worker_b = _connected_sheets(monkeypatch, worksheet)
+    assert worker_a._flush_batch([_row("1", "a"), _row("2", "a")])
+    assert worker_b._flush_batch([_row("1", "b")])
+
+    # Created on A, then bound on B, whose row index predates it
+    assert worker_a._flush_batch([_row("3", "created-on-a")])
+    assert worker_b._flush_batch([_row("3", "bound-on-b")])
+
+    assert worksheet.rows[1:] == [["1", "b"], ["2", "a"], ["3", "bound-on-b"]]
+
+
+def test_hand_edited_sheet_is_recovered(monkeypatch):
+    worksheet = FakeWorksheet(0)
+    sheets = _connected_sheets(monkeypatch, worksheet)
+    assert sheets._flush_batch([_row("1", "a"), _row("2", "a"), _row("3", "a")])
+
+    # Someone deletes user 1's row by hand, so users 2 and 3 move up a row,
+    # then adds a row of their own at the bottom
+    worksheet.delete_rows(2)
+    worksheet.append_rows([["manual", "note"]])
+
+    # A user the index doesn't know makes the next flush re-read column A
+    assert sheets._flush_batch([_row("4", "a")])
+    assert sheets._flush_batch([_row("3", "b"), _row("2", "b")])
+
+    assert worksheet.rows[1:] == [["2", "b"], ["3", "b"], ["manual", "note"], ["4", "a"]]
+
+
+def test_app_shutdown_flushes_queued_rows(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    worksheet = FakeWorksheet(0)
+    sheets = google_sheets.GoogleSheetsStorage()
+    sheets.use_worksheet(worksheet)
+    sheets.flush_interval = 60
+    monkeypatch.setattr(google_sheets, "_sheets_instance", sheets)
+
+    for _ in range(2):
+        # The second lifespan, as in tests or reloads, gets a fresh worker
+        with TestClient(app):
+            sheets.enqueue_row({"user_id": 1, "created_at": "t"}, COLUMNS)
+            assert sheets.queue_stats()["queue_depth"] == 1
+        assert sheets.queue_stats()["queue_depth"] == 0
+    assert worksheet.rows[1:] == [[1, "t"]]
@@ -0,0 +1,52 @@
+import threading
+import time
+
+from app.storage import journal as journal_module
+from app.storage.journal import Journal
+
+
+def test_read_stops_at_torn_or_corrupt_tail(tmp_path):
+    path = tmp_path / "users.journal"
+    journal = Journal(path)
+    for user_id in (1, 2):
+        journal.sync(journal.append({"op": "create", "user_id": user_id}))
+    journal.close()
+
+    with open(path, "a") as f:
+        f.write('{"op":"create","user_id":3')  # torn: no newline
+    assert [r["user_id"] for r in Journal.read_records(path)] == [1, 2]
+
+    with open(path, "a") as f:
+        f.write('\n{"op":"create","user_id":4}\n')
+    # The now-terminated line is corrupt JSON; nothing after it is trusted
+    assert [r["user_id"] for r in Journal.read_records(path)] == [1, 2]
+
+
+def test_concurrent_syncs_share_an_fsync(tmp_path, monkeypatch):
+    journal = Journal(tmp_path / "users.journal")
+    fsyncs = []
+    real_fsync = journal_module.os.fsync
+
+    def slow_fsync(fd):
+        fsyncs.append(fd)
+        time.sleep(0.02)
+        real_fsync(fd)
+
+    monkeypatch.setattr(journal_module.os, "fsync", slow_fsync)
+    writers = 20
+    start = threading.Barrier(writers)
+
+    def write(user_id):
+        start.wait()
+        journal.sync(journal.append({"op": "create", "user_id": user_id}))
+
+    threads = [threading.Thread(target=write, args=(user_id,)) for user_id in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    journal.close()
+
+    # Everyone returned only once their record was on disk, in far fewer fsyncs
+    assert len(fsyncs) - 1 < writers // 2  # close() adds one
+    assert sorted(r["user_id"] for r in Journal.read_records(journal.path)) == list(range(writers))
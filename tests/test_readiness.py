@@ -0,0 +1,48 @@
+from fastapi.testclient import TestClient
+
+from app.readiness import Readiness, StartupStep
+
+
+def test_report_is_not_ready_until_required_steps_finish():
+    readiness = Readiness()
+    storage = StartupStep()
+    readiness.add("storage", storage)
+    readiness.add("sheets", lambda: {"status": "loading"}, required=False)
+
+    report = readiness.report()
+    assert report["ready"] is False
+    assert report["warming_up"] is True
+    assert report["components"]["storage"]["status"] == "pending"
+
+    with storage:
+        assert readiness.report()["components"]["storage"]["status"] == "loading"
+    report = readiness.report()
+    assert report["ready"] is True
+    assert report["components"]["storage"]["status"] == "ready"
+
+
+def test_failed_step_records_error():
+    step = StartupStep()
+    try:
+        with step:
+            raise RuntimeError("disk full")
+    except RuntimeError:
+        pass
+    assert step()["status"] == "failed"
+    assert step()["error"] == "disk full"
+
+
+def test_ready_endpoint_is_503_without_the_lifespan(monkeypatch):
+    from app import main
+
+    # Another test may have run the lifespan already
+    monkeypatch.setattr(main.storage_startup, "status", "pending")
+    monkeypatch.setattr(main.storage_startup, "_started", None)
+    app = main.app
+
+    # Not entered as a context manager, so the lifespan never loads anything
+    response = TestClient(app).get("/ready")
+    assert response.status_code == 503
+    body = response.json()
+    assert body["ready"] is False
+    assert body["components"]["storage"]["status"] == "pending"
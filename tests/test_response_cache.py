@@ -0,0 +1,29 @@
+import time
+
+from app.response_cache import UserResponseCache, etag_matches
+
+
+def test_etag_matches_whole_tags_in_a_list():
+    etag = '"abc123"'
+    assert etag_matches('"abc123"', etag)
+    assert etag_matches('"other", W/"abc123"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"abc1234"', etag)
+    assert not etag_matches('"xabc123", "abc"', etag)
+    assert not etag_matches("", etag)
+
+
+def test_entries_expire_after_ttl():
+    cache = UserResponseCache(max_size=10, ttl=0.05)
+    etag = cache.put(1, cache.version(1), b"{}")
+    assert cache.get(1) == (etag, b"{}")
+    time.sleep(0.06)
+    assert cache.get(1) is None
+
+
+def test_invalidate_drops_entry_and_stale_put():
+    cache = UserResponseCache(max_size=10, ttl=60)
+    version = cache.version(1)
+    cache.invalidate(1)
+    cache.put(1, version, b"stale")
+    assert cache.get(1) is None
@@ -0,0 +1,76 @@
+import re
+
+from app import signed_tokens
+from app.signed_tokens import ReplayFilter, consume_token, issue_token, verify_token
+
+
+def _tampered(token: str, index: int) -> str:
+    replacement = 'A' if token[index] != 'A' else 'B'
+    return token[:index] + replacement + token[index + 1:]
+
+
+def test_token_is_44_url_safe_characters():
+    token = issue_token("telegram", 42, ttl=60)
+    assert len(token) == 44
+    assert re.fullmatch(r"[A-Za-z0-9_-]+", token)
+    assert verify_token("telegram", token) == 42
+    assert verify_token("oauth", issue_token("oauth", None, ttl=60)) == 0
+
+
+def test_tampered_or_oversized_token_is_rejected():
+    token = issue_token("telegram", 42, ttl=60)
+    # Payload (user id, expiry, nonce) and MAC alike
+    for index in (3, 10, 30, 40):
+        assert verify_token("telegram", _tampered(token, index)) is None
+    assert verify_token("telegram", token[:-1]) is None
+    assert verify_token("telegram", token + "A" * 21) is None
+    assert verify_token("telegram", "") is None
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    token = issue_token("telegram", 42, ttl=60)
+    now = signed_tokens.time.time()
+    monkeypatch.setattr(signed_tokens.time, "time", lambda: now + 61)
+    assert verify_token("telegram", token) is None
+    assert consume_token("telegram", token) is None
+
+
+def test_token_only_verifies_for_its_purpose():
+    token = issue_token("oauth", 42, ttl=60)
+    assert verify_token("telegram", token) is None
+    assert consume_token("telegram", token) is None
+    assert consume_token("oauth", token) == 42
+
+
+def test_token_is_single_use():
+    token = issue_token("telegram", 42, ttl=60)
+    assert verify_token("telegram", token) == 42
+    assert verify_token("telegram", token) == 42  # verifying doesn't use it up
+    assert consume_token("telegram", token) == 42
+    assert consume_token("telegram", token) is None
+    assert verify_token("telegram", token) is None
+    assert consume_token("telegram", issue_token("telegram", 42, ttl=60)) == 42
+
+
+def test_replay_filter_remembers_keys_for_a_full_window(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(signed_tokens.time, "monotonic", lambda: now[0])
+    seen = ReplayFilter(capacity=100, error_rate=0.001, window=10)
+    assert seen.add(b"nonce")
+    assert not seen.add(b"nonce")
+
+    # One rotation moves it to the previous generation, where it still counts
+    now[0] = 10
+    assert b"nonce" in seen
+    assert not seen.add(b"nonce")
+    # The second drops it, once no token it guards can still be valid
+    now[0] = 20
+    assert b"nonce" not in seen
+
+
+def test_replay_filter_false_positives_stay_near_the_error_rate():
+    seen = ReplayFilter(capacity=1000, error_rate=0.01, window=60)
+    for n in range(1000):
+        seen.add(b"used-%d" % n)
+    false_positives = sum(b"fresh-%d" % n in seen for n in range(10000))
+    assert false_positives < 300
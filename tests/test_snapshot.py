@@ -0,0 +1,76 @@
+import logging
+import os
+
+from app.storage import user_storage
+from app.storage.snapshot import HEADER, Snapshot
+from app.storage.user_storage import UserStorage
+
+
+def _compacted_store(tmp_path):
+    storage = UserStorage(str(tmp_path))
+    user_id = storage.create_user()['id']
+    storage.bind_platform(user_id, 'discord', '123', 'alice')
+    storage.compact()
+    return storage, user_id
+
+
+def _snapshot_matches(storage) -> bool:
+    snapshot = Snapshot.open(storage.snapshot_file, storage._csv_fingerprint(), storage.PLATFORMS)
+    return snapshot is not None
+
+
+def _reopen_from_csv(tmp_path, user_id, caplog, reason):
+    caplog.clear()
+    with caplog.at_level(logging.INFO):
+        reopened = UserStorage(str(tmp_path))
+    assert reason in caplog.text
+    assert "Loaded 1 users and 1 bindings" in caplog.text
+    assert reopened.get_user(user_id)['discord']['id'] == '123'
+    # Rewritten from the CSVs, so the next start maps it again
+    assert _snapshot_matches(reopened)
+    return reopened
+
+
+def test_matching_snapshot_is_mapped(tmp_path, caplog):
+    _, user_id = _compacted_store(tmp_path)
+    with caplog.at_level(logging.INFO):
+        reopened = UserStorage(str(tmp_path))
+    assert "Opened snapshot of 1 users" in caplog.text
+    assert reopened.get_user(user_id)['discord']['username'] == 'alice'
+
+
+def test_corrupt_snapshot_falls_back_to_csv(tmp_path, caplog):
+    storage, user_id = _compacted_store(tmp_path)
+    with open(storage.snapshot_file, 'r+b') as f:
+        f.seek(HEADER.size)
+        byte = f.read(1)
+        f.seek(HEADER.size)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    _reopen_from_csv(tmp_path, user_id, caplog, "checksum mismatch")
+
+
+def test_touched_csv_falls_back_to_csv(tmp_path, caplog):
+    storage, user_id = _compacted_store(tmp_path)
+    stat = os.stat(storage.users_file)
+    os.utime(storage.users_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    _reopen_from_csv(tmp_path, user_id, caplog, "CSV files changed since it was written")
+
+
+def test_crash_between_csv_and_snapshot_writes(tmp_path, caplog, monkeypatch):
+    storage, user_id = _compacted_store(tmp_path)
+    storage.bind_platform(user_id, 'discord', '123', 'alice2')
+
+    def crash(*args, **kwargs):
+        raise OSError("killed")
+
+    # The CSVs are rewritten, users.snap still describes the old ones
+    monkeypatch.setattr(user_storage, "write_snapshot", crash)
+    storage.compact()
+    monkeypatch.undo()
+    assert not storage.journal.compacting_path.exists()
+    assert not _snapshot_matches(storage)
+
+    reopened = _reopen_from_csv(tmp_path, user_id, caplog, "CSV files changed since it was written")
+    assert reopened.get_user(user_id)['discord']['username'] == 'alice2'
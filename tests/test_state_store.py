@@ -0,0 +1,60 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+from app.state_store import AsyncStateStore, SQLiteStateStore
+from app.ttl_store import TTLStore
+
+
+def test_sqlite_calls_do_not_block_the_event_loop(tmp_path):
+    path = tmp_path / "state.db"
+    store = AsyncStateStore(SQLiteStateStore(path, "codes", default_ttl=60, max_size=100))
+
+    async def scenario():
+        await store.set("code", {"user_id": 1})
+        # Another worker holds the write lock, so pop() has to wait for it
+        other = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+        other.execute("BEGIN IMMEDIATE")
+        pop = asyncio.create_task(store.pop("code"))
+
+        started = time.monotonic()
+        await asyncio.sleep(0.05)
+        loop_delay = time.monotonic() - started - 0.05
+        assert not pop.done()
+
+        other.execute("COMMIT")
+        other.close()
+        return loop_delay, await pop
+
+    loop_delay, value = asyncio.run(scenario())
+    assert loop_delay < 0.05
+    assert value == {"user_id": 1}
+
+
+def test_pop_is_single_use():
+    store = AsyncStateStore(TTLStore(default_ttl=60, max_size=10, name="states"))
+
+    async def scenario():
+        await store.set("state", "discord")
+        return await store.pop("state"), await store.pop("state"), len(store)
+
+    assert asyncio.run(scenario()) == ("discord", None, 0)
+
+
+def test_len_shares_the_connection_lock(tmp_path):
+    store = SQLiteStateStore(tmp_path / "state.db", "codes", default_ttl=60, max_size=2)
+    for key in "abc":
+        store.set(key, 1)
+    # sweep() counts under the lock it already holds
+    assert store.sweep() == 1
+
+    sizes = []
+    with store._lock:
+        # As if pop() were mid-transaction on another thread
+        reader = threading.Thread(target=lambda: sizes.append(len(store)))
+        reader.start()
+        reader.join(0.05)
+        assert reader.is_alive()
+    reader.join()
+    assert sizes == [2]
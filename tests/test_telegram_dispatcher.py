@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import httpx
+
+from app.oauth import telegram_dispatcher
+from app.oauth.telegram_dispatcher import TelegramDispatcher, TokenBucket
+
+
+class FakeTelegram:
+    """sendMessage stand-in: records (time, chat_id, text), answers from a script"""
+
+    def __init__(self, replies=()):
+        self.sent = []
+        self.replies = list(replies)
+
+    async def send(self, chat_id: int, text: str, parse_mode: str) -> httpx.Response:
+        self.sent.append((time.monotonic(), chat_id, text))
+        if self.replies:
+            return self.replies.pop(0)
+        return httpx.Response(200, json={"ok": True})
+
+    def texts(self, chat_id=None):
+        return [text for _, chat, text in self.sent if chat_id is None or chat == chat_id]
+
+    def times(self, chat_id):
+        return [at for at, chat, _ in self.sent if chat == chat_id]
+
+
+def _dispatcher(fake, global_rate=1000.0, per_chat_rate=1000.0, max_retries=3):
+    return TelegramDispatcher(fake.send, global_rate, per_chat_rate, max_retries, max_queue=100, concurrency=4)
+
+
+async def _deliver_all(dispatcher, messages):
+    futures = [dispatcher.submit(chat_id, text) for chat_id, text in messages]
+    results = await asyncio.wait_for(asyncio.gather(*futures), 5)
+    await dispatcher.stop()
+    return results
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=10, capacity=2)
+    bucket.updated = 0.0
+    bucket.consume(0.0)
+    bucket.consume(0.0)
+    assert bucket.wait_time(0.0) == 0.1
+    assert abs(bucket.wait_time(0.05) - 0.05) < 1e-9
+    assert bucket.wait_time(0.1) == 0.0
+    # Idle time never banks more than the capacity
+    assert bucket.wait_time(100.0) == 0.0
+    assert bucket.tokens == 2
+
+
+def test_global_rate_caps_sends_across_chats():
+    fake = FakeTelegram()
+    dispatcher = _dispatcher(fake, global_rate=20)
+
+    async def scenario():
+        return await _deliver_all(dispatcher, [(chat_id, "hi") for chat_id in range(30)])
+
+    assert all(asyncio.run(scenario()))
+    times = sorted(at for at, _, _ in fake.sent)
+    # A burst of 20, then one every 50ms
+    assert times[-1] - times[0] >= 0.45
+
+
+def test_each_chat_is_spaced_without_blocking_others():
+    fake = FakeTelegram()
+    dispatcher = _dispatcher(fake, per_chat_rate=10)
+
+    async def scenario():
+        return await _deliver_all(dispatcher, [(1, "a"), (1, "b"), (1, "c"), (2, "x")])
+
+    assert all(asyncio.run(scenario()))
+    chat_1 = fake.times(1)
+    assert all(later - earlier >= 0.09 for earlier, later in zip(chat_1, chat_1[1:]))
+    # Chat 2 didn't queue behind chat 1's spacing
+    assert fake.times(2)[0] < chat_1[1]
+
+
+def test_429_pauses_every_chat_for_retry_after():
+    flood = httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 0.2}})
+    fake = FakeTelegram([flood])
+    dispatcher = _dispatcher(fake)
+
+    async def scenario():
+        first = dispatcher.submit(1, "a")
+        await asyncio.sleep(0.05)
+        # Submitted during the pause, to another chat
+        return await _deliver_all(dispatcher, [(2, "x")]), await first
+
+    assert asyncio.run(scenario()) == ([True], True)
+    assert dispatcher.stats["rate_limited"] == 1
+    flooded_at = fake.times(1)[0]
+    assert fake.times(1)[1] - flooded_at >= 0.19
+    assert fake.times(2)[0] - flooded_at >= 0.19
+
+
+def test_retries_keep_order_within_a_chat(monkeypatch):
+    monkeypatch.setattr(telegram_dispatcher.random, "uniform", lambda low, high: 0.1)
+    fake = FakeTelegram([httpx.Response(502, text="bad gateway"), httpx.Response(502, text="bad gateway")])
+    dispatcher = _dispatcher(fake)
+
+    async def scenario():
+        return await _deliver_all(dispatcher, [(1, str(n)) for n in range(5)])
+
+    assert all(asyncio.run(scenario()))
+    assert fake.texts(1) == ["0", "0", "0", "1", "2", "3", "4"]
+    assert dispatcher.stats["retried"] == 2
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(telegram_dispatcher.random, "uniform", lambda low, high: 0.01)
+    fake = FakeTelegram([httpx.Response(500, text="down")] * 3)
+    dispatcher = _dispatcher(fake, max_retries=2)
+
+    async def scenario():
+        return await _deliver_all(dispatcher, [(1, "a"), (1, "b")])
+
+    assert asyncio.run(scenario()) == [False, True]
+    assert fake.texts(1) == ["a", "a", "a", "b"]
@@ -0,0 +1,29 @@
+import pytest
+
+from app.oauth import telegram_polling
+
+
+@pytest.mark.parametrize("storage, state", [("csv", "sqlite"), ("sql", "memory"), ("csv", "memory")])
+def test_standalone_poller_refuses_unshared_config(monkeypatch, storage, state):
+    monkeypatch.setattr(telegram_polling.settings, "STORAGE_BACKEND", storage)
+    monkeypatch.setattr(telegram_polling.settings, "STATE_BACKEND", state)
+    monkeypatch.setattr(telegram_polling.settings, "STATELESS_AUTH_TOKENS", False)
+    with pytest.raises(SystemExit):
+        telegram_polling.check_standalone_config()
+
+
+def test_standalone_poller_accepts_shared_config(monkeypatch):
+    monkeypatch.setattr(telegram_polling.settings, "STORAGE_BACKEND", "sql")
+    monkeypatch.setattr(telegram_polling.settings, "STATE_BACKEND", "sqlite")
+    telegram_polling.check_standalone_config()
+
+
+def test_stateless_tokens_need_no_shared_state_store(monkeypatch):
+    monkeypatch.setattr(telegram_polling.settings, "STORAGE_BACKEND", "sql")
+    monkeypatch.setattr(telegram_polling.settings, "STATE_BACKEND", "memory")
+    monkeypatch.setattr(telegram_polling.settings, "STATELESS_AUTH_TOKENS", True)
+    telegram_polling.check_standalone_config()
+
+    monkeypatch.setattr(telegram_polling.settings, "STORAGE_BACKEND", "csv")
+    with pytest.raises(SystemExit):
+        telegram_polling.check_standalone_config()
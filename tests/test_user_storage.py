@@ -0,0 +1,77 @@
+import threading
+
+from app.storage.user_storage import UserStorage
+
+
+def test_replacing_import_leaves_old_snapshot_readable(tmp_path):
+    user_id = UserStorage(str(tmp_path)).create_user()['id']
+    # Reopening replays the journal into a fresh users.snap and maps it
+    storage = UserStorage(str(tmp_path))
+    old = storage._snapshot
+    assert old is not None
+
+    storage.import_rows([], replace=True)
+
+    # A lock-free reader that fetched the old map before the swap can still use it
+    assert old.version(user_id).user_id == user_id
+    assert storage.get_user(user_id) is None
+
+
+def test_journal_is_replayed_after_a_restart(tmp_path):
+    storage = UserStorage(str(tmp_path))
+    user_id = storage.create_user()['id']
+    storage.bind_platform(user_id, 'discord', '123', 'alice')
+    storage.bind_platform(user_id, 'telegram', '456', 'alice_tg')
+    storage.unbind_platform(user_id, 'telegram')
+    # No compaction ran: every change is only in users.journal
+
+    reopened = UserStorage(str(tmp_path))
+    user = reopened.get_user(user_id)
+    assert user['discord']['id'] == '123'
+    assert user['telegram'] is None
+    assert reopened.get_user_by_platform('discord', '123')['id'] == user_id
+    # Replayed records were folded into the snapshot
+    assert not (tmp_path / "users.journal").read_text()
+
+
+def test_restart_stops_at_a_torn_journal_tail(tmp_path):
+    storage = UserStorage(str(tmp_path))
+    user_id = storage.create_user()['id']
+    storage.bind_platform(user_id, 'discord', '123', 'alice')
+    with open(tmp_path / "users.journal", "a") as f:
+        f.write('{"op":"bind","user_id":%d,"platform":"telegram"' % user_id)
+
+    user = UserStorage(str(tmp_path)).get_user(user_id)
+    assert user['discord']['id'] == '123'
+    assert user['telegram'] is None
+
+
+def test_changes_made_during_compaction_survive_it(tmp_path, monkeypatch):
+    storage = UserStorage(str(tmp_path))
+    first = storage.create_user()['id']
+    storage.bind_platform(first, 'discord', '1', 'first')
+
+    writing = threading.Event()
+    release = threading.Event()
+    write_snapshot = storage._write_snapshot
+
+    def slow_write_snapshot(versions):
+        writing.set()
+        release.wait(5)
+        write_snapshot(versions)
+
+    monkeypatch.setattr(storage, "_write_snapshot", slow_write_snapshot)
+    compaction = threading.Thread(target=storage.compact)
+    compaction.start()
+    assert writing.wait(5)
+
+    # The journal has been rotated; these land in the new one
+    second = storage.create_user()['id']
+    storage.bind_platform(second, 'discord', '2', 'second')
+    release.set()
+    compaction.join()
+    assert not storage.journal.compacting_path.exists()
+
+    reopened = UserStorage(str(tmp_path))
+    assert reopened.get_user(first)['discord']['id'] == '1'
+    assert reopened.get_user(second)['discord']['id'] == '2'